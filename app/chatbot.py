@@ -1,8 +1,7 @@
 import streamlit as st
-from src.retrieval.simple_rag import simple_chain
-from src.retrieval.rag_agent import rag_agent
 from src.util.vectorstore import get_all_collection_names
-from langchain_core.messages import HumanMessage, AIMessage
+from src.retrieval.history import ChatHistory
+from src.retrieval.chapters import load_chapter_index
 import sys, os
 from dotenv import load_dotenv
 load_dotenv() 
@@ -10,6 +9,15 @@ load_dotenv()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 available_collections = get_all_collection_names()
 
+def rag_agent(*args, **kwargs):
+    # Imported on first use so the agent stack is only loaded if that engine is selected.
+    from src.retrieval.rag_agent import rag_agent as _rag_agent
+    return _rag_agent(*args, **kwargs)
+
+def simple_chain(*args, **kwargs):
+    from src.retrieval.simple_rag import simple_chain as _simple_chain
+    return _simple_chain(*args, **kwargs)
+
 CHAIN_OPTIONS = {
     "Agentic RAG (Tool-Calling)": rag_agent,
     "Simple RAG (Standard)": simple_chain
@@ -50,6 +58,19 @@ with st.sidebar:
         index=0,
         help="hybrid = keyword + semantic, dense = semantic only, sparse = keyword only."
     )
+    backend = st.selectbox(
+        "Dense index backend:",
+        options=["qdrant", "faiss"],
+        index=0,
+        help="faiss searches a memory-mapped FAISS index built with `python -m src.util.faiss_store build <collection>`."
+    )
+    sparse_backend = st.selectbox(
+        "Keyword index backend:",
+        options=["qdrant", "bm25"],
+        index=0,
+        help="bm25 scores keywords with a native BM25 index (no model call per query), built at ingest "
+             "or with `python -m src.util.bm25_store build <collection>`."
+    )
     st.divider()
     st.header("RAG approach")
 
@@ -59,10 +80,20 @@ with st.sidebar:
         help="Simple RAG always uses context; Agentic RAG decides if it needs the book."
     )
     
-    use_history = st.checkbox(
-        "Use Chat History", 
-        value=True,
-        help="Toggle this off if you are using a small model with limited context window."
+    history_turns = st.slider(
+        "Chat history turns kept verbatim:",
+        min_value=0,
+        max_value=10,
+        value=3,
+        help="Older turns are folded into a short running summary. 0 turns off chat history."
+    )
+    history_tokens = st.slider(
+        "Chat history token limit:",
+        min_value=256,
+        max_value=4096,
+        value=1500,
+        step=128,
+        help="Upper bound on summary + recent turns, keeps prompts small for models with a limited context window."
     )
     
     st.divider()
@@ -75,12 +106,47 @@ with st.sidebar:
         value=4,
         help="Higher values provide more context but can confuse the LLM or hit token limits."
     )
+    mmr_lambda = st.slider(
+        "Relevance vs diversity (MMR λ):",
+        min_value=0.0,
+        max_value=1.0,
+        value=1.0,
+        step=0.05,
+        help="1.0 = most relevant chunks only. Lower values pick the k chunks from a larger candidate pool "
+             "while skipping near-duplicates (e.g. overlapping neighbouring chunks)."
+    )
+    chapter_index = load_chapter_index(selected_collection) if selected_collection else None
+    if chapter_index is not None:
+        chapter_titles = dict(chapter_index.chapters())
+        selected_chapters = st.multiselect(
+            "Only search chapters:",
+            options=list(chapter_titles),
+            format_func=lambda number: f"{number}: {chapter_titles[number]}",
+            help="Leave empty to search the whole book."
+        )
+        route_chapters = st.slider(
+            "Search only the closest chapters:",
+            min_value=0,
+            max_value=min(5, len(chapter_titles)),
+            value=0,
+            help="Picks the chapters whose content is closest to the question and searches only those. "
+                 "0 searches every chapter. Ignored when chapters are selected above."
+        )
+    else:
+        selected_chapters, route_chapters = [], 0
 
 
     chosen_chain_func = CHAIN_OPTIONS[selected_chain_name]
 
 if "last_chunks" not in st.session_state:
     st.session_state.last_chunks = []
+if "last_timing" not in st.session_state:
+    st.session_state.last_timing = None
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = ChatHistory()
+chat_history = st.session_state.chat_history
+chat_history.keep_turns = history_turns
+chat_history.max_tokens = history_tokens
 
 def stream_handler(generator):
     for item in generator:
@@ -88,6 +154,8 @@ def stream_handler(generator):
             yield item
         elif isinstance(item, list):
             st.session_state.last_chunks = item
+        elif isinstance(item, dict):
+            st.session_state.last_timing = item
 
 main_col, side_col = st.columns([3, 1],gap="medium")
 with main_col:
@@ -107,16 +175,13 @@ with main_col:
 
             with st.chat_message("assistant"):
 
-                history = []
-                if use_history:
-                    for msg in st.session_state.messages[:-1]:
-                        if msg["role"] == "user":
-                            history.append(HumanMessage(content=msg["content"]))
-                        else:
-                            history.append(AIMessage(content=msg["content"]))
+                history = chat_history.messages(st.session_state.messages[:-1])
 
                 try:
-                    response_gen = chosen_chain_func(prompt, selected_collection, top_k, search_type=search_type, chat_history=history)
+                    response_gen = chosen_chain_func(prompt, selected_collection, top_k, search_type=search_type, chat_history=history, backend=backend,
+                                                    mmr_lambda=None if mmr_lambda >= 1.0 else mmr_lambda,
+                                                    chapters=selected_chapters or None, route_chapters=route_chapters or None,
+                                                    sparse_backend=sparse_backend)
                     response = st.write_stream(stream_handler(response_gen))
                     if isinstance(response, list):
                         st.session_state.last_chunks = response
@@ -132,8 +197,38 @@ with main_col:
                     st.stop()
 
         st.session_state.messages.append({"role": "assistant", "content": response})
+        # Fold turns that left the verbatim window into the summary now, after the answer is shown,
+        # so the next question doesn't wait for it.
+        try:
+            from src.util.env_check import get_llm_model
+            chat_history.update(st.session_state.messages, get_llm_model())
+        except Exception as e:
+            print(f"Chat history summary failed: {e}")
         st.rerun()
 with side_col:
+    timing = st.session_state.last_timing
+    if timing:
+        st.subheader("Latency")
+        st.caption(
+            f"Total: **{timing['total_ms'] / 1000:.2f}s**  |  Tool calls: {timing['tool_calls']}  |  "
+            f"Chunks: {len(timing['retrieved_chunk_chars'])} ({sum(timing['retrieved_chunk_chars'])} chars)"
+        )
+        from src.retrieval.pipelines import pipeline_pool_stats
+        pool = pipeline_pool_stats()
+        st.caption(f"Pipeline cache: {'hit' if timing.get('pipeline_cached') else 'miss'}  |  "
+                   f"hit rate {pool['hit_rate']:.0%} ({pool['hits']}/{pool['hits'] + pool['misses']})")
+        if timing.get("routed_chapters"):
+            st.caption("Searched chapters: " + ", ".join(timing["routed_chapters"]))
+        if timing.get("answer_cache") == "hit":
+            st.caption(f"Answer cache: **hit** (similarity {timing['answer_cache_similarity']:.3f})")
+        elif timing.get("answer_cache"):
+            st.caption("Answer cache: miss")
+        st.dataframe(
+            [{"stage": stage, "ms": round(ms, 1)} for stage, ms in timing["stages_ms"].items()],
+            hide_index=True,
+            use_container_width=True,
+        )
+
     st.subheader("Retrieved Chunks")
     if st.session_state.last_chunks:
         for doc in st.session_state.last_chunks:
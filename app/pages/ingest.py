@@ -1,10 +1,11 @@
 import streamlit as st
 from pathlib import Path
-from src.util.vectorstore import get_all_collection_names
+from src.util.vectorstore import delete_collection, get_all_collection_names
+from src.retrieval.pipelines import invalidate_pipelines
 import re
 import os
-from src.ingest.simple_ingest import simple_ingest
-from src.ingest.advanced_ingest import advanced_ingest
+from src.ingest.common import has_checkpoint
+from src.ingest.jobs import get_job_runner
 
 def sanitize_filename(filename: str) -> str:
     name, ext = os.path.splitext(filename)
@@ -65,6 +66,37 @@ with st.container(border=True):
         value=300,
         help="To prevent loosing information split between chunks each chunk overlaps the previous and next one."
     )
+    parent_chunk_size = st.slider(
+        "Parent section size (chapter strategy, in characters):",
+        min_value=0,
+        max_value=8000,
+        value=0,
+        step=500,
+        help="0 = off. Otherwise chapters are split into parent sections of this size and only small child chunks "
+             "(the chunk size above) are embedded. Searches match the precise child chunks and return their parent sections as context."
+    )
+    quantization = st.selectbox(
+        "Vector quantization:",
+        options=["none", "scalar", "binary"],
+        index=0,
+        help="scalar = int8 (4x smaller), binary = 1 bit per dimension (32x smaller). Queries oversample and rescore with the full vectors. Savings apply when served by a Qdrant server."
+    )
+    faiss_index = st.selectbox(
+        "Also build a FAISS index:",
+        options=["none", "hnsw", "ivf", "flat"],
+        index=0,
+        help="Builds a memory-mapped FAISS index next to the collection, selectable as the dense backend on the chat page."
+    )
+    resume = st.checkbox(
+        "Resume an interrupted ingestion",
+        value=False,
+        help="Continue filling an existing collection whose ingestion failed partway. Use the same file and settings as the interrupted run."
+    )
+    replace = st.checkbox(
+        "Replace the existing collection",
+        value=False,
+        help="Delete a collection of this name (and its indexes) before ingesting, e.g. one left behind by an ingestion that was stopped before it could be resumed."
+    )
 
     if st.button("Start Ingestion", use_container_width=True):
         if not uploaded_file:
@@ -79,35 +111,87 @@ with st.container(border=True):
 
             existing_collections = get_all_collection_names()
             
-            if collection_name in existing_collections:
+            if collection_name in get_job_runner().active_collections():
+                st.error(f"The collection '{collection_name}' already has an ingestion in progress.")
+            elif resume and replace:
+                st.error("Choose either resuming or replacing the collection, not both.")
+            elif collection_name in existing_collections and resume and not has_checkpoint(collection_name):
+                st.error(
+                    f"The collection '{collection_name}' has no interrupted ingestion to resume. "
+                    "Check 'Replace the existing collection' to ingest it from scratch."
+                )
+            elif collection_name in existing_collections and not resume and not replace:
                 st.error(
                     f"The collection '{collection_name}' already exists. "
-                    "To prevent strategy mixing, please choose a new name or delete the existing collection manually."
+                    "To prevent strategy mixing, please choose a new name or check 'Replace the existing collection'."
                 )
             else:
-                with st.status("Processing document...", expanded=True) as status:
-                    temp_dir = Path("data/raw")
-                    temp_dir.mkdir(parents=True, exist_ok=True)
-                    file_path = temp_dir / safe_name
-                    
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    st.write(f"File saved locally: `{uploaded_file.name}`")
-                    
-                    method_key = INGEST_METHODS[selected_method]
-                    st.write(f"Running `{method_key}` strategy...")
-                    
-                    try:
-                        if method_key == "simple":
-                            num_chunks = simple_ingest(file_path, collection_name,do_preprocess,chunk_size,chunk_overlap)
-                        elif method_key == "chapter":
-                            num_chunks = advanced_ingest(file_path,collection_name,do_preprocess,chunk_size,chunk_overlap)
-                            
-                        status.update(label="✅ Ingestion Complete", state="complete", expanded=False)
-                        st.success(f"Ingested **{num_chunks}** chunks into the collection: `{clean_name}`.")
-                        st.balloons()
-                        
-                    except Exception as e:
-                        status.update(label="Ingestion Failed", state="error")
-                        st.error(f"Error: {str(e)}")
\ No newline at end of file
+                if replace and collection_name in existing_collections:
+                    delete_collection(collection_name)
+                    invalidate_pipelines(collection_name)
+
+                temp_dir = Path("data/raw")
+                temp_dir.mkdir(parents=True, exist_ok=True)
+                file_path = temp_dir / safe_name
+
+                with open(file_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+
+                method_key = INGEST_METHODS[selected_method]
+                params = dict(stem_and_stop=do_preprocess, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                              resume=resume, quantization=None if quantization == "none" else quantization)
+                if method_key == "chapter" and parent_chunk_size:
+                    params["parent_chunk_size"] = parent_chunk_size
+
+                get_job_runner().submit(
+                    method_key, str(file_path), collection_name,
+                    faiss_index=None if faiss_index == "none" else faiss_index, **params
+                )
+                st.success(f"Queued the `{method_key}` ingestion of `{uploaded_file.name}` into `{clean_name}`.")
+
+
+def _format_seconds(seconds) -> str:
+    if seconds is None:
+        return "–"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+@st.fragment(run_every=1)
+def ingest_jobs():
+    """Ingestion jobs of this app, refreshed every second while the page is open."""
+    jobs = get_job_runner().list()
+    if not jobs:
+        st.caption("No ingestion jobs yet.")
+        return
+
+    for job in jobs:
+        with st.container(border=True):
+            header, action = st.columns([5, 1])
+            header.markdown(f"**{job['collection']}** · `{job['strategy']}` · {Path(job['source']).name} · {job['status']}")
+
+            if job["status"] in ("queued", "running"):
+                if action.button("Cancel", key=f"cancel_{job['id']}"):
+                    get_job_runner().cancel(job["id"])
+
+            if job["status"] == "running":
+                total = job["chunks_estimated"]
+                fraction = min(job["chunks_stored"] / total, 1.0) if total else 0.0
+                st.progress(fraction, text=f"{job['chunks_stored']} / {total or '?'} chunks · "
+                                           f"page {job['pages_read']} / {job['pages_total'] or '?'}")
+                st.caption(f"{job['chunks_per_second']:.1f} chunks/s · ETA {_format_seconds(job['eta_seconds'])}")
+            elif job["status"] == "completed":
+                st.caption(f"Ingested {job['chunks']} chunks in {_format_seconds(job['finished_at'] - job['started_at'])} "
+                           f"({job['chunks_per_second']:.1f} chunks/s).")
+            elif job["status"] == "failed":
+                st.error(f"Error: {job['error']}")
+            elif job["status"] in ("cancelled", "interrupted") and not has_checkpoint(job["collection"]):
+                st.caption("Stopped before anything could be resumed. Submit it again as a new ingestion "
+                           "(with 'Replace the existing collection' if the collection is still listed).")
+            elif job["status"] in ("cancelled", "interrupted"):
+                st.caption(f"Stopped after {job['chunks_stored']} chunks. Submit it again with "
+                           "'Resume an interrupted ingestion' to continue.")
+
+
+st.subheader("Ingestion jobs")
+ingest_jobs()
@@ -0,0 +1,233 @@
+"""
+Small local HTTP service that streams answers from the async chains.
+
+    python -m src.api.server --port 8600
+
+    POST /chat         {"query", "collection", "top_k"=4, "search_type"="hybrid", "chain"="simple"|"agent",
+                        "backend"="qdrant", "mmr_lambda"=null, "chapters"=null, "route_chapters"=null,
+                        "sparse_backend"="qdrant",
+                        "history"=[{"role", "content"}, ...]}
+                       -> NDJSON stream: {"type": "token", "content"} ..., {"type": "sources", "documents"},
+                          {"type": "timing", "record"} (or {"type": "error", "message"})
+    GET  /collections  -> names of the ingested collections
+    GET  /stats        -> in-flight/queued turns, pipeline pool, query-embedding batch and answer cache stats
+    GET  /health
+
+Everything runs on one event loop in one process (the embedded Qdrant storage can only be
+opened by one process). At most API_MAX_CONCURRENT_TURNS turns run at once, up to
+API_MAX_QUEUED_TURNS more wait for a slot and anything beyond that gets a 503 right away,
+so a burst of students queues briefly instead of slowing every answer down.
+"""
+import argparse
+import asyncio
+import json
+import os
+from http import HTTPStatus
+
+from src.retrieval.answer_cache import answer_caches
+from src.retrieval.history import ChatHistory
+from src.retrieval.pipelines import pipeline_pool_stats
+from src.util.embedding_batcher import BatchingEmbeddings
+from src.util.env_check import get_embed_model
+from src.retrieval.simple_rag import asimple_chain
+from src.util.vectorstore import get_all_collection_names
+
+
+async def arag_agent(*args, **kwargs):
+    # Imported on first use so the agent stack is only loaded if a client asks for it.
+    from src.retrieval.rag_agent import arag_agent as _arag_agent
+    async for item in _arag_agent(*args, **kwargs):
+        yield item
+
+CHAINS = {"simple": asimple_chain, "agent": arag_agent}
+
+
+def _batcher_stats() -> dict | None:
+    model = get_embed_model()
+    batcher = getattr(model, "embeddings", model)
+    return batcher.stats() if isinstance(batcher, BatchingEmbeddings) else None
+
+MAX_BODY_BYTES = 1024 * 1024
+REQUEST_TIMEOUT = 30
+
+
+class TurnLimiter:
+    """
+    Bounds concurrent turns, with a bounded wait queue in front.
+
+    Args:
+        max_concurrent: Turns allowed to run at the same time.
+        max_queued: Turns allowed to wait for a slot.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.queued = 0
+
+    def full(self) -> bool:
+        return self.queued >= self.max_queued and self._slots.locked()
+
+    async def __aenter__(self):
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self._slots.release()
+
+
+class ChatServer:
+    """
+    Args:
+        max_concurrent: Turns answered at the same time (API_MAX_CONCURRENT_TURNS, default 4).
+        max_queued: Turns waiting for a slot before new ones are rejected (API_MAX_QUEUED_TURNS, default 32).
+    """
+
+    def __init__(self, max_concurrent: int | None = None, max_queued: int | None = None):
+        self.limiter = TurnLimiter(
+            max_concurrent or int(os.getenv("API_MAX_CONCURRENT_TURNS", 4)),
+            max_queued or int(os.getenv("API_MAX_QUEUED_TURNS", 32)),
+        )
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+            if method == "GET" and path == "/health":
+                await self._send_json(writer, HTTPStatus.OK, {"status": "ok"})
+            elif method == "GET" and path == "/collections":
+                names = await asyncio.to_thread(get_all_collection_names)
+                await self._send_json(writer, HTTPStatus.OK, {"collections": names})
+            elif method == "GET" and path == "/stats":
+                await self._send_json(writer, HTTPStatus.OK, {
+                    "running": self.limiter.running,
+                    "queued": self.limiter.queued,
+                    "pipelines": pipeline_pool_stats(),
+                    "embedding_batches": _batcher_stats(),
+                    "answer_caches": {name: cache.stats() for name, cache in answer_caches().items()},
+                })
+            elif method == "POST" and path == "/chat":
+                await self._chat(writer, body)
+            else:
+                await self._send_json(writer, HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path}"})
+        except (ValueError, asyncio.TimeoutError) as e:
+            await self._send_json(writer, HTTPStatus.BAD_REQUEST, {"error": str(e) or "Request timed out"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ValueError("Malformed request line")
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], body
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _send_event(self, writer: asyncio.StreamWriter, event: dict):
+        data = (json.dumps(event, default=str) + "\n").encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def _chat(self, writer: asyncio.StreamWriter, body: bytes):
+        request = json.loads(body or b"{}")
+        if not request.get("query") or not request.get("collection"):
+            raise ValueError("'query' and 'collection' are required")
+        chain = CHAINS.get(request.get("chain", "simple"))
+        if chain is None:
+            raise ValueError(f"'chain' must be one of {list(CHAINS)}")
+
+        if self.limiter.full():
+            await self._send_json(writer, HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Server busy, try again shortly"})
+            return
+
+        async with self.limiter:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+            )
+            # Requests carry no summary, so only the last turns of the client's history are sent.
+            keep_turns = int(request.get("history_turns", 3))
+            recent = (request.get("history") or [])[-2 * keep_turns:] if keep_turns > 0 else []
+            history = ChatHistory(keep_turns=keep_turns).messages(recent)
+            try:
+                async for item in chain(
+                    request["query"],
+                    request["collection"],
+                    int(request.get("top_k", 4)),
+                    search_type=request.get("search_type", "hybrid"),
+                    chat_history=history,
+                    backend=request.get("backend", "qdrant"),
+                    mmr_lambda=request.get("mmr_lambda"),
+                    chapters=request.get("chapters"),
+                    route_chapters=request.get("route_chapters"),
+                    sparse_backend=request.get("sparse_backend", "qdrant"),
+                ):
+                    if isinstance(item, str):
+                        await self._send_event(writer, {"type": "token", "content": item})
+                    elif isinstance(item, list):
+                        documents = [{"content": doc.page_content, "metadata": doc.metadata} for doc in item]
+                        await self._send_event(writer, {"type": "sources", "documents": documents})
+                    elif isinstance(item, dict):
+                        await self._send_event(writer, {"type": "timing", "record": item})
+            except ConnectionError:
+                raise
+            except Exception as e:
+                await self._send_event(writer, {"type": "error", "message": str(e)})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+
+async def serve(host: str, port: int):
+    server = ChatServer()
+    tcp_server = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving on http://{host}:{port} (up to {server.limiter.max_concurrent} concurrent turns)")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local streaming chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+    # Concurrent turns share embedding requests here, unless EMBED_BATCHING is set explicitly.
+    if not os.getenv("EMBED_BATCHING"):
+        os.environ["EMBED_BATCHING"] = "true"
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import hashlib
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import SparseEmbeddings, SparseVector
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _bucket(feature: str, size: int) -> tuple[int, float]:
+    """Stable (index, sign) for a feature. Python's hash() is salted per process, so use blake2b."""
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % size, 1.0 if (value >> 63) & 1 else -1.0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for a dense embedding model.
+
+    Words and character trigrams are hashed into `dim` buckets with random signs and the
+    result is L2-normalized. It has no semantic knowledge, but similar wording gives
+    similar vectors, which is enough to compare retrieval settings reproducibly.
+
+    Args:
+        dim: Vector size.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _tokens(text):
+            index, sign = _bucket(token, self.dim)
+            vector[index] += sign
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                index, sign = _bucket(padded[i : i + 3], self.dim)
+                vector[index] += 0.5 * sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class HashingSparseEmbeddings(SparseEmbeddings):
+    """
+    Deterministic stand-in for the BM25 sparse model: log-scaled term frequencies of hashed words.
+
+    Args:
+        size: Size of the hashed vocabulary.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        self.size = size
+
+    def _embed(self, text: str) -> SparseVector:
+        weights = Counter()
+        for token, count in Counter(_tokens(text)).items():
+            index, _ = _bucket(token, self.size)
+            weights[index] += 1.0 + math.log(count)
+        indices = sorted(weights)
+        return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+    def embed_documents(self, texts: list[str]) -> list[SparseVector]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> SparseVector:
+        return self._embed(text)
@@ -0,0 +1,140 @@
+"""
+Memory saved vs recall lost by vector quantization, measured on the fixture corpus.
+
+Quantization is simulated in NumPy the way Qdrant does it (int8 scalar quantization
+over the 0.99 quantile range, 1-bit binary quantization by sign), with oversampling +
+full precision rescoring. The embedded Qdrant used by the app ignores the quantization
+config and always does exact float search, so it can't be measured there.
+
+    python -m src.bench.quantization
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from src.bench.embeddings import HashingEmbeddings
+from src.bench.retrieval import bench_dir, build_chunks, is_relevant, load_fixtures, _git_commit
+
+OVERSAMPLING = [1.0, 2.0, 3.0]
+
+
+def scalar_quantize(matrix: np.ndarray, quantile: float = 0.99) -> np.ndarray:
+    """int8 codes over the central `quantile` range of all values, returned dequantized for scoring."""
+    low, high = np.quantile(matrix, [(1 - quantile) / 2, 1 - (1 - quantile) / 2])
+    scale = (high - low) / 255 or 1.0
+    codes = np.clip(np.round((matrix - low) / scale), 0, 255).astype(np.uint8)
+    return codes.astype(np.float32) * scale + low
+
+
+def binary_quantize(matrix: np.ndarray) -> np.ndarray:
+    return np.packbits(matrix > 0, axis=1)
+
+
+def binary_scores(query_bits: np.ndarray, doc_bits: np.ndarray, dim: int) -> np.ndarray:
+    """Agreement of sign bits (dim - 2 * hamming distance), higher is more similar."""
+    hamming = np.unpackbits(np.bitwise_xor(doc_bits[None, :, :], query_bits[:, None, :]), axis=2).sum(axis=2)
+    return dim - 2 * hamming.astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def rescored_top_k(approx_scores: np.ndarray, exact_scores: np.ndarray, k: int, oversampling: float) -> np.ndarray:
+    candidates = top_k(approx_scores, max(k, int(round(k * oversampling))))
+    rescored = np.take_along_axis(exact_scores, candidates, axis=1)
+    order = rescored.argsort(axis=1)[:, ::-1][:, :k]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def overlap_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, exact)]))
+
+
+def run(dim: int = 1024, chunk_size: int = 300, chunk_overlap: int = 30, k: int = 5, projected_vectors: int = 10_000) -> dict:
+    corpus, questions = load_fixtures()
+    chunks = build_chunks(corpus, chunk_size, chunk_overlap)
+    model = HashingEmbeddings(dim)
+
+    docs = np.asarray(model.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+    # Questions plus every chunk used as a query, for a less noisy overlap estimate.
+    question_vectors = np.asarray(model.embed_documents([q["question"] for q in questions]), dtype=np.float32)
+    queries = np.vstack([question_vectors, docs])
+
+    exact_scores = queries @ docs.T
+    exact = top_k(exact_scores, k)
+    relevance = np.asarray([[is_relevant(chunk, q) for chunk in chunks] for q in questions])
+
+    def evidence_recall(found: np.ndarray) -> float:
+        return float(np.mean([relevance[i, found[i]].any() for i in range(len(questions))]))
+
+    approximations = {
+        "scalar": (queries @ scalar_quantize(docs).T, dim),
+        "binary": (binary_scores(binary_quantize(queries), binary_quantize(docs), dim), dim / 8),
+    }
+
+    results = [{
+        "quantization": None,
+        "oversampling": None,
+        "bytes_per_vector": dim * 4,
+        "overlap@k": 1.0,
+        "evidence_recall@k": evidence_recall(exact),
+    }]
+    for name, (approx_scores, bytes_per_vector) in approximations.items():
+        for oversampling in OVERSAMPLING:
+            found = rescored_top_k(approx_scores, exact_scores, k, oversampling)
+            results.append({
+                "quantization": name,
+                "oversampling": oversampling,
+                "bytes_per_vector": bytes_per_vector,
+                "overlap@k": round(overlap_at_k(found, exact), 4),
+                "evidence_recall@k": round(evidence_recall(found), 4),
+            })
+
+    for row in results:
+        row["ram_mb_fixture"] = round(row["bytes_per_vector"] * len(docs) / 2**20, 4)
+        row[f"ram_mb_{projected_vectors}_vectors"] = round(row["bytes_per_vector"] * projected_vectors / 2**20, 2)
+        row["memory_saved"] = round(1 - row["bytes_per_vector"] / (dim * 4), 4)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "embedding": model.model,
+        "num_vectors": len(docs),
+        "num_queries": len(queries),
+        "k": k,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory vs recall of scalar/binary quantization on the fixture corpus.")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding size (qwen3-embedding:0.6b is 1024, OpenAI small is 1536).")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = run(dim=args.dim, k=args.k)
+    for row in report["results"]:
+        name = row["quantization"] or "float32"
+        oversampling = f"x{row['oversampling']:.0f}" if row["oversampling"] else ""
+        print(
+            f"{name:<8}{oversampling:<4} {row['bytes_per_vector']:>6.0f} B/vector  saved {row['memory_saved']:>6.1%}  "
+            f"overlap@{report['k']}={row['overlap@k']:.3f}  evidence recall@{report['k']}={row['evidence_recall@k']:.3f}"
+        )
+
+    output = args.output or bench_dir / "results" / f"quantization_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
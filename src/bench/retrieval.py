@@ -0,0 +1,302 @@
+"""
+Offline retrieval benchmark: search modes x chunking settings on a fixture corpus.
+
+Builds in-memory Qdrant collections from data/bench/corpus.json with a deterministic
+hashing embedding (no Ollama/OpenAI needed), runs the labeled questions in
+data/bench/questions.json and reports recall@k, MRR and retrieval latency percentiles
+per configuration. Questions go through RetrievalPipeline.search like in the chat app,
+so the other retrieval options are measured too: FAISS and native BM25 indexes, MMR,
+chapter routing (each fixture document is a chapter) and parent-child collections.
+The side indexes of the bench collections are written next to the app's (under uniquely
+named bench_* collections) and deleted once each collection was measured.
+Results are written as JSON so runs can be compared across commits:
+
+    python -m src.bench.retrieval
+    python -m src.bench.retrieval --baseline data/bench/results/<previous>.json
+"""
+import argparse
+import json
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from qdrant_client import QdrantClient
+
+from src.bench.embeddings import HashingEmbeddings, HashingSparseEmbeddings
+from src.ingest.pipeline import IngestPipeline
+from src.retrieval import chapters
+from src.retrieval.pipelines import RetrievalPipeline
+from src.util import bm25_store, faiss_store, parent_store
+from src.util.stemming import ensure_nltk_data
+from src.util.vectorstore import delete_collection, get_vectorstore
+
+project_root = Path(__file__).resolve().parents[2]
+bench_dir = project_root / "data" / "bench"
+
+SEARCH_TYPES = ["dense", "sparse", "hybrid"]
+CHUNK_SETTINGS = [(300, 30), (600, 60), (1200, 120)]
+K_VALUES = [1, 3, 5]
+BACKENDS = ["qdrant", "faiss"]
+SPARSE_BACKENDS = ["qdrant", "bm25"]
+# 1.0 is the chat app's default (no MMR).
+MMR_LAMBDAS = [1.0, 0.5]
+# 0 searches every chapter.
+ROUTE_CHAPTERS = [0, 2]
+# 0 is a single-level collection, otherwise chunks are children of parents of this size.
+PARENT_CHUNK_SIZES = [0, 1000]
+
+
+def load_fixtures(corpus_path: Path = bench_dir / "corpus.json", questions_path: Path = bench_dir / "questions.json"):
+    with open(corpus_path, "r") as f:
+        corpus = json.load(f)
+    with open(questions_path, "r") as f:
+        questions = json.load(f)
+    return corpus, questions
+
+
+def build_chunks(corpus: list[dict], chunk_size: int, chunk_overlap: int, parent_chunk_size: int = 0, parent_writer=None) -> list[Document]:
+    """
+    Chunks of the fixture documents, each document being one chapter.
+
+    Args:
+        parent_chunk_size: If set, split the documents into parents of this size first and
+            return their child chunks, which point to their parent like in advanced_ingest.
+        parent_writer: ParentStoreWriter the parents are added to.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    docs = [
+        Document(
+            page_content=item["text"],
+            metadata={"source": item["id"], "title": item["title"], "chapter_number": str(number), "chapter_title": item["title"]},
+        )
+        for number, item in enumerate(corpus, start=1)
+    ]
+    if not parent_chunk_size:
+        return text_splitter.split_documents(docs)
+
+    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=parent_chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = []
+    for parent_number, parent in enumerate(parent_splitter.split_documents(docs)):
+        parent_id = f"parent-{parent_number}"
+        parent_writer.add(parent_id, parent.page_content, parent.metadata["start_index"])
+        for child in text_splitter.split_documents([parent]):
+            child.metadata["start_index"] += parent.metadata["start_index"]
+            child.metadata["parent_id"] = parent_id
+            chunks.append(child)
+    return chunks
+
+
+def build_collection(client: QdrantClient, name: str, chunks: list[Document], embedding_model, sparse_model):
+    vector_store = get_vectorstore(embedding_model, sparse_model, name, "hybrid", client=client)
+    # UUID point ids like an ingest makes, the FAISS and BM25 indexes keep them as strings.
+    ids = (str(uuid.UUID(int=number)) for number in range(len(chunks)))
+    IngestPipeline(vector_store, id_fn=lambda _: next(ids), embed_concurrency=1).run(chunks)
+    return vector_store
+
+
+def build_side_indexes(client: QdrantClient, name: str, backends: list[str], sparse_backends: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Build the FAISS and BM25 indexes of a bench collection and return the dense and sparse
+    backends it can be searched with. FAISS is an optional dependency and is left out if it
+    isn't installed; the BM25 index needs the NLTK data, which is downloaded if missing.
+    """
+    dense_built = [backend for backend in backends if backend == "qdrant"]
+    if "faiss" in backends:
+        try:
+            faiss_store.build_faiss_index(name, client=client)
+            dense_built.append("faiss")
+        except ImportError as e:
+            print(f"Skipping the faiss backend: {e}")
+
+    sparse_built = [backend for backend in sparse_backends if backend == "qdrant"]
+    if "bm25" in sparse_backends:
+        ensure_nltk_data()
+        bm25_store.build_bm25_index(name, client=client)
+        sparse_built.append("bm25")
+    return dense_built, sparse_built
+
+
+def is_relevant(doc: Document, question: dict) -> bool:
+    text = doc.page_content.lower()
+    return any(evidence.lower() in text for evidence in question["evidence"])
+
+
+def score_ranking(relevance: list[bool], k_values: list[int]) -> dict:
+    first_hit = next((rank for rank, hit in enumerate(relevance, start=1) if hit), None)
+    scores = {f"recall@{k}": float(first_hit is not None and first_hit <= k) for k in k_values}
+    scores["mrr"] = 1.0 / first_hit if first_hit else 0.0
+    return scores
+
+
+def latency_summary(latencies_ms: list[float]) -> dict:
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+def evaluate(search, questions: list[dict], k_values: list[int] = K_VALUES, repeats: int = 3) -> dict:
+    """
+    Run every question through `search(query, k) -> list[Document]` and aggregate quality and latency.
+    Each question is timed `repeats` times after a warm-up query.
+    """
+    max_k = max(k_values)
+    search(questions[0]["question"], max_k)
+
+    totals = {}
+    latencies = []
+    for question in questions:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            docs = search(question["question"], max_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        for key, value in score_ranking([is_relevant(doc, question) for doc in docs], k_values).items():
+            totals[key] = totals.get(key, 0.0) + value
+
+    result = {key: round(value / len(questions), 4) for key, value in totals.items()}
+    result["latency_ms"] = latency_summary(latencies)
+    return result
+
+
+def run_benchmark(search_types=SEARCH_TYPES, chunk_settings=CHUNK_SETTINGS, k_values=K_VALUES, repeats: int = 3, dim: int = 256,
+                  backends=BACKENDS, sparse_backends=SPARSE_BACKENDS, mmr_lambdas=MMR_LAMBDAS, route_chapters=ROUTE_CHAPTERS,
+                  parent_chunk_sizes=PARENT_CHUNK_SIZES) -> dict:
+    corpus, questions = load_fixtures()
+    embedding_model = HashingEmbeddings(dim)
+    sparse_model = HashingSparseEmbeddings()
+    client = QdrantClient(":memory:")
+
+    results = []
+    # Unique names, so a run never touches the indexes of an ingested collection.
+    run_id = uuid.uuid4().hex[:8]
+    for chunk_size, chunk_overlap in chunk_settings:
+        for parent_chunk_size in parent_chunk_sizes:
+            if parent_chunk_size and parent_chunk_size <= chunk_size:
+                continue
+            name = f"bench_{run_id}_{chunk_size}_{chunk_overlap}_{parent_chunk_size}"
+            try:
+                if parent_chunk_size:
+                    writer = parent_store.ParentStoreWriter(name)
+                    chunks = build_chunks(corpus, chunk_size, chunk_overlap, parent_chunk_size, writer)
+                    writer.commit()
+                else:
+                    chunks = build_chunks(corpus, chunk_size, chunk_overlap)
+                build_collection(client, name, chunks, embedding_model, sparse_model)
+                dense_built, sparse_built = build_side_indexes(client, name, backends, sparse_backends)
+                chapters.build_chapter_index(name, client=client)
+
+                for search_type in search_types:
+                    # Only the backends of the side(s) this search type uses are varied.
+                    dense_options = dense_built if search_type != "sparse" else ["qdrant"]
+                    sparse_options = sparse_built if search_type != "dense" else ["qdrant"]
+                    for backend in dense_options:
+                        for sparse_backend in sparse_options:
+                            pipeline = RetrievalPipeline(
+                                name, search_type, max(k_values), backend, sparse_backend,
+                                embedding_model=embedding_model, sparse_embedding_model=sparse_model, client=client,
+                            )
+                            for mmr_lambda in mmr_lambdas:
+                                for routed in route_chapters:
+                                    search = _pipeline_search(pipeline, mmr_lambda, routed)
+                                    results.append({
+                                        "search_type": search_type,
+                                        "backend": backend,
+                                        "sparse_backend": sparse_backend,
+                                        "mmr_lambda": mmr_lambda,
+                                        "route_chapters": routed,
+                                        "chunk_size": chunk_size,
+                                        "chunk_overlap": chunk_overlap,
+                                        "parent_chunk_size": parent_chunk_size,
+                                        "num_chunks": len(chunks),
+                                        **evaluate(search, questions, k_values, repeats),
+                                    })
+            finally:
+                delete_collection(name, client=client)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "embedding": embedding_model.model,
+        "num_questions": len(questions),
+        "repeats": repeats,
+        "results": results,
+    }
+
+
+def _pipeline_search(pipeline: RetrievalPipeline, mmr_lambda: float, route_chapters: int):
+    """search(query, k) with the chat app's options (MMR off at 1.0, no routing at 0)."""
+    def search(query: str, k: int) -> list[Document]:
+        pipeline.top_k = k
+        results = pipeline.search(
+            query, mmr_lambda=None if mmr_lambda >= 1.0 else mmr_lambda, route_chapters=route_chapters or None
+        )
+        return [doc for doc, _ in results]
+    return search
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _config_key(row: dict) -> tuple:
+    return tuple((key, value) for key, value in row.items() if not key.startswith(("recall@", "mrr", "latency", "num_")))
+
+
+def print_report(report: dict, baseline: dict | None = None):
+    previous = {_config_key(row): row for row in baseline["results"]} if baseline else {}
+    for row in report["results"]:
+        config = " ".join(f"{key}={value}" for key, value in _config_key(row))
+        recalls = " ".join(f"{key}={value:.3f}" for key, value in row.items() if key.startswith("recall@"))
+        latency = row["latency_ms"]
+        line = f"{config:<140} {recalls} mrr={row['mrr']:.3f} p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms"
+        old = previous.get(_config_key(row))
+        if old:
+            line += f"  (Δmrr={row['mrr'] - old['mrr']:+.3f}, Δp50={latency['p50'] - old['latency_ms']['p50']:+.2f}ms)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark on the fixture corpus.")
+    parser.add_argument("--search-types", nargs="+", default=SEARCH_TYPES, choices=SEARCH_TYPES)
+    parser.add_argument("--chunks", nargs="+", default=[f"{size}:{overlap}" for size, overlap in CHUNK_SETTINGS],
+                        help="chunk_size:chunk_overlap pairs")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS, help="Dense index backends.")
+    parser.add_argument("--sparse-backends", nargs="+", default=SPARSE_BACKENDS, choices=SPARSE_BACKENDS)
+    parser.add_argument("--mmr-lambdas", nargs="+", type=float, default=MMR_LAMBDAS, help="1.0 disables MMR.")
+    parser.add_argument("--route-chapters", nargs="+", type=int, default=ROUTE_CHAPTERS, help="0 disables chapter routing.")
+    parser.add_argument("--parent-chunk-sizes", nargs="+", type=int, default=PARENT_CHUNK_SIZES,
+                        help="0 for single-level collections, larger values for parent-child ones.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per question.")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON report.")
+    parser.add_argument("--baseline", type=Path, help="Previous JSON report to compare against.")
+    args = parser.parse_args()
+
+    chunk_settings = [tuple(int(part) for part in pair.split(":")) for pair in args.chunks]
+    report = run_benchmark(
+        args.search_types, chunk_settings, repeats=args.repeats, backends=args.backends, sparse_backends=args.sparse_backends,
+        mmr_lambdas=args.mmr_lambdas, route_chapters=args.route_chapters, parent_chunk_sizes=args.parent_chunk_sizes,
+    )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output or bench_dir / "results" / f"retrieval_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
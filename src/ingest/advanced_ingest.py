@@ -1,16 +1,40 @@
 import json
-from uuid import uuid4
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from src.util.env_check import get_rag_models
-from src.util.vectorstore import get_vectorstore
+from src.util.env_check import get_embed_model, get_sparse_model
+from src.util.vectorstore import get_vectorstore, get_embedding_dim
+from src.util.manifest import write_manifest, embedding_model_name, stamp_ingest_id
+from src.ingest.common import IngestProgress, chunk_id, file_hash, upload_documents, preprocess_documents
+from src.util.stemming import TextPreprocessor
+from src.ingest.pdf_pages import PdfPageReader
+from src.retrieval.chapters import build_chapter_index
+from src.util.parent_store import ParentStoreWriter
 from pathlib import Path
+from contextlib import ExitStack
 
-def advanced_ingest(path: str, collection_name: str,stem_and_stop: bool = False, chunk_size: int = 2000, chunk_overlap: int = 200,  page_offset: int = 26):
+def _metadata_header(metadata: dict) -> str:
+    ch_num = metadata.get("chapter_number", "Unknown")
+    ch_title = metadata.get("chapter_title", "Unknown Title")
+    source_file = metadata.get("source", "Unknown Source")
+    return (
+        f"Chapter {ch_num}: {ch_title}\n"
+        f"Source: {source_file.split('/')[-1]}\n"
+        f"----------\n"
+    )
+
+def advanced_ingest(path: str, collection_name: str,stem_and_stop: bool = False, chunk_size: int = 2000, chunk_overlap: int = 200,  page_offset: int = 26, resume: bool = False, quantization: str | None = None, parent_chunk_size: int | None = None,
+                    progress: IngestProgress | None = None, cancel_event=None):
     """
     Ingests a PDF into Qdrant by first splitting it into chapters based on a JSON mapping,
     merging chapter pages, chunking them, and injecting metadata into the text.
+    Chunk ids are derived from the file and chunk content, so re-running is idempotent
+    and resume=True continues an interrupted ingest.
+    quantization ('scalar', 'binary' or None) is applied when the collection is created.
+    Afterwards the chapter index used for chapter routing is built (see src.retrieval.chapters).
+    With parent_chunk_size set, chapters are first split into parent sections of that size and
+    only their small child chunks (chunk_size) are embedded; each child points to its parent,
+    whose text goes to the collection's parent store and is what retrieval returns.
+    progress and cancel_event are passed to upload_documents (used by background jobs, see src.ingest.jobs).
     Returns the count of documents ingested.
     """
     try:
@@ -19,100 +43,127 @@ def advanced_ingest(path: str, collection_name: str,stem_and_stop: bool = False,
 
         with open(json_path, "r") as f:
             chapters_json = json.load(f)
-            
-        loader = PyPDFLoader(path)
-        pages = loader.load()
-        
-        if not pages:
-            raise ValueError("The PDF appears to be empty or unreadable.")
 
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, 
             chunk_overlap=chunk_overlap,
+            add_start_index=True,
             separators=["\n\n", "\n", " ", ""]
         )
-        
-        all_chunks = []
-        
-        for chapter in chapters_json:
-            start_page = chapter["start_page"]
-            end_page = chapter["end_page"]
-            
-            start_idx = start_page + page_offset - 1
-            
-            if end_page is not None:
-                end_idx = end_page + page_offset - 1
-                chapter_pages = pages[start_idx : end_idx + 1] 
-            else:
-                chapter_pages = pages[start_idx : ]
-                
-            chapter_text = "\n".join([page.page_content for page in chapter_pages])
-            
-            if len(chapter_pages) > 0:
-                chapter_metadata = chapter_pages[0].metadata.copy()
-            else:
-                chapter_metadata = {}
-            
-            keys_to_remove = [
-                "page", "page_label", "subject", "producer", 
-                "creator", "creationdate", "author", "moddate", "title"
-            ]
-            for key in keys_to_remove:
-                chapter_metadata.pop(key, None)
-
-            chapter_metadata["chapter_number"] = chapter["chapter_number"]
-            chapter_metadata["chapter_title"] = chapter["title"]
-            
-            chapter_doc = Document(page_content=chapter_text, metadata=chapter_metadata)
-            chapter_chunks = text_splitter.split_documents([chapter_doc])
-            
-            
-            all_chunks.extend(chapter_chunks)    
-            
-        for chunk in all_chunks:
-            ch_num = chunk.metadata.get("chapter_number", "Unknown")
-            ch_title = chunk.metadata.get("chapter_title", "Unknown Title")
-            source_file = chunk.metadata.get("source", "Unknown Source")
-            
-            metadata_header = (
-                f"Chapter {ch_num}: {ch_title}\n"
-                f"Source: {source_file.split('/')[-1]}\n"
-                f"----------\n"
+        parent_splitter = None
+        if parent_chunk_size:
+            if parent_chunk_size <= chunk_size:
+                raise ValueError("parent_chunk_size must be larger than chunk_size.")
+            parent_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=parent_chunk_size,
+                chunk_overlap=chunk_overlap,
+                add_start_index=True,
+                separators=["\n\n", "\n", " ", ""]
             )
+        source_hash = file_hash(path)
+        with ExitStack() as stack:
+            reader = stack.enter_context(PdfPageReader(path, source_hash=source_hash))
+            if reader.total_pages == 0:
+                raise ValueError("The PDF appears to be empty or unreadable.")
 
             if stem_and_stop:
-                from src.util.stemming import preprocess_text
-                chunk.metadata["raw_text"] = chunk.page_content
-                chunk.metadata["preprocessed"] = True
-                chunk.page_content = preprocess_text(chunk.page_content)
-            chunk.page_content = metadata_header + chunk.page_content
-        _, embedding_model, sparse_model = get_rag_models()
-        vector_store = get_vectorstore(embedding_model, sparse_model, collection_name)
-
-        uuids = [str(uuid4()) for _ in range(len(all_chunks))]
-
-        batch_size = 100
-        for i in range(0, len(all_chunks), batch_size):
-            batch_docs = all_chunks[i : i + batch_size]
-            batch_ids = uuids[i : i + batch_size]
-            
-            # print(f"Ingesting batch {i // batch_size + 1} ({len(batch_docs)} docs)...")
-            for idx, doc in enumerate(batch_docs):
-                if len(doc.page_content) > 7000: 
-                     print(f"Large chunk detected (idx {idx}): {len(doc.page_content)} chars")
-            
+                preprocessor = stack.enter_context(TextPreprocessor(workers=reader.workers))
+            if progress is not None:
+                # Chapters start after the front matter.
+                progress.total_pages = max(reader.total_pages - page_offset, 1)
+
+            def iter_chunks():
+                # Only the pages of the chapter being chunked are held in memory.
+                for chapter in chapters_json:
+                    start_page = chapter["start_page"]
+                    end_page = chapter["end_page"]
+
+                    start_idx = start_page + page_offset - 1
+
+                    if end_page is not None:
+                        end_idx = end_page + page_offset - 1
+                        chapter_pages = list(reader.iter_pages(start_idx, end_idx + 1))
+                    else:
+                        chapter_pages = list(reader.iter_pages(start_idx))
+
+                    if progress is not None:
+                        progress.read_pages(len(chapter_pages))
+                    chapter_text = "\n".join([page.page_content for page in chapter_pages])
+
+                    if len(chapter_pages) > 0:
+                        chapter_metadata = chapter_pages[0].metadata.copy()
+                    else:
+                        chapter_metadata = {}
+
+                    keys_to_remove = [
+                        "page", "page_label", "subject", "producer", 
+                        "creator", "creationdate", "author", "moddate", "title"
+                    ]
+                    for key in keys_to_remove:
+                        chapter_metadata.pop(key, None)
+
+                    chapter_metadata["chapter_number"] = chapter["chapter_number"]
+                    chapter_metadata["chapter_title"] = chapter["title"]
+
+                    chapter_doc = Document(page_content=chapter_text, metadata=chapter_metadata)
+                    if parent_splitter is None:
+                        chapter_chunks = text_splitter.split_documents([chapter_doc])
+                    else:
+                        chapter_chunks = []
+                        for parent in parent_splitter.split_documents([chapter_doc]):
+                            parent_start = parent.metadata["start_index"]
+                            parent_id = chunk_id(source_hash, "parent:" + parent.page_content)
+                            parent_writer.add(parent_id, _metadata_header(parent.metadata) + parent.page_content, parent_start)
+                            for child in text_splitter.split_documents([parent]):
+                                # Offsets within the chapter, like the chunks of a single-level ingest.
+                                child.metadata["start_index"] += parent_start
+                                child.metadata["parent_id"] = parent_id
+                                chapter_chunks.append(child)
+
+                    if stem_and_stop:
+                        chapter_chunks = preprocess_documents(chapter_chunks, preprocessor)
+
+                    for chunk in chapter_chunks:
+                        chunk.page_content = _metadata_header(chunk.metadata) + chunk.page_content
+                        yield chunk
+
+            embedding_model, sparse_model = get_embed_model(), get_sparse_model()
+            vector_store = get_vectorstore(embedding_model, sparse_model, collection_name, quantization=quantization)
+            write_manifest(
+                collection_name,
+                embedding_model=embedding_model_name(embedding_model),
+                embedding_dim=get_embedding_dim(embedding_model),
+                stem_and_stop=stem_and_stop,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                ingest_strategy="chapter",
+                source=Path(path).name,
+                source_hash=source_hash,
+                quantization=quantization,
+                page_offset=page_offset,
+                parent_chunk_size=parent_chunk_size,
+            )
+
+            params = {"source_hash": source_hash, "strategy": "chapter", "stem_and_stop": stem_and_stop,
+                      "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "page_offset": page_offset}
+            if parent_chunk_size:
+                params["parent_chunk_size"] = parent_chunk_size
+            # Every parent is written again on resume (skipped children are still generated), so the
+            # store is only swapped in once the whole book went through.
+            parent_writer = ParentStoreWriter(collection_name) if parent_splitter is not None else None
             try:
-                vector_store.add_documents(documents=batch_docs, ids=batch_ids)
-            except Exception as e:
-                print(f"Error in batch {i // batch_size + 1}: {e}")
-                # Print the largest chunk in this batch for inspection
-                largest_chunk = max(batch_docs, key=lambda d: len(d.page_content))
-                print(f"Largest chunk in failed batch: {len(largest_chunk.page_content)} chars. "\
-                      "Try using smaller chunk size and change collection name to avoid errors.")
-                print(f"Context preview: {largest_chunk.page_content[:200]}...")
-                raise e
-        
-        return len(all_chunks)
+                count = upload_documents(vector_store, iter_chunks(), source_hash, collection_name, params, resume=resume,
+                                         progress=progress, cancel_event=cancel_event)
+            except BaseException:
+                if parent_writer is not None:
+                    parent_writer.abort()
+                raise
+            if parent_writer is not None:
+                parent_writer.commit()
+            # Chapter payload indexes and centroids, used to route queries to chapters.
+            build_chapter_index(collection_name, client=vector_store.client)
+            stamp_ingest_id(collection_name)
+            return count
 
     except Exception as e:
         raise e
\ No newline at end of file
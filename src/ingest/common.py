@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+from uuid import UUID, uuid5
+
+from langchain_core.documents import Document
+
+from src.ingest.pipeline import IngestPipeline
+from src.util.bm25_store import build_bm25_index, remove_bm25_index
+
+log = logging.getLogger(__name__)
+
+project_root = Path(__file__).resolve().parents[2]
+checkpoint_dir = project_root / "data" / "vector_db" / "checkpoints"
+
+# Fixed namespace so the same chunk of the same book always gets the same point id.
+CHUNK_NAMESPACE = UUID("6f1c9a52-3b7e-4d0a-9c1e-5a8e2f4b7d31")
+
+
+def file_hash(path) -> str:
+    """sha256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source_hash: str, content: str) -> str:
+    """Deterministic point id derived from the source file hash and the chunk content."""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return str(uuid5(CHUNK_NAMESPACE, f"{source_hash}:{content_hash}"))
+
+
+def _checkpoint_path(collection_name: str) -> Path:
+    return checkpoint_dir / f"{collection_name}.json"
+
+
+def load_checkpoint(collection_name: str, params: dict) -> int:
+    """Number of leading chunks already ingested by a previous run with the same params (0 if none)."""
+    path = _checkpoint_path(collection_name)
+    if not path.exists():
+        return 0
+    with open(path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("params") != params:
+        return 0
+    return checkpoint.get("completed", 0)
+
+
+def save_checkpoint(collection_name: str, params: dict, completed: int):
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    path = _checkpoint_path(collection_name)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"params": params, "completed": completed}, f)
+    tmp_path.replace(path)
+
+
+def clear_checkpoint(collection_name: str):
+    _checkpoint_path(collection_name).unlink(missing_ok=True)
+
+
+def has_checkpoint(collection_name: str) -> bool:
+    """Whether an interrupted ingest left a checkpoint that can be resumed."""
+    return _checkpoint_path(collection_name).exists()
+
+
+class IngestProgress:
+    """
+    Chunk-level progress of one ingest, for reporting progress, throughput and ETA.
+
+    The ingest functions report the pages they read and the chunks flowing through and
+    being stored. The number of chunks isn't known before the book is split, so the total
+    is extrapolated from the chunks produced per page read so far.
+
+    Args:
+        on_update: Called with the progress object after every stored batch.
+    """
+
+    def __init__(self, on_update=None):
+        self.on_update = on_update
+        self.started = time.time()
+        self.total_pages = 0
+        self.pages_read = 0
+        self.chunks_generated = 0
+        self.chunks_stored = 0
+        # Chunks already stored by an interrupted run, not counted in the throughput.
+        self.resumed_from = 0
+
+    def read_pages(self, count: int = 1):
+        self.pages_read += count
+
+    def track(self, docs: Iterable[Document]) -> Iterator[Document]:
+        for doc in docs:
+            self.chunks_generated += 1
+            yield doc
+
+    def stored(self, completed: int):
+        self.chunks_stored = completed
+        if self.on_update is not None:
+            self.on_update(self)
+
+    @property
+    def estimated_chunks(self) -> int | None:
+        if not self.pages_read or not self.total_pages:
+            return None
+        if self.pages_read >= self.total_pages:
+            return self.chunks_generated
+        return max(self.chunks_generated, round(self.chunks_generated * self.total_pages / self.pages_read))
+
+    @property
+    def chunks_per_second(self) -> float:
+        elapsed = time.time() - self.started
+        return (self.chunks_stored - self.resumed_from) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> float | None:
+        total, rate = self.estimated_chunks, self.chunks_per_second
+        if total is None or rate <= 0:
+            return None
+        return max(0.0, (total - self.chunks_stored) / rate)
+
+
+def preprocess_documents(docs: Iterable[Document], preprocessor, batch_size: int = 256) -> Iterator[Document]:
+    """
+    Stem and remove stop words from a stream of chunks, keeping the original text in metadata.
+    Chunks are buffered so the preprocessor can spread each batch over its process pool.
+    """
+    batch = []
+
+    def flush():
+        processed = preprocessor.preprocess_batch([doc.page_content for doc in batch])
+        for doc, text in zip(batch, processed):
+            doc.metadata["raw_text"] = doc.page_content
+            doc.metadata["preprocessed"] = True
+            doc.page_content = text
+        return batch
+
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield from flush()
+            batch = []
+    if batch:
+        yield from flush()
+
+
+def upload_documents(vector_store, docs: Iterable[Document], source_hash: str, collection_name: str, params: dict, resume: bool = False, embed_concurrency: int | None = None,
+                     progress: IngestProgress | None = None, cancel_event: threading.Event | None = None) -> int:
+    """
+    Upload a stream of chunks through the staged ingest pipeline, checkpointing after every batch.
+
+    Chunks are consumed lazily, so parsing and splitting run ahead while earlier batches
+    are being embedded and stored. With resume=True the chunks recorded in the checkpoint
+    are skipped, and remaining chunks that already exist in Qdrant are not embedded again.
+    Because ids are deterministic (see chunk_id), re-running without resume overwrites
+    points instead of duplicating them. Afterwards the collection's native BM25 index is rebuilt.
+
+    Args:
+        vector_store: Vectorstore returned by get_vectorstore.
+        docs: Chunks to upload, in a deterministic order.
+        source_hash: Hash of the source file, see file_hash.
+        collection_name: Qdrant collection name.
+        params: Ingest parameters, a checkpoint is only reused if they match.
+        resume: Continue an interrupted ingest.
+        embed_concurrency: Number of concurrent dense embedding calls.
+        progress: Optional IngestProgress updated after every stored batch.
+        cancel_event: Set it to stop the ingest, see IngestPipeline (the checkpoint is kept for resuming).
+
+    Returns the number of chunks in the stream.
+    """
+    skip = load_checkpoint(collection_name, params) if resume else 0
+
+    def on_batch_done(completed: int):
+        save_checkpoint(collection_name, params, completed)
+        if progress is not None:
+            progress.stored(completed)
+
+    if progress is not None:
+        progress.resumed_from = progress.chunks_stored = skip
+        docs = progress.track(docs)
+
+    pipeline = IngestPipeline(
+        vector_store,
+        id_fn=lambda doc: chunk_id(source_hash, doc.page_content),
+        on_batch_done=on_batch_done,
+        embed_concurrency=embed_concurrency,
+        skip=skip,
+        skip_existing=resume,
+        cancel_event=cancel_event,
+    )
+    count = pipeline.run(docs)
+
+    clear_checkpoint(collection_name)
+    try:
+        build_bm25_index(collection_name, client=vector_store.client)
+    except Exception:
+        # Optional index, the collection is usable without it. The previous one is removed so
+        # it isn't taken for an index of the new content.
+        log.exception("BM25 index of '%s' not built", collection_name)
+        remove_bm25_index(collection_name)
+    return count
@@ -0,0 +1,218 @@
+"""
+Background ingestion jobs.
+
+Ingests run on a small thread pool owned by the process instead of inside a Streamlit
+request, so a long ingest survives closing the tab and the page only polls its progress.
+Jobs are threads of the app process because the embedded Qdrant storage can only be
+opened by one process. Their state is kept in a SQLite table, so finished and interrupted
+jobs are still listed after a restart (an interrupted job can be resumed from its
+checkpoint by submitting it again with resume=True). A new collection whose ingest is
+cancelled or fails before its first checkpoint is deleted again, so its name can simply
+be ingested from scratch.
+
+At most INGEST_MAX_JOBS (default 1) ingests run at once, the others wait in the queue, so
+embedding a book doesn't take the embedding server away from chat sessions.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.ingest.common import IngestProgress, has_checkpoint
+from src.ingest.pipeline import IngestCancelled
+
+project_root = Path(__file__).resolve().parents[2]
+jobs_db_path = project_root / "data" / "cache" / "ingest_jobs.sqlite"
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled", "interrupted")
+
+# Minimum time between two progress writes of a job.
+_PROGRESS_INTERVAL = 0.5
+
+
+def _ingest_function(strategy: str):
+    if strategy == "simple":
+        from src.ingest.simple_ingest import simple_ingest
+        return simple_ingest
+    if strategy == "chapter":
+        from src.ingest.advanced_ingest import advanced_ingest
+        return advanced_ingest
+    raise ValueError("strategy must be 'simple' or 'chapter'")
+
+
+class IngestJobRunner:
+    """
+    Runs ingests in the background and records their progress.
+
+    Args:
+        max_concurrent: Ingests running at the same time, further jobs are queued.
+        path: SQLite file of the job table.
+    """
+
+    def __init__(self, max_concurrent: int = 1, path: Path = jobs_db_path):
+        self.max_concurrent = max_concurrent
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="ingest-job")
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, collection TEXT NOT NULL, strategy TEXT NOT NULL, source TEXT NOT NULL, "
+            "params TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "pages_total INTEGER DEFAULT 0, pages_read INTEGER DEFAULT 0, chunks_stored INTEGER DEFAULT 0, "
+            "chunks_estimated INTEGER, chunks_per_second REAL DEFAULT 0, eta_seconds REAL, chunks INTEGER, error TEXT)"
+        )
+        # Jobs of a previous process that didn't finish; their checkpoint allows resuming them.
+        self._conn.execute(
+            "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running')", (time.time(),)
+        )
+        self._conn.commit()
+
+    def _update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def submit(self, strategy: str, path: str, collection_name: str, faiss_index: str | None = None, **params) -> str:
+        """
+        Queue an ingest. Returns the job id.
+
+        Args:
+            strategy: 'simple' or 'chapter'.
+            path: PDF to ingest.
+            collection_name: Target collection.
+            faiss_index: Also build a FAISS index of this type once the ingest is done.
+            **params: Passed to the ingest function (chunk_size, resume, quantization, ...).
+        """
+        _ingest_function(strategy)
+        job_id = uuid.uuid4().hex
+        cancel_event = threading.Event()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, collection, strategy, source, params, status, created_at) VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, collection_name, strategy, str(path), json.dumps({**params, "faiss_index": faiss_index}), time.time()),
+            )
+            self._conn.commit()
+            self._cancel_events[job_id] = cancel_event
+        self._executor.submit(self._run, job_id, strategy, str(path), collection_name, faiss_index, params, cancel_event)
+        return job_id
+
+    def _run(self, job_id, strategy, path, collection_name, faiss_index, params, cancel_event):
+        if cancel_event.is_set():
+            self._update(job_id, status="cancelled", finished_at=time.time())
+            return
+
+        last_write = 0.0
+
+        def on_update(progress: IngestProgress):
+            nonlocal last_write
+            now = time.time()
+            if now - last_write < _PROGRESS_INTERVAL:
+                return
+            last_write = now
+            self._update(
+                job_id,
+                pages_total=progress.total_pages,
+                pages_read=progress.pages_read,
+                chunks_stored=progress.chunks_stored,
+                chunks_estimated=progress.estimated_chunks,
+                chunks_per_second=progress.chunks_per_second,
+                eta_seconds=progress.eta_seconds,
+            )
+
+        from src.util.vectorstore import delete_collection, get_all_collection_names
+
+        progress = IngestProgress(on_update=on_update)
+        self._update(job_id, status="running", started_at=progress.started)
+        existed = collection_name in get_all_collection_names()
+        try:
+            count = _ingest_function(strategy)(
+                path, collection_name, progress=progress, cancel_event=cancel_event, **params
+            )
+            if faiss_index:
+                from src.util.faiss_store import build_faiss_index
+                build_faiss_index(collection_name, faiss_index)
+            status, error = "completed", None
+        except IngestCancelled:
+            count, status, error = None, "cancelled", None
+        except Exception as e:
+            count, status, error = None, "failed", str(e)
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+        if status != "completed" and not existed and not has_checkpoint(collection_name):
+            # Nothing to resume: a half-built collection would only block a new ingest under its name.
+            try:
+                delete_collection(collection_name)
+            except Exception as e:
+                error = f"{error or 'Cancelled'}; the partial collection could not be deleted: {e}"
+
+        # Chat sessions of this process rebuild their search pipelines for the collection.
+        from src.retrieval.pipelines import invalidate_pipelines
+        invalidate_pipelines(collection_name)
+        self._update(
+            job_id,
+            status=status,
+            finished_at=time.time(),
+            error=error,
+            chunks=count,
+            pages_read=progress.pages_read,
+            chunks_stored=progress.chunks_stored,
+            chunks_per_second=progress.chunks_per_second,
+            eta_seconds=None,
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop. A running ingest stops after its current batch."""
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def list(self, limit: int = 20) -> list[dict]:
+        """Most recent jobs first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_job(row) for row in rows]
+
+    def active_collections(self) -> set[str]:
+        """Collections with a queued or running job."""
+        with self._lock:
+            rows = self._conn.execute("SELECT collection FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        return {row["collection"] for row in rows}
+
+
+def _job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    return job
+
+
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_job_runner() -> IngestJobRunner:
+    """The process-wide job runner, created on first use."""
+    global _RUNNER
+    with _RUNNER_LOCK:
+        if _RUNNER is None:
+            _RUNNER = IngestJobRunner(int(os.getenv("INGEST_MAX_JOBS", 1)))
+        return _RUNNER
@@ -0,0 +1,210 @@
+"""
+On-disk cache of parsed PDF pages, keyed by the PDF's content hash.
+
+Parsing is the slowest part of chunking a book, and it gives the same text every time, so
+the cleaned text of every parsed page is kept in data/cache/pages/<sha256>/: one UTF-8
+blob with an offsets array, the page labels, a mask of the pages parsed so far and the
+document info. Later ingests of the same book (another chunk size, the other strategy, a
+renamed copy of the file) read the pages from there, memory-mapped, instead of parsing
+the PDF.
+
+Every save writes a new version directory and then points the CURRENT file at it with
+os.replace, so readers (which may still have the previous version memory-mapped) and
+crashes never see a partial cache. Saves of the same book take a lock file and merge
+the pages of the current version, so concurrent ingests don't drop each other's pages.
+Versions that are no longer current are removed once nothing holds them open.
+
+With the cache enabled pages are cleaned (clean_page_text) before they are chunked and
+cached, so an ingest chunks the same text whether its pages were parsed or read from the
+cache. With PAGE_CACHE=false they are chunked exactly as extracted.
+"""
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parents[2]
+page_cache_root = project_root / "data" / "cache" / "pages"
+
+# Bump when clean_page_text changes, cached pages of other versions are parsed again.
+PAGE_TEXT_VERSION = 2
+
+# A save lock older than this was left by a crashed process and is taken over.
+_STALE_LOCK_SECONDS = 60
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def clean_page_text(text: str) -> str:
+    """Normalize extracted page text: newlines, control characters, trailing spaces and runs of blank lines."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub("", text)
+    text = _TRAILING_SPACE.sub("\n", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def page_cache_enabled() -> bool:
+    return os.getenv("PAGE_CACHE", "true").lower() in ("1", "true", "yes")
+
+
+def page_cache_dir(source_hash: str) -> Path:
+    return page_cache_root / source_hash
+
+
+@contextmanager
+def _save_lock(directory: Path, poll: float = 0.05):
+    """Exclusive lock of a book's cache directory between processes and threads (a lock file)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    lock_path = directory / "LOCK"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > _STALE_LOCK_SECONDS:
+                    lock_path.unlink(missing_ok=True)
+                    continue
+            except OSError:
+                continue
+            time.sleep(poll)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        lock_path.unlink(missing_ok=True)
+
+
+class PageCache:
+    """
+    Cached pages of one PDF. Pages parsed during an ingest are added with `add` and
+    written together with the already cached ones by `save`.
+
+    Args:
+        source_hash: sha256 of the PDF (see src.ingest.common.file_hash).
+    """
+
+    def __init__(self, source_hash: str):
+        self.source_hash = source_hash
+        self._new = {}
+        self._load()
+
+    def _current_version(self) -> Path | None:
+        directory = page_cache_dir(self.source_hash)
+        try:
+            version = (directory / "CURRENT").read_text().strip()
+        except OSError:
+            return None
+        return directory / version if version else None
+
+    def _load(self):
+        self.total_pages = None
+        self.metadata = {}
+        self._parsed = None
+        self._offsets = None
+        self._labels = None
+        self._texts = b""
+
+        version_dir = self._current_version()
+        if version_dir is None:
+            return
+        try:
+            with open(version_dir / "meta.json", "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("text_version") != PAGE_TEXT_VERSION:
+            return
+        self.total_pages = meta["total_pages"]
+        self.metadata = meta["metadata"]
+        self._parsed = np.load(version_dir / "parsed.npy")
+        self._offsets = np.load(version_dir / "offsets.npy", mmap_mode="r")
+        self._labels = np.load(version_dir / "labels.npy")
+        if self._offsets[-1]:
+            self._texts = np.memmap(version_dir / "texts.bin", dtype=np.uint8, mode="r")
+
+    def has(self, start: int, end: int) -> bool:
+        """Whether pages [start, end) are all cached, saved or added since."""
+        return all(
+            page_number in self._new or (self._parsed is not None and self._parsed[page_number])
+            for page_number in range(start, end)
+        )
+
+    def get(self, page_number: int) -> tuple[str, str]:
+        """(text, page label) of a cached page."""
+        if page_number in self._new:
+            return self._new[page_number]
+        start, end = int(self._offsets[page_number]), int(self._offsets[page_number + 1])
+        return bytes(self._texts[start:end]).decode("utf-8"), str(self._labels[page_number])
+
+    def add(self, total_pages: int, metadata: dict, page_number: int, text: str, label: str):
+        self.total_pages = total_pages
+        self.metadata = metadata
+        self._new[page_number] = (text, label)
+
+    def save(self):
+        """Write the cached and the newly parsed pages as a new version. Does nothing if no page was added."""
+        if not self._new:
+            return
+        with _save_lock(page_cache_dir(self.source_hash)):
+            self._save()
+
+    def _save(self):
+        new, total_pages, metadata = self._new, self.total_pages, self.metadata
+        # Pages another ingest of the same book saved in the meantime are kept too.
+        self._new = {}
+        self._load()
+        self._new = new
+        if self.total_pages != total_pages:
+            self._parsed = None
+        self.total_pages, self.metadata = total_pages, metadata
+
+        parsed = np.zeros(total_pages, dtype=bool)
+        if self._parsed is not None:
+            parsed[:] = self._parsed
+        parsed[list(new)] = True
+
+        texts, labels = [], []
+        for page_number in range(total_pages):
+            text, label = self.get(page_number) if parsed[page_number] else ("", "")
+            texts.append(text.encode("utf-8"))
+            labels.append(label)
+        offsets = np.zeros(total_pages + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(text) for text in texts])
+
+        directory = page_cache_dir(self.source_hash)
+        version = uuid.uuid4().hex
+        version_dir = directory / f"{version}.tmp"
+        version_dir.mkdir(parents=True)
+        with open(version_dir / "texts.bin", "wb") as f:
+            for text in texts:
+                f.write(text)
+        np.save(version_dir / "offsets.npy", offsets)
+        np.save(version_dir / "labels.npy", np.asarray(labels, dtype=str))
+        np.save(version_dir / "parsed.npy", parsed)
+        with open(version_dir / "meta.json", "w") as f:
+            json.dump({"total_pages": total_pages, "metadata": metadata, "text_version": PAGE_TEXT_VERSION}, f)
+
+        version_dir.rename(directory / version)
+        pointer = directory / f"CURRENT.{version}.tmp"
+        pointer.write_text(version)
+        os.replace(pointer, directory / "CURRENT")
+
+        self._new = {}
+        self._load()
+        self._remove_old_versions(version)
+
+    def _remove_old_versions(self, current: str):
+        for path in page_cache_dir(self.source_hash).iterdir():
+            # .tmp versions are still being written by another save.
+            if path.is_dir() and path.name != current and not path.name.endswith(".tmp"):
+                # Fails for versions another reader still has memory-mapped (on Windows), retried on the next save.
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from src.ingest.page_cache import PageCache, clean_page_text, page_cache_enabled
+
+# Per-page metadata, the rest is the document info shared by every page.
+_PAGE_FIELDS = ("source", "total_pages", "page", "page_label")
+
+# The PdfReader of a pool worker (created per PdfPageReader, see __enter__), so each task
+# doesn't re-read the xref table. Keyed by path and file version: a new upload may replace the file.
+_WORKER_READER = None
+
+
+def _worker_reader(path: str, version: str) -> PdfReader:
+    global _WORKER_READER
+    if _WORKER_READER is None or _WORKER_READER[0] != (path, version):
+        _WORKER_READER = ((path, version), PdfReader(path))
+    return _WORKER_READER[1]
+
+
+def _document_metadata(reader: PdfReader) -> dict:
+    """PDF document info in the same shape PyPDFLoader puts into every page's metadata."""
+    info = reader.metadata or {}
+    return {str(key).lstrip("/").lower(): str(value) for key, value in info.items()}
+
+
+def _page_label(reader: PdfReader, page_number: int) -> str:
+    try:
+        return reader.page_labels[page_number]
+    except (IndexError, KeyError, ValueError):
+        return str(page_number + 1)
+
+
+def _parse_pages(reader: PdfReader, path: str, start: int, end: int, clean: bool = False) -> list[tuple[str, dict]]:
+    """Extract the text (cleaned with clean_page_text if `clean`) and metadata of pages [start, end)."""
+    base_metadata = _document_metadata(reader)
+    total_pages = len(reader.pages)
+    pages = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text() or ""
+        if clean:
+            text = clean_page_text(text)
+        metadata = {
+            **base_metadata,
+            "source": path,
+            "total_pages": total_pages,
+            "page": page_number,
+            "page_label": _page_label(reader, page_number),
+        }
+        pages.append((text, metadata))
+    return pages
+
+
+def _parse_range(path: str, version: str, start: int, end: int, clean: bool) -> list[tuple[str, dict]]:
+    """_parse_pages inside a pool worker."""
+    return _parse_pages(_worker_reader(path, version), path, start, end, clean)
+
+
+class PdfPageReader:
+    """
+    Parses a PDF in page ranges on a process pool and streams the pages back in order.
+
+    Only a bounded number of ranges is in flight at once, so memory stays proportional
+    to the number of workers rather than the size of the book. Small PDFs are parsed
+    in-process since starting the pool would cost more than it saves.
+
+    Parsed pages are kept in a page cache keyed by the file's hash (see page_cache), so
+    pages an earlier ingest of the same book already parsed are read from there and the
+    pool is only started if some are missing. Pages go through clean_page_text when the
+    cache is used, so cached and parsed pages are the same text. Set PAGE_CACHE=false to
+    always parse and get the pages exactly as extracted.
+
+    Use as a context manager:
+        with PdfPageReader(path) as reader:
+            for page in reader.iter_pages(10, 40):
+                ...
+
+    Args:
+        path: Path to the PDF.
+        workers: Number of parser processes. Defaults to the number of cores (max 8).
+        pages_per_task: Number of pages each worker parses per task.
+        source_hash: sha256 of the file if the caller already computed it (see file_hash).
+    """
+
+    def __init__(self, path, workers: int | None = None, pages_per_task: int = 8, source_hash: str | None = None):
+        self.path = str(path)
+        self.workers = workers or min(os.cpu_count() or 1, 8)
+        self.pages_per_task = pages_per_task
+        self.cache = None
+        if page_cache_enabled():
+            from src.ingest.common import file_hash
+            source_hash = source_hash or file_hash(self.path)
+            self.cache = PageCache(source_hash)
+        stat = os.stat(self.path)
+        # Identifies the file's contents for the pool workers' readers.
+        self.version = source_hash or f"{stat.st_mtime_ns}:{stat.st_size}"
+        # In-process reader, opened on first use and dropped on exit so the book isn't kept in memory.
+        self._reader = None
+        if self.cache is not None and self.cache.total_pages is not None:
+            self.total_pages = self.cache.total_pages
+        else:
+            self._reader = PdfReader(self.path)
+            self.total_pages = len(self._reader.pages)
+        self._pool = None
+
+    def _get_reader(self) -> PdfReader:
+        if self._reader is None:
+            self._reader = PdfReader(self.path)
+        return self._reader
+
+    def __enter__(self):
+        fully_cached = self.cache is not None and self.cache.has(0, self.total_pages)
+        if not fully_cached and self.workers > 1 and self.total_pages > self.pages_per_task * 2:
+            # spawn instead of fork: Streamlit runs ingestion from a multithreaded process.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        self._reader = None
+        if self.cache is not None:
+            try:
+                # Also after a failed or cancelled ingest: the pages parsed so far are still valid.
+                self.cache.save()
+            except OSError as e:
+                print(f"Page cache not saved: {e}")
+
+    def _cached_range(self, start: int, end: int) -> list[tuple[str, dict]]:
+        pages = []
+        for page_number in range(start, end):
+            text, label = self.cache.get(page_number)
+            metadata = {
+                **self.cache.metadata,
+                "source": self.path,
+                "total_pages": self.total_pages,
+                "page": page_number,
+                "page_label": label,
+            }
+            pages.append((text, metadata))
+        return pages
+
+    def _remember(self, pages: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+        if self.cache is not None:
+            for text, metadata in pages:
+                document_metadata = {key: value for key, value in metadata.items() if key not in _PAGE_FIELDS}
+                self.cache.add(self.total_pages, document_metadata, metadata["page"], text, metadata["page_label"])
+        return pages
+
+    def iter_pages(self, start: int = 0, end: int | None = None) -> Iterator[Document]:
+        """Yield pages [start, end) as Documents, in page order. Out of range bounds are clamped like a slice."""
+        start, end, _ = slice(start, end).indices(self.total_pages)
+        ranges = [
+            (range_start, min(range_start + self.pages_per_task, end))
+            for range_start in range(start, end, self.pages_per_task)
+        ]
+
+        def cached(range_start, range_end):
+            return self.cache is not None and self.cache.has(range_start, range_end)
+
+        if self._pool is None:
+            for range_start, range_end in ranges:
+                if cached(range_start, range_end):
+                    pages = self._cached_range(range_start, range_end)
+                else:
+                    pages = self._remember(_parse_pages(self._get_reader(), self.path, range_start, range_end, self.cache is not None))
+                for text, metadata in pages:
+                    yield Document(page_content=text, metadata=metadata)
+            return
+
+        def submit(range_start, range_end):
+            # Cached ranges take a slot in the queue too, so pages still come back in order.
+            if cached(range_start, range_end):
+                return self._cached_range(range_start, range_end)
+            return self._pool.submit(_parse_range, self.path, self.version, range_start, range_end, self.cache is not None)
+
+        max_in_flight = self.workers * 2
+        pending = deque()
+        ranges = iter(ranges)
+        for range_start, range_end in ranges:
+            pending.append(submit(range_start, range_end))
+            if len(pending) >= max_in_flight:
+                break
+
+        while pending:
+            task = pending.popleft()
+            pages = task if isinstance(task, list) else self._remember(task.result())
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(submit(*next_range))
+            for text, metadata in pages:
+                yield Document(page_content=text, metadata=metadata)
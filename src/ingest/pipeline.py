@@ -0,0 +1,300 @@
+import os
+import queue
+import threading
+import time
+from typing import Iterable
+
+from langchain_core.documents import Document
+from qdrant_client.http.models import PointStruct, SparseVector
+
+from src.util.vectorstore import store_lock
+
+_END = object()
+
+
+class IngestCancelled(Exception):
+    """Raised by IngestPipeline.run when the ingest was cancelled. Stored chunks are kept (and checkpointed)."""
+
+
+class AdaptiveBatchSizer:
+    """
+    Picks embedding batch sizes from chunk lengths and observed embedding latency.
+
+    A batch is closed once it holds enough characters to keep one embedding call busy
+    for about `target_seconds`, based on a smoothed estimate of characters per second.
+
+    Args:
+        target_seconds: Desired duration of one embedding call.
+        min_docs: Never send fewer chunks than this (except for the last batch).
+        max_docs: Never send more chunks than this.
+        initial_chars: Character budget used before any latency has been observed.
+    """
+
+    def __init__(self, target_seconds: float = 2.0, min_docs: int = 8, max_docs: int = 256, initial_chars: int = 100_000):
+        self.target_seconds = target_seconds
+        self.min_docs = min_docs
+        self.max_docs = max_docs
+        self.char_budget = initial_chars
+        self._lock = threading.Lock()
+
+    def observe(self, chars: int, seconds: float):
+        if seconds <= 0 or chars <= 0:
+            return
+        budget = chars / seconds * self.target_seconds
+        with self._lock:
+            self.char_budget = max(1_000, 0.5 * self.char_budget + 0.5 * budget)
+
+    def is_full(self, n_docs: int, n_chars: int) -> bool:
+        if n_docs >= self.max_docs:
+            return True
+        return n_docs >= self.min_docs and n_chars >= self.char_budget
+
+
+class _Batch:
+    def __init__(self, seq: int, docs: list[Document], ids: list[str], end: int):
+        self.seq = seq
+        self.docs = docs
+        self.ids = ids
+        self.end = end
+        self.dense = None
+        self.sparse = None
+
+
+class IngestPipeline:
+    """
+    Staged ingestion: chunk -> dense embed -> sparse embed -> upsert.
+
+    Stages run in their own threads connected by bounded queues, so the PDF parser, the
+    embedding server, the BM25 encoder and Qdrant all work at the same time and
+    throughput approaches that of the slowest stage. Dense embedding calls run
+    `embed_concurrency` at a time. Upserts happen in stream order, which keeps the
+    checkpoint a simple count of leading chunks.
+
+    Args:
+        vector_store: Vectorstore returned by get_vectorstore, its models and client are reused.
+        id_fn: Maps a chunk to its point id.
+        on_batch_done: Called with the number of leading chunks stored after every upsert.
+        embed_concurrency: Concurrent dense embedding calls. Defaults to INGEST_EMBED_CONCURRENCY (2).
+        skip: Number of leading chunks to skip (already stored by an interrupted run).
+        skip_existing: Don't embed chunks whose id is already in the collection.
+        queue_size: Capacity of each queue between stages, in batches.
+        cancel_event: Set it to stop the ingest after the batch being stored; run() then raises IngestCancelled.
+    """
+
+    def __init__(self, vector_store, id_fn, on_batch_done=None, embed_concurrency: int | None = None,
+                 skip: int = 0, skip_existing: bool = False, queue_size: int = 4, batch_sizer: AdaptiveBatchSizer | None = None,
+                 cancel_event: threading.Event | None = None):
+        self.vector_store = vector_store
+        self.client = vector_store.client
+        self.collection_name = vector_store.collection_name
+        self.id_fn = id_fn
+        self.on_batch_done = on_batch_done
+        self.embed_concurrency = embed_concurrency or int(os.getenv("INGEST_EMBED_CONCURRENCY", "2"))
+        self.skip = skip
+        self.skip_existing = skip_existing
+        self.batch_sizer = batch_sizer or AdaptiveBatchSizer()
+        self.cancel_event = cancel_event
+
+        self._batches = queue.Queue(maxsize=queue_size)
+        self._dense = queue.Queue(maxsize=queue_size)
+        self._sparse = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._failed_batch = None
+
+        self.total = 0
+        self.stage_seconds = {"chunk": 0.0, "dense": 0.0, "sparse": 0.0, "upsert": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _add_time(self, stage: str, seconds: float):
+        with self._stats_lock:
+            self.stage_seconds[stage] += seconds
+
+    def _fail(self, error: Exception, batch: _Batch | None = None):
+        if self._error is None:
+            self._error = error
+            self._failed_batch = batch
+        self._stop.set()
+
+    def _cancelled(self) -> bool:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self._fail(IngestCancelled(f"Ingestion of '{self.collection_name}' was cancelled."))
+            return True
+        return False
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _emit_batch(self, seq: int, docs: list[Document], end: int) -> bool:
+        ids = [self.id_fn(doc) for doc in docs]
+
+        if self.skip_existing:
+            with store_lock.read():
+                existing = self.client.retrieve(
+                    collection_name=self.collection_name, ids=ids, with_payload=False, with_vectors=False
+                )
+            existing_ids = {str(point.id) for point in existing}
+            pending = [(doc, id_) for doc, id_ in zip(docs, ids) if id_ not in existing_ids]
+            docs = [doc for doc, _ in pending]
+            ids = [id_ for _, id_ in pending]
+
+        for idx, doc in enumerate(docs):
+            if len(doc.page_content) > 7000:
+                 print(f"Large chunk detected (idx {idx}): {len(doc.page_content)} chars")
+
+        return self._put(self._batches, _Batch(seq, docs, ids, end))
+
+    def _chunk_stage(self, docs: Iterable[Document]):
+        try:
+            seq = 0
+            batch, batch_chars = [], 0
+            started = time.perf_counter()
+            for doc in docs:
+                if self._stop.is_set() or self._cancelled():
+                    return
+                self.total += 1
+                if self.total <= self.skip:
+                    continue
+                batch.append(doc)
+                batch_chars += len(doc.page_content)
+                if self.batch_sizer.is_full(len(batch), batch_chars):
+                    self._add_time("chunk", time.perf_counter() - started)
+                    if not self._emit_batch(seq, batch, self.total):
+                        return
+                    seq += 1
+                    batch, batch_chars = [], 0
+                    started = time.perf_counter()
+
+            self._add_time("chunk", time.perf_counter() - started)
+            if batch and not self._emit_batch(seq, batch, self.total):
+                return
+            for _ in range(self.embed_concurrency):
+                self._put(self._batches, _END)
+        except Exception as e:
+            self._fail(e)
+
+    def _dense_stage(self):
+        embeddings = self.vector_store.embeddings
+        while True:
+            batch = self._get(self._batches)
+            if batch is _END:
+                self._put(self._dense, _END)
+                return
+            try:
+                started = time.perf_counter()
+                texts = [doc.page_content for doc in batch.docs]
+                batch.dense = embeddings.embed_documents(texts) if texts else []
+                elapsed = time.perf_counter() - started
+                self._add_time("dense", elapsed)
+                self.batch_sizer.observe(sum(len(text) for text in texts), elapsed)
+            except Exception as e:
+                self._fail(e, batch)
+                return
+            if not self._put(self._dense, batch):
+                return
+
+    def _sparse_stage(self):
+        sparse_embeddings = self.vector_store.sparse_embeddings
+        finished_workers = 0
+        while finished_workers < self.embed_concurrency:
+            batch = self._get(self._dense)
+            if self._stop.is_set():
+                return
+            if batch is _END:
+                finished_workers += 1
+                continue
+            try:
+                started = time.perf_counter()
+                texts = [doc.page_content for doc in batch.docs]
+                batch.sparse = sparse_embeddings.embed_documents(texts) if texts and sparse_embeddings else None
+                self._add_time("sparse", time.perf_counter() - started)
+            except Exception as e:
+                self._fail(e, batch)
+                return
+            if not self._put(self._sparse, batch):
+                return
+        self._put(self._sparse, _END)
+
+    def _points(self, batch: _Batch) -> list[PointStruct]:
+        vs = self.vector_store
+        points = []
+        for i, (doc, id_) in enumerate(zip(batch.docs, batch.ids)):
+            vector = {vs.vector_name: batch.dense[i]}
+            if batch.sparse is not None:
+                vector[vs.sparse_vector_name] = SparseVector(
+                    indices=batch.sparse[i].indices, values=batch.sparse[i].values
+                )
+            payload = {vs.content_payload_key: doc.page_content, vs.metadata_payload_key: doc.metadata}
+            points.append(PointStruct(id=id_, vector=vector, payload=payload))
+        return points
+
+    def _upsert_stage(self):
+        next_seq = 0
+        waiting = {}
+        while True:
+            batch = self._get(self._sparse)
+            if batch is _END:
+                return
+            waiting[batch.seq] = batch
+            while next_seq in waiting:
+                if self._cancelled():
+                    return
+                ready = waiting.pop(next_seq)
+                try:
+                    started = time.perf_counter()
+                    if ready.docs:
+                        with store_lock.write():
+                            self.client.upsert(collection_name=self.collection_name, points=self._points(ready))
+                    self._add_time("upsert", time.perf_counter() - started)
+                except Exception as e:
+                    self._fail(e, ready)
+                    return
+                if self.on_batch_done is not None:
+                    self.on_batch_done(ready.end)
+                next_seq += 1
+
+    def run(self, docs: Iterable[Document]) -> int:
+        """Ingest the stream of chunks. Returns the number of chunks in the stream."""
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self._chunk_stage, args=(docs,), daemon=True)]
+        threads += [threading.Thread(target=self._dense_stage, daemon=True) for _ in range(self.embed_concurrency)]
+        threads.append(threading.Thread(target=self._sparse_stage, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        self._upsert_stage()
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+
+        if isinstance(self._error, IngestCancelled):
+            print(f"{self._error} Stored chunks are checkpointed, re-run with resume enabled to continue.")
+            raise self._error
+        if self._error is not None:
+            if self._failed_batch is not None and self._failed_batch.docs:
+                print(f"Error in batch {self._failed_batch.seq + 1}: {self._error}")
+                # Print the largest chunk in this batch for inspection
+                largest_chunk = max(self._failed_batch.docs, key=lambda d: len(d.page_content))
+                print(f"Largest chunk in failed batch: {len(largest_chunk.page_content)} chars. "\
+                      "Try using smaller chunk size, or re-run with resume enabled to continue from this batch.")
+                print(f"Context preview: {largest_chunk.page_content[:200]}...")
+            raise self._error
+
+        elapsed = time.perf_counter() - started
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.stage_seconds.items())
+        print(f"Ingested {self.total} chunks in {elapsed:.1f}s ({self.total / max(elapsed, 1e-9):.1f} chunks/s; busy: {stages})")
+        return self.total
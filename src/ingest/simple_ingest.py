@@ -1,60 +1,71 @@
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from src.util.env_check import get_rag_models
-from src.util.vectorstore import get_vectorstore
-from uuid import uuid4
+from src.util.env_check import get_embed_model, get_sparse_model
+from src.util.vectorstore import get_vectorstore, get_embedding_dim
+from src.util.manifest import write_manifest, embedding_model_name, stamp_ingest_id
+from src.ingest.common import IngestProgress, file_hash, upload_documents, preprocess_documents
+from src.util.stemming import TextPreprocessor
+from src.ingest.pdf_pages import PdfPageReader
+from pathlib import Path
+from contextlib import ExitStack
 
-def simple_ingest(path: str, collection_name: str,stem_and_stop: bool = False, chunk_size: int = 2000, chunk_overlap: int = 200,):
+def simple_ingest(path: str, collection_name: str,stem_and_stop: bool = False, chunk_size: int = 2000, chunk_overlap: int = 200, resume: bool = False, quantization: str | None = None,
+                  progress: IngestProgress | None = None, cancel_event=None):
     """
     Ingests a PDF into Qdrant using RecursiveCharacter splitting.
+    Chunk ids are derived from the file and chunk content, so re-running is idempotent
+    and resume=True continues an interrupted ingest.
+    quantization ('scalar', 'binary' or None) is applied when the collection is created.
+    progress and cancel_event are passed to upload_documents (used by background jobs, see src.ingest.jobs).
     Returns the count of documents ingested.
     """
     try:
-        loader = PyPDFLoader(path)
-        docs = loader.load()
-        
-        if not docs:
-            raise ValueError("The PDF appears to be empty or unreadable.")
-
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, 
             chunk_overlap=chunk_overlap,
+            add_start_index=True,
         )
-        texts = text_splitter.split_documents(docs)
+        source_hash = file_hash(path)
+        with ExitStack() as stack:
+            reader = stack.enter_context(PdfPageReader(path, source_hash=source_hash))
+            if reader.total_pages == 0:
+                raise ValueError("The PDF appears to be empty or unreadable.")
+
+            if progress is not None:
+                progress.total_pages = reader.total_pages
+
+            def iter_chunks():
+                # Pages stream in from the parser pool, so splitting starts before the whole book is parsed.
+                for page in reader.iter_pages():
+                    if progress is not None:
+                        progress.read_pages()
+                    yield from text_splitter.split_documents([page])
+
+            chunks = iter_chunks()
+            if stem_and_stop:
+                preprocessor = stack.enter_context(TextPreprocessor(workers=reader.workers))
+                chunks = preprocess_documents(chunks, preprocessor)
 
-        if stem_and_stop:
-            from src.util.stemming import preprocess_text
-            for text in texts:
-                text.metadata["raw_text"] = text.page_content
-                text.metadata["preprocessed"] = True
-                text.page_content = preprocess_text(text.page_content)
-                
-        _, embedding_model, sparse_model = get_rag_models()
-        vector_store = get_vectorstore(embedding_model, sparse_model, collection_name)
+            embedding_model, sparse_model = get_embed_model(), get_sparse_model()
+            vector_store = get_vectorstore(embedding_model, sparse_model, collection_name, quantization=quantization)
+            write_manifest(
+                collection_name,
+                embedding_model=embedding_model_name(embedding_model),
+                embedding_dim=get_embedding_dim(embedding_model),
+                stem_and_stop=stem_and_stop,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                ingest_strategy="simple",
+                source=Path(path).name,
+                source_hash=source_hash,
+                quantization=quantization,
+            )
 
-        uuids = [str(uuid4()) for _ in range(len(texts))]
-    
-        batch_size = 100
-        for i in range(0, len(texts), batch_size):
-            batch_docs = texts[i : i + batch_size]
-            batch_ids = uuids[i : i + batch_size]
-            
-            for idx, doc in enumerate(batch_docs):
-                if len(doc.page_content) > 7000: 
-                     print(f"Large chunk detected (idx {idx}): {len(doc.page_content)} chars")
-            
-            try:
-                vector_store.add_documents(documents=batch_docs, ids=batch_ids)
-            except Exception as e:
-                print(f"Error in batch {i // batch_size + 1}: {e}")
-                # Print the largest chunk in this batch for inspection
-                largest_chunk = max(batch_docs, key=lambda d: len(d.page_content))
-                print(f"Largest chunk in failed batch: {len(largest_chunk.page_content)} chars. "\
-                      "Try using smaller chunk size and change collection name to avoid errors.")
-                print(f"Context preview: {largest_chunk.page_content[:200]}...")
-                raise e
-        
-        return len(texts)
+            params = {"source_hash": source_hash, "strategy": "simple", "stem_and_stop": stem_and_stop,
+                      "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+            count = upload_documents(vector_store, chunks, source_hash, collection_name, params, resume=resume,
+                                     progress=progress, cancel_event=cancel_event)
+            stamp_ingest_id(collection_name)
+            return count
 
     except Exception as e:
         raise e
\ No newline at end of file
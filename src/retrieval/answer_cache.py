@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.util.manifest import ingest_id
+
+project_root = Path(__file__).resolve().parents[2]
+answer_cache_dir = project_root / "data" / "cache" / "answers"
+
+
+class AnswerCache:
+    """
+    On-disk cache of the answers given from one collection, looked up by question similarity.
+
+    A question whose embedding has a cosine similarity of at least `threshold` with a cached
+    question asked with the same retrieval settings gets that question's answer and sources.
+    Entries expire after `ttl_seconds`, the least recently used ones are evicted past
+    `max_entries`, and all of them are dropped once the collection is re-ingested (the
+    manifest's ingest id changes).
+
+    Args:
+        collection_name: Collection the answers were retrieved from.
+        threshold: Minimum cosine similarity for a hit.
+        ttl_seconds: Age after which an answer is no longer served.
+        max_entries: Maximum number of answers kept.
+        path: SQLite file to use, one per collection by default.
+    """
+
+    def __init__(self, collection_name: str, threshold: float = 0.95, ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 1000, path: Path | None = None):
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        path = Path(path or answer_cache_dir / f"{collection_name}.sqlite")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, ingest_id TEXT NOT NULL, settings TEXT NOT NULL, query TEXT NOT NULL, "
+            "vector BLOB NOT NULL, answer TEXT NOT NULL, documents TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+        self._conn.commit()
+        # Normalized question vectors per settings key: (row ids, created_at, matrix).
+        self._index = {}
+        self._ingest_id = None
+
+    def _sync_ingest(self):
+        """Drop everything cached for an earlier ingest of the collection. Called with the lock held."""
+        current = ingest_id(self.collection_name)
+        if current != self._ingest_id:
+            self._conn.execute("DELETE FROM answers WHERE ingest_id != ?", (current,))
+            self._conn.commit()
+            self._index.clear()
+            self._ingest_id = current
+
+    def _load(self, settings: str):
+        if settings not in self._index:
+            rows = self._conn.execute(
+                "SELECT id, created_at, vector FROM answers WHERE settings = ?", (settings,)
+            ).fetchall()
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            created = np.array([row[1] for row in rows], dtype=np.float64)
+            matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows]) if rows else None
+            self._index[settings] = (ids, created, matrix)
+        return self._index[settings]
+
+    def lookup(self, query_vector: list[float], settings: str) -> tuple[str, list[Document], float] | None:
+        """
+        Cached (answer, documents, similarity) for the most similar question, or None.
+
+        Args:
+            query_vector: Dense embedding of the question.
+            settings: Retrieval and model settings the answer must have been produced with.
+        """
+        vector = _normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            self._sync_ingest()
+            ids, created, matrix = self._load(settings)
+            if matrix is None or matrix.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = matrix @ vector
+            similarities[created < now - self.ttl_seconds] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            answer, documents = self._conn.execute(
+                "SELECT answer, documents FROM answers WHERE id = ?", (int(ids[best]),)
+            ).fetchone()
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, int(ids[best])))
+            self._conn.commit()
+            self.hits += 1
+
+        documents = [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in json.loads(documents)]
+        return answer, documents, float(similarities[best])
+
+    def store(self, query: str, query_vector: list[float], settings: str, answer: str, documents: list[Document]):
+        """Cache the answer given to `query`, evicting expired and least recently used answers."""
+        if not answer.strip():
+            return
+        payload = json.dumps(
+            [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents], default=str
+        )
+        now = time.time()
+        with self._lock:
+            self._sync_ingest()
+            self._conn.execute(
+                "INSERT INTO answers (ingest_id, settings, query, vector, answer, documents, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._ingest_id, settings, query, _normalize(query_vector).tobytes(), answer, payload, now, now),
+            )
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            self._index.clear()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._index.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def answer_cache_enabled() -> bool:
+    return os.getenv("ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+
+
+def get_answer_cache(collection_name: str) -> AnswerCache:
+    """The process-wide answer cache of a collection (settings from ANSWER_CACHE_* env variables)."""
+    with _CACHES_LOCK:
+        if collection_name not in _CACHES:
+            _CACHES[collection_name] = AnswerCache(
+                collection_name,
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_HOURS", "168")) * 3600,
+                max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+            )
+        return _CACHES[collection_name]
+
+
+def answer_caches() -> dict[str, AnswerCache]:
+    """Answer caches opened by this process, by collection."""
+    with _CACHES_LOCK:
+        return dict(_CACHES)
@@ -0,0 +1,191 @@
+"""
+Chapter routing: search only the chapters a question is about.
+
+Collections ingested per chapter (advanced_ingest) get, at the end of the ingest, a
+payload index on the chapter metadata and one centroid vector per (book, chapter): the
+normalized mean of the chapter's chunk vectors. A query is routed by comparing its
+embedding to the centroids and searching the top chapters with a payload filter.
+
+    python -m src.retrieval.chapters build <collection>
+"""
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+from qdrant_client.http import models
+
+project_root = Path(__file__).resolve().parents[2]
+chapters_root = project_root / "data" / "vector_db" / "chapters"
+
+CHAPTER_FIELD = "metadata.chapter_number"
+SOURCE_FIELD = "metadata.source"
+
+
+def chapter_index_path(collection_name: str) -> Path:
+    return chapters_root / f"{collection_name}.npz"
+
+
+def has_chapter_index(collection_name: str) -> bool:
+    return chapter_index_path(collection_name).exists()
+
+
+def build_chapter_index(collection_name: str, client=None, batch_size: int = 512) -> int:
+    """
+    Create the chapter payload indexes and compute the chapter centroids of a collection.
+
+    Args:
+        collection_name: Collection to index, its chunks need 'chapter_number' metadata.
+        client: Qdrant client, defaults to the shared on-disk one.
+        batch_size: Points fetched per scroll call.
+
+    Returns the number of chapters found (0 if the chunks have no chapter metadata).
+    """
+    from src.util.faiss_store import _dense_vector
+    from src.util.manifest import get_manifest, update_manifest
+    from src.util.vectorstore import _get_client, _is_local, store_lock
+
+    client = client or _get_client()
+
+    # The embedded client keeps no payload indexes (it scans), a Qdrant server uses them for the filter.
+    if not _is_local(client):
+        with store_lock.write():
+            for field in (CHAPTER_FIELD, SOURCE_FIELD):
+                client.create_payload_index(collection_name, field_name=field, field_schema=models.PayloadSchemaType.KEYWORD)
+
+    sums, counts, titles = {}, {}, {}
+    offset = None
+    while True:
+        with store_lock.read():
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+        for point in points:
+            metadata = (point.payload or {}).get("metadata") or {}
+            vector = _dense_vector(point)
+            if metadata.get("chapter_number") is None or vector is None:
+                continue
+            key = (str(metadata.get("source", "")), str(metadata["chapter_number"]))
+            vector = np.asarray(vector, dtype=np.float32)
+            sums[key] = sums.get(key, 0.0) + vector / (np.linalg.norm(vector) or 1.0)
+            counts[key] = counts.get(key, 0) + 1
+            titles.setdefault(key, str(metadata.get("chapter_title", "")))
+        if offset is None:
+            break
+
+    if not sums:
+        return 0
+
+    keys = sorted(sums, key=lambda key: (key[0], _chapter_sort_key(key[1])))
+    centroids = np.stack([sums[key] for key in keys]).astype(np.float32)
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    chapters_root.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        chapter_index_path(collection_name),
+        centroids=centroids,
+        sources=np.asarray([key[0] for key in keys]),
+        numbers=np.asarray([key[1] for key in keys]),
+        titles=np.asarray([titles[key] for key in keys]),
+        counts=np.asarray([counts[key] for key in keys], dtype=np.int64),
+    )
+
+    _INDEXES.pop(collection_name, None)
+    if get_manifest(collection_name) is not None:
+        update_manifest(collection_name, chapter_index=len(keys))
+    return len(keys)
+
+
+def _chapter_sort_key(number: str):
+    return (0, int(number), "") if number.isdigit() else (1, 0, number)
+
+
+class ChapterIndex:
+    """
+    Chapter centroids of one collection (see build_chapter_index).
+
+    Args:
+        collection_name: Collection whose chapter index to load.
+    """
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        with np.load(chapter_index_path(collection_name)) as data:
+            self.centroids = data["centroids"]
+            self.sources = data["sources"].tolist()
+            self.numbers = data["numbers"].tolist()
+            self.titles = data["titles"].tolist()
+            self.counts = data["counts"]
+
+    def chapters(self) -> list[tuple[str, str]]:
+        """(chapter number, title) of every chapter, in book order."""
+        seen = {}
+        for number, title in zip(self.numbers, self.titles):
+            seen.setdefault(number, title)
+        return list(seen.items())
+
+    def route(self, query_vector, n: int) -> list[int]:
+        """Rows of the `n` chapters whose centroid is closest to the query."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = self.centroids @ (query / (np.linalg.norm(query) or 1.0))
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def filter(self, rows: list[int]) -> models.Filter:
+        """Filter matching the chunks of the given (book, chapter) rows."""
+        return models.Filter(should=[
+            models.Filter(must=[
+                models.FieldCondition(key=SOURCE_FIELD, match=models.MatchValue(value=self.sources[row])),
+                models.FieldCondition(key=CHAPTER_FIELD, match=models.MatchValue(value=self.numbers[row])),
+            ])
+            for row in rows
+        ])
+
+    def describe(self, rows: list[int]) -> list[str]:
+        return [f"{self.numbers[row]}: {self.titles[row]}" for row in rows]
+
+
+def chapter_filter(chapter_numbers: list[str]) -> models.Filter:
+    """Filter matching the chunks of the given chapter numbers (in any book of the collection)."""
+    return models.Filter(must=[
+        models.FieldCondition(key=CHAPTER_FIELD, match=models.MatchAny(any=[str(number) for number in chapter_numbers]))
+    ])
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def remove_chapter_index(collection_name: str):
+    """Delete the collection's chapter index, e.g. when the collection is replaced."""
+    with _INDEXES_LOCK:
+        _INDEXES.pop(collection_name, None)
+    chapter_index_path(collection_name).unlink(missing_ok=True)
+
+
+def load_chapter_index(collection_name: str) -> ChapterIndex | None:
+    """Chapter index of a collection (loaded once per process), or None if it has none."""
+    with _INDEXES_LOCK:
+        if collection_name not in _INDEXES:
+            _INDEXES[collection_name] = ChapterIndex(collection_name) if has_chapter_index(collection_name) else None
+        return _INDEXES[collection_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chapter payload indexes and centroids for chapter routing.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build the chapter index of an ingested collection.")
+    build.add_argument("collection")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_chapter_index(args.collection)
+        if count:
+            print(f"Indexed {count} chapters of '{args.collection}' into {chapter_index_path(args.collection)}")
+        else:
+            print(f"Collection '{args.collection}' has no chapter metadata (ingest it with the chapter strategy).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Packs retrieved chunks into the prompt context within a token budget.
+
+Chunks from the same part of the book (same page, or same chapter for chapter-ingested
+collections) are merged where they overlap, so text shared by neighbouring chunks is
+sent once. The 'Chapter/Source' header advanced_ingest puts in front of every chunk is
+written once per chapter, and the text is ordered by position in the book.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+CHUNK_SEPARATOR = "\n<TEXT CHUNK>\n"
+# Written between non-adjacent passages of the same chapter / page.
+GAP_MARKER = "[...]"
+
+# Tokens kept free for the answer when sizing the context.
+RESPONSE_RESERVE_TOKENS = 1024
+MIN_CONTEXT_TOKENS = 256
+
+# Header added by advanced_ingest in front of every chunk.
+_HEADER_PATTERN = re.compile(r"\AChapter [^\n]*\nSource: [^\n]*\n-{10}\n")
+
+# Shortest prefix of a chunk that has to be found in another one to count as overlap.
+_MIN_OVERLAP_CHARS = 32
+# Chunks at most this many characters apart (stripped whitespace) are treated as one passage.
+_MAX_ADJACENT_GAP = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text), no tokenizer needed."""
+    return math.ceil(len(text) / 4)
+
+
+def chunk_content(doc: Document) -> str:
+    """Text of a retrieved chunk as shown to the llm: the raw text for stemmed collections."""
+    return doc.metadata.get("raw_text", doc.page_content) if "preprocessed" in doc.metadata else doc.page_content
+
+
+def chunk_text(doc: Document) -> str:
+    """chunk_content without the chapter header."""
+    return _HEADER_PATTERN.sub("", chunk_content(doc), count=1)
+
+
+def _chunk_header(doc: Document) -> str | None:
+    match = _HEADER_PATTERN.match(doc.page_content)
+    return match.group(0).rstrip("\n") if match else None
+
+
+def _merge_key(doc: Document) -> tuple:
+    """Chunks can only overlap within the text they were split from (a chapter or a single page)."""
+    metadata = doc.metadata
+    if "chapter_number" in metadata:
+        return (metadata.get("source"), "chapter", metadata["chapter_number"])
+    return (metadata.get("source"), "page", metadata.get("page"))
+
+
+def _number_sort_key(number) -> tuple:
+    """Chapter / page numbers in book order: chapter numbers are stored as strings ("1", "2", ..., "A")."""
+    if isinstance(number, (int, float)):
+        return (0, number, "")
+    number = str(number)
+    return (0, int(number), "") if number.isdigit() else (1, 0, number)
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if under _MIN_OVERLAP_CHARS)."""
+    probe = right[:_MIN_OVERLAP_CHARS]
+    if len(probe) < _MIN_OVERLAP_CHARS:
+        return 0
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+@dataclass
+class _Span:
+    text: str
+    start: int | None
+    rank: int
+    docs: list = field(default_factory=list)
+
+    @property
+    def end(self) -> int | None:
+        return None if self.start is None else self.start + len(self.text)
+
+    def absorb(self, other: "_Span", text: str, start: int | None):
+        self.text = text
+        self.start = start
+        self.rank = min(self.rank, other.rank)
+        self.docs.extend(other.docs)
+
+
+def _try_merge(existing: _Span, span: _Span) -> bool:
+    """Merge `span` into `existing` if one contains or overlaps the other."""
+    if span.text in existing.text:
+        existing.absorb(span, existing.text, existing.start)
+        return True
+    if existing.text in span.text:
+        existing.absorb(span, span.text, span.start)
+        return True
+
+    if existing.start is not None and span.start is not None:
+        # Positions from the splitter's start_index.
+        first, second = (existing, span) if existing.start <= span.start else (span, existing)
+        gap = second.start - first.end
+        if gap > _MAX_ADJACENT_GAP:
+            return False
+        # Neighbouring chunks without overlap are only separated by the whitespace the splitter stripped.
+        joined = first.text + "\n" + second.text if gap > 0 else first.text + second.text[-gap:]
+        existing.absorb(span, joined, first.start)
+        return True
+
+    # Collections ingested without start_index: match the overlapping text itself.
+    shared = _overlap(existing.text, span.text)
+    if shared:
+        existing.absorb(span, existing.text + span.text[shared:], existing.start)
+        return True
+    shared = _overlap(span.text, existing.text)
+    if shared:
+        existing.absorb(span, span.text + existing.text[shared:], span.start)
+        return True
+    return False
+
+
+def _merge_spans(spans: list[_Span]) -> list[_Span]:
+    """Merge overlapping / contained spans of one text until none are left to merge."""
+    while True:
+        merged = []
+        for span in sorted(spans, key=lambda span: (span.start is None, span.start or 0, span.rank)):
+            if not any(_try_merge(existing, span) for existing in merged):
+                merged.append(span)
+        if len(merged) == len(spans):
+            return merged
+        spans = merged
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at the last sentence (or word) boundary."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < limit // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+
+def context_budget(context_window: int, *prompt_parts: str) -> int:
+    """Tokens left for retrieved context once the rest of the prompt and the answer reserve are accounted for."""
+    used = sum(estimate_tokens(part) for part in prompt_parts)
+    return max(MIN_CONTEXT_TOKENS, context_window - used - RESPONSE_RESERVE_TOKENS)
+
+
+def build_context(docs: list[Document], max_tokens: int) -> tuple[str, dict]:
+    """
+    Build the context string from retrieved chunks.
+
+    Merged passages are taken by relevance (rank of their best chunk) until the budget is
+    full, the last one trimmed to fit, then written out in book order under their chapter header.
+
+    Args:
+        docs: Retrieved chunks, most relevant first.
+        max_tokens: Token budget of the context.
+
+    Returns the context and stats (chunks retrieved/used, characters before/after packing, estimated tokens).
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        group = groups.setdefault(_merge_key(doc), {"header": _chunk_header(doc), "spans": []})
+        group["spans"].append(_Span(chunk_text(doc), doc.metadata.get("start_index"), rank, [doc]))
+
+    passages = [
+        (key, group["header"], span)
+        for key, group in groups.items()
+        for span in _merge_spans(group["spans"])
+    ]
+
+    selected, used, headed = [], 0, set()
+    for key, header, span in sorted(passages, key=lambda passage: passage[2].rank):
+        header_cost = estimate_tokens(header) if header and key not in headed else 0
+        cost = estimate_tokens(span.text) + header_cost
+        if used + cost > max_tokens:
+            remaining = max_tokens - used - header_cost
+            if remaining < 64:
+                continue
+            span.text = trim_to_tokens(span.text, remaining)
+            cost = estimate_tokens(span.text) + header_cost
+        selected.append((key, header, span))
+        headed.add(key)
+        used += cost
+
+    def book_position(passage):
+        # Passages of one chapter / page sort next to each other, so its header is written once.
+        (source, kind, number), _, span = passage
+        return (str(source), kind, _number_sort_key(number), span.start is None, span.start or 0, span.rank)
+
+    blocks, current_key = [], None
+    for key, header, span in sorted(selected, key=book_position):
+        if key != current_key:
+            blocks.append([header] if header else [])
+            current_key = key
+        elif blocks[-1]:
+            blocks[-1].append(GAP_MARKER)
+        blocks[-1].append(span.text)
+
+    context = CHUNK_SEPARATOR.join("\n".join(block) for block in blocks)
+    stats = {
+        "chunks_retrieved": len(docs),
+        "chunks_used": sum(len(span.docs) for _, _, span in selected),
+        "context_chars_unpacked": len(CHUNK_SEPARATOR.join(chunk_content(doc) for doc in docs)),
+        "context_chars": len(context),
+        "context_tokens": estimate_tokens(context),
+    }
+    return context, stats
@@ -0,0 +1,116 @@
+import time
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from src.retrieval.context import estimate_tokens, trim_to_tokens
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a tutoring conversation about the book 'Data Mining: The Textbook'.\n"
+    "Update the summary with the new messages below. Keep the topics the student asked about, the "
+    "concepts and formulas that were explained and anything the student said about their goals or "
+    "preferences. Drop greetings and code listings. Use at most {max_words} words and return only the summary.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{messages}"
+)
+
+
+def _to_message(message: dict) -> BaseMessage:
+    return HumanMessage(content=message["content"]) if message["role"] == "user" else AIMessage(content=message["content"])
+
+
+class ChatHistory:
+    """
+    Chat history of one session, bounded in size: the last `keep_turns` turns are sent
+    verbatim and older ones are folded into a summary that is updated incrementally.
+
+    `messages()` only reads the cached summary, so building the history never waits on the llm.
+    `update()` folds turns that fell out of the verbatim window into the summary and is meant
+    to run after an answer was shown.
+
+    Which messages are in the summary is tracked by index (`summarized`), not recomputed from
+    `keep_turns`: changing `keep_turns` mid-session never sends a summarized turn again, and
+    turns not summarized yet stay verbatim until the next `update()` folds them.
+
+    Args:
+        keep_turns: Number of recent user/assistant turns sent verbatim. 0 disables history.
+        max_tokens: Ceiling on the (estimated) tokens of summary + verbatim turns.
+        summary_words: Target length of the summary.
+    """
+
+    def __init__(self, keep_turns: int = 3, max_tokens: int = 1500, summary_words: int = 150):
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.summary_words = summary_words
+        self.summary = ""
+        # Number of leading messages already folded into the summary.
+        self.summarized = 0
+        self.last_update_ms = None
+
+    def _verbatim_start(self, messages: list[dict], start: int | None = None) -> int:
+        """
+        Index of the first message sent verbatim, given the token ceiling and either `start`
+        or, by default, the turn window.
+        """
+        if self.keep_turns <= 0:
+            return len(messages)
+        if start is None:
+            start = max(0, len(messages) - 2 * self.keep_turns)
+        budget = self.max_tokens - estimate_tokens(self.summary)
+        while start < len(messages) - 1 and sum(estimate_tokens(m["content"]) for m in messages[start:]) > budget:
+            start += 1
+        return start
+
+    def messages(self, messages: list[dict]) -> list[BaseMessage]:
+        """
+        History to send with the next question.
+
+        Args:
+            messages: The session's messages ({'role', 'content'} dicts), without the new question.
+        """
+        if self.keep_turns <= 0:
+            return []
+        # Everything the summary doesn't cover yet, within the token ceiling.
+        start = self._verbatim_start(messages, min(self.summarized, len(messages)))
+        history = []
+        if self.summary:
+            history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}"))
+
+        verbatim = [_to_message(message) for message in messages[start:]]
+        remaining = self.max_tokens - estimate_tokens(self.summary)
+        if verbatim and estimate_tokens(verbatim[0].content) > remaining:
+            # A single long answer can exceed the ceiling on its own.
+            verbatim[0].content = trim_to_tokens(verbatim[0].content, max(remaining, 0))
+        return history + verbatim
+
+    def update(self, messages: list[dict], llm) -> bool:
+        """
+        Fold messages that left the verbatim window into the summary. Returns True if it changed.
+
+        Args:
+            messages: All of the session's messages.
+            llm: Chat model used to write the summary.
+        """
+        if self.keep_turns <= 0:
+            return False
+        start = self._verbatim_start(messages)
+        # A larger window never brings summarized messages back.
+        if start <= self.summarized:
+            return False
+
+        started = time.perf_counter()
+        new_messages = "\n\n".join(
+            f"{'Student' if m['role'] == 'user' else 'Tutor'}: {m['content']}" for m in messages[self.summarized:start]
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_words, summary=self.summary or "(empty)", messages=new_messages
+        )
+        summary = llm.invoke([HumanMessage(content=prompt)]).content.strip()
+        # Bounded even if the model ignores the word limit.
+        self.summary = trim_to_tokens(summary, self.summary_words * 2)
+        self.summarized = start
+        self.last_update_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    def clear(self):
+        self.summary = ""
+        self.summarized = 0
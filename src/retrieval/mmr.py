@@ -0,0 +1,66 @@
+import numpy as np
+from langchain_core.documents import Document
+
+# Upper bound on the candidate pool, keeps the extra fetch and the selection cost per query fixed.
+MAX_FETCH_K = 50
+
+
+def default_fetch_k(k: int) -> int:
+    """Candidates fetched for MMR: 4x the requested results, at least 20, at most MAX_FETCH_K."""
+    return max(k, min(max(4 * k, 20), MAX_FETCH_K))
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> list[int]:
+    """
+    Greedy MMR selection. Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the already selected ones).
+
+    Args:
+        relevance: Relevance of each candidate to the query, shape (n,).
+        vectors: Candidate embeddings, shape (n, dim).
+        k: Number of candidates to select.
+        lambda_mult: 1.0 = pure relevance, 0.0 = maximal diversity.
+
+    Returns the selected candidate indices in selection order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k == 0:
+        return []
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms
+
+    selected = [int(np.argmax(relevance))]
+    # Similarity of every candidate to its closest selected candidate, updated with one
+    # matrix-vector product per pick (O(k * n * dim) overall).
+    redundancy = unit @ unit[selected[0]]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, unit @ unit[best], out=redundancy)
+
+    return selected
+
+
+def mmr_rerank(results: list[tuple[Document, float]], vectors: list, k: int, lambda_mult: float) -> list[tuple[Document, float]]:
+    """
+    Re-rank retrieved (document, score) pairs with MMR, keeping their original scores.
+
+    Scores are scaled by the best one so dense (cosine), sparse (BM25) and hybrid (RRF)
+    results share the same 0-1 relevance range the similarity penalty is compared against.
+    """
+    if not results:
+        return results
+    scores = np.asarray([score for _, score in results], dtype=np.float32)
+    top = np.abs(scores).max()
+    relevance = scores / top if top > 0 else scores
+    order = maximal_marginal_relevance(relevance, np.asarray(vectors, dtype=np.float32), k, lambda_mult)
+    return [results[i] for i in order]
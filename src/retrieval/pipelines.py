@@ -0,0 +1,243 @@
+"""
+Pool of ready-to-use retrieval pipelines shared by all chat sessions of the process.
+
+Building a pipeline (llm, vectorstore, dense and sparse index, search params, preprocessing
+check, chapter index, parent store, and for the agent its tool + executor) is done once per
+(collection, search type, top_k, dense and sparse backend, llm, embedding model) instead of
+on every question.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+from src.util.env_check import get_llm_model, get_embed_model, get_sparse_model
+from src.util.manifest import embedding_model_name, get_manifest, is_preprocessed
+from src.util.vectorstore import get_vectorstore, get_dense_index, get_search_params, get_sparse_index
+from src.retrieval.search import _stage, asearch_with_scores, search_with_scores
+from src.retrieval.chapters import chapter_filter, load_chapter_index
+from src.util.parent_store import load_parent_store
+
+
+class RetrievalPipeline:
+    """
+    Everything a chain needs to answer questions from one collection.
+
+    Args:
+        collection_name: Collection to search.
+        search_type: 'dense', 'sparse' or 'hybrid'.
+        top_k: Number of chunks per search.
+        backend: Dense index backend, 'qdrant' or 'faiss'.
+        sparse_backend: Sparse index backend, 'qdrant' (FastEmbed BM25) or 'bm25' (native index).
+        llm, embedding_model, sparse_embedding_model: Models to use instead of the ones configured
+            for the app (e.g. the retrieval benchmark's hashing embeddings).
+        client: Qdrant client to use instead of the shared on-disk one.
+    """
+
+    def __init__(self, collection_name: str, search_type: str, top_k: int, backend: str = "qdrant", sparse_backend: str = "qdrant",
+                 llm=None, embedding_model=None, sparse_embedding_model=None, client=None):
+        self.collection_name = collection_name
+        self.search_type = search_type
+        self.top_k = top_k
+        self.backend = backend
+        self.sparse_backend = sparse_backend
+        # Rebuilt when the collection is re-ingested or gets a new index (see PipelinePool.get).
+        self.manifest = get_manifest(collection_name)
+
+        self._llm = llm
+        uses_sparse = search_type != "dense"
+        # The native BM25 index encodes queries itself, so the FastEmbed model isn't loaded for it.
+        sparse_model = None
+        if uses_sparse and sparse_backend == "qdrant":
+            sparse_model = sparse_embedding_model or get_sparse_model()
+        self.vector_store = get_vectorstore(embedding_model or get_embed_model(), sparse_model, collection_name, search_type, client=client)
+        self.dense_index = get_dense_index(collection_name, backend)
+        self.sparse_index = get_sparse_index(collection_name, sparse_backend) if uses_sparse else None
+        self.search_params = get_search_params(collection_name, self.vector_store.client)
+        self.preprocessed = is_preprocessed(collection_name, self.vector_store.client)
+        self.chapter_index = load_chapter_index(collection_name)
+        self.parent_store = load_parent_store(collection_name)
+
+        self._extras = {}
+        self._extras_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        # Only the chains need the llm, searching alone (e.g. the benchmark) never loads it.
+        if self._llm is None:
+            self._llm = get_llm_model()
+        return self._llm
+
+    def preprocess(self, query: str, timer=None) -> str:
+        """The text searches embed for `query`: stemmed for collections ingested with stemming."""
+        if self.preprocessed:
+            from src.util.stemming import preprocess_text
+            with _stage(timer, "query_preprocess"):
+                query = preprocess_text(query)
+        return query
+
+    def _chapter_filter(self, chapters, routed, timer):
+        if chapters:
+            return chapter_filter(chapters)
+        if routed is not None:
+            if timer is not None:
+                timer.record["routed_chapters"] = self.chapter_index.describe(routed)
+            return self.chapter_index.filter(routed)
+        return None
+
+    def _routes(self, route_chapters) -> bool:
+        return bool(route_chapters) and self.chapter_index is not None
+
+    def _expand(self, results, timer):
+        """Parent sections of the hits for collections ingested parent-child, else the hits themselves."""
+        if self.parent_store is None:
+            return results
+        with _stage(timer, "parent_expansion"):
+            return self.parent_store.expand(results)
+
+    def search(self, query: str, timer=None, mmr_lambda: float | None = None, chapters: list[str] | None = None, route_chapters: int | None = None,
+               query_vector: list[float] | None = None, preprocessed: bool = False):
+        """
+        search_with_scores on this pipeline's collection, stemming the query if the collection needs it.
+        Hits of a parent-child collection are replaced by their deduplicated parent sections.
+
+        Args:
+            chapters: Only search these chapter numbers.
+            route_chapters: Otherwise, only search the `route_chapters` chapters whose centroid is
+                closest to the query (needs a chapter index, see src.retrieval.chapters).
+            query_vector: Dense embedding of the preprocessed query, if the caller already has it.
+            preprocessed: `query` already went through preprocess.
+        """
+        if not preprocessed:
+            query = self.preprocess(query, timer)
+        routed = None
+        if not chapters and self._routes(route_chapters):
+            with _stage(timer, "chapter_routing"):
+                if query_vector is None:
+                    query_vector = self.vector_store.embeddings.embed_query(query)
+                routed = self.chapter_index.route(query_vector, route_chapters)
+        query_filter = self._chapter_filter(chapters, routed, timer)
+        results = search_with_scores(
+            self.vector_store, query, self.top_k, timer=timer, query_filter=query_filter,
+            # FAISS can't filter, chapter-restricted searches use Qdrant's own vectors.
+            dense_index=self.dense_index if query_filter is None else None,
+            search_params=self.search_params, mmr_lambda=mmr_lambda, sparse_index=self.sparse_index,
+            query_vector=query_vector,
+        )
+        return self._expand(results, timer)
+
+    async def asearch(self, query: str, timer=None, mmr_lambda: float | None = None, chapters: list[str] | None = None, route_chapters: int | None = None,
+                      query_vector: list[float] | None = None, preprocessed: bool = False):
+        """Async search (see asearch_with_scores)."""
+        if not preprocessed:
+            query = self.preprocess(query, timer)
+        routed = None
+        if not chapters and self._routes(route_chapters):
+            with _stage(timer, "chapter_routing"):
+                if query_vector is None:
+                    query_vector = await self.vector_store.embeddings.aembed_query(query)
+                routed = self.chapter_index.route(query_vector, route_chapters)
+        query_filter = self._chapter_filter(chapters, routed, timer)
+        results = await asearch_with_scores(
+            self.vector_store, query, self.top_k, timer=timer, query_filter=query_filter,
+            dense_index=self.dense_index if query_filter is None else None,
+            search_params=self.search_params, mmr_lambda=mmr_lambda, sparse_index=self.sparse_index,
+            query_vector=query_vector,
+        )
+        return self._expand(results, timer)
+
+    def extra(self, name: str, factory):
+        """Object built from this pipeline once and then reused (e.g. the agent executor)."""
+        with self._extras_lock:
+            if name not in self._extras:
+                self._extras[name] = factory(self)
+            return self._extras[name]
+
+
+def _model_key() -> tuple:
+    llm = get_llm_model()
+    return (
+        getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__,
+        embedding_model_name(get_embed_model()),
+    )
+
+
+class PipelinePool:
+    """
+    Thread-safe LRU pool of RetrievalPipeline objects.
+
+    Args:
+        max_size: Pipelines kept before the least recently used one is dropped.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._pipelines = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, collection_name: str, search_type: str, top_k: int, backend: str = "qdrant", sparse_backend: str = "qdrant") -> tuple[RetrievalPipeline, bool]:
+        """Return (pipeline, hit). A pipeline whose collection manifest changed since it was built is rebuilt."""
+        key = (collection_name, search_type, top_k, backend, sparse_backend, *_model_key())
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Only one session builds a given pipeline, the others wait and then reuse it.
+        with build_lock:
+            with self._lock:
+                pipeline = self._pipelines.get(key)
+                if pipeline is not None and pipeline.manifest == get_manifest(collection_name):
+                    self._pipelines.move_to_end(key)
+                    self.hits += 1
+                    return pipeline, True
+                self.misses += 1
+
+            pipeline = RetrievalPipeline(collection_name, search_type, top_k, backend, sparse_backend)
+
+            with self._lock:
+                self._pipelines[key] = pipeline
+                self._pipelines.move_to_end(key)
+                while len(self._pipelines) > self.max_size:
+                    evicted, _ = self._pipelines.popitem(last=False)
+                    self._build_locks.pop(evicted, None)
+            return pipeline, False
+
+    def invalidate(self, collection_name: str | None = None):
+        """Drop the pipelines of one collection, or all of them."""
+        with self._lock:
+            for key in list(self._pipelines):
+                if collection_name is None or key[0] == collection_name:
+                    del self._pipelines[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._pipelines),
+            }
+
+
+_POOL = PipelinePool(int(os.getenv("PIPELINE_POOL_SIZE", 16)))
+
+
+def get_pipeline(collection_name: str, search_type: str, top_k: int, backend: str = "qdrant", sparse_backend: str = "qdrant") -> tuple[RetrievalPipeline, bool]:
+    return _POOL.get(collection_name, search_type, top_k, backend, sparse_backend)
+
+
+async def aget_pipeline(collection_name: str, search_type: str, top_k: int, backend: str = "qdrant", sparse_backend: str = "qdrant") -> tuple[RetrievalPipeline, bool]:
+    """get_pipeline without blocking the event loop while a pipeline is built."""
+    return await asyncio.to_thread(_POOL.get, collection_name, search_type, top_k, backend, sparse_backend)
+
+
+def invalidate_pipelines(collection_name: str | None = None):
+    _POOL.invalidate(collection_name)
+
+
+def pipeline_pool_stats() -> dict:
+    return _POOL.stats()
@@ -1,8 +1,10 @@
-from src.util.vectorstore import get_vectorstore
-from langchain.tools import tool
+from contextvars import ContextVar
+from typing import Optional
+from langchain_core.tools import StructuredTool
 from langchain.agents import create_tool_calling_agent,AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from src.util.env_check import get_rag_models
+from src.util.timing import TurnTimer
+from src.retrieval.pipelines import aget_pipeline, get_pipeline
 
 prompt = ChatPromptTemplate.from_messages(
     [
@@ -31,40 +33,124 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-llm, embedding_model, sparse_model = get_rag_models()
-
-def rag_agent(query: str, collection_name: str, top_k: int, search_type: str = "hybrid", chat_history=None):
-    vectorstore = get_vectorstore(embedding_model, sparse_model, collection_name, search_type)
-    retrieved_docs = []
-    @tool
-    def retrieve_book_context(query: str) -> str:
-        """Search and return information from the Data Mining Textbook."""
-        search_query = query
-        sample_docs = vectorstore.similarity_search(search_query,k=1)
-        sample_doc = sample_docs[0]
-        preproccessed = sample_doc.metadata.get('preprocessed',False)
-        if preproccessed:
-            from src.util.stemming import preprocess_text
-            search_query = preprocess_text(query)
-
-        # print(search_query) checking if the fix works
-        results = vectorstore.similarity_search_with_score(search_query, k=top_k)
-        docs_for_agent = []
-        for doc, score in results:
-            doc.metadata["relevance_score"] = score
-            retrieved_docs.append(doc)
-            content = doc.metadata.get('raw_text', doc.page_content) if doc.metadata.get('preprocessed') else doc.page_content
-            docs_for_agent.append(f"Source: {doc.metadata.get('source', 'Unknown')} (Content: {content}")
-        
-        return "\n\n".join(docs_for_agent)
-    tools = [retrieve_book_context]
-    
-    
-    agent = create_tool_calling_agent(llm, tools,prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools)
-
-    for chunk in agent_executor.stream({"input": query, "chat_history": chat_history or []}):
-        if "output" in chunk:
-            yield chunk["output"]
-
-    yield retrieved_docs
\ No newline at end of file
+class _AgentTurn:
+    """State of the turn being answered, read by the (shared) search tool."""
+
+    def __init__(self, timer, mmr_lambda, chapters=None, route_chapters=None):
+        self.timer = timer
+        self.mmr_lambda = mmr_lambda
+        self.chapters = chapters
+        self.route_chapters = route_chapters
+        self.retrieved_docs = []
+        self.tool_ms = []
+
+
+# Executors are shared between sessions (see src.retrieval.pipelines), so the tool finds its
+# turn through a context variable instead of a closure over per-turn objects.
+_current_turn = ContextVar("rag_agent_turn")
+
+
+def _format_results(turn: _AgentTurn, results, tool_started: float) -> str:
+    docs_for_agent = []
+    contents = []
+    for doc, score in results:
+        doc.metadata["relevance_score"] = score
+        turn.retrieved_docs.append(doc)
+        content = doc.metadata.get('raw_text', doc.page_content) if doc.metadata.get('preprocessed') else doc.page_content
+        contents.append(content)
+        docs_for_agent.append(f"Source: {doc.metadata.get('source', 'Unknown')} (Content: {content}")
+    turn.timer.add_chunks(contents)
+    turn.tool_ms.append(turn.timer.elapsed_ms() - tool_started)
+
+    return "\n\n".join(docs_for_agent)
+
+
+def _search_options(turn: _AgentTurn, chapter: Optional[str]) -> dict:
+    # A chapter named by the agent narrows the search further than the turn's own restriction.
+    chapters = [str(chapter)] if chapter else turn.chapters
+    return {"timer": turn.timer, "mmr_lambda": turn.mmr_lambda, "chapters": chapters, "route_chapters": turn.route_chapters}
+
+
+def _build_agent_executor(pipeline) -> AgentExecutor:
+    def retrieve_book_context(query: str, chapter: Optional[str] = None) -> str:
+        """Search and return information from the Data Mining Textbook. Pass a chapter number to only search that chapter."""
+        turn = _current_turn.get()
+        tool_started = turn.timer.elapsed_ms()
+        turn.timer.record["tool_calls"] += 1
+        results = pipeline.search(query, **_search_options(turn, chapter))
+        return _format_results(turn, results, tool_started)
+
+    async def aretrieve_book_context(query: str, chapter: Optional[str] = None) -> str:
+        """Search and return information from the Data Mining Textbook. Pass a chapter number to only search that chapter."""
+        turn = _current_turn.get()
+        tool_started = turn.timer.elapsed_ms()
+        turn.timer.record["tool_calls"] += 1
+        results = await pipeline.asearch(query, **_search_options(turn, chapter))
+        return _format_results(turn, results, tool_started)
+
+    # One tool with both implementations, so the same executor serves rag_agent and arag_agent.
+    tools = [StructuredTool.from_function(func=retrieve_book_context, coroutine=aretrieve_book_context)]
+    agent = create_tool_calling_agent(pipeline.llm, tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools)
+
+
+def rag_agent(query: str, collection_name: str, top_k: int, search_type: str = "hybrid", chat_history=None, backend: str = "qdrant", mmr_lambda: float | None = None,
+              chapters: list[str] | None = None, route_chapters: int | None = None, sparse_backend: str = "qdrant"):
+    """
+    Agentic rag where the llm decides when (and how often) to search the book through a tool.
+    `mmr_lambda`, `chapters`, `route_chapters` and `sparse_backend` apply to every tool search (see simple_chain);
+    the agent can also restrict a single search to a chapter.
+    Yields the answer text, then the retrieved documents, then the turn's timing record.
+    """
+    timer = TurnTimer("agent", collection=collection_name, search_type=search_type, top_k=top_k, backend=backend, mmr_lambda=mmr_lambda,
+                      chapters=chapters, route_chapters=route_chapters, sparse_backend=sparse_backend)
+    with timer.stage("setup"):
+        pipeline, cached = get_pipeline(collection_name, search_type, top_k, backend, sparse_backend)
+    timer.record["pipeline_cached"] = cached
+
+    with timer.stage("agent_setup"):
+        agent_executor = pipeline.extra("agent_executor", _build_agent_executor)
+
+    turn = _AgentTurn(timer, mmr_lambda, chapters, route_chapters)
+    token = _current_turn.set(turn)
+    try:
+        generation_started = timer.elapsed_ms()
+        for chunk in agent_executor.stream({"input": query, "chat_history": chat_history or []}):
+            if "output" in chunk:
+                timer.mark_first_token()
+                yield chunk["output"]
+        # Time the agent spent in llm calls (planning tool calls and writing the answer).
+        timer.add("generation", timer.elapsed_ms() - generation_started - sum(turn.tool_ms))
+    finally:
+        _current_turn.reset(token)
+
+    yield turn.retrieved_docs
+    yield timer.finish()
+
+
+async def arag_agent(query: str, collection_name: str, top_k: int, search_type: str = "hybrid", chat_history=None, backend: str = "qdrant", mmr_lambda: float | None = None,
+                     chapters: list[str] | None = None, route_chapters: int | None = None, sparse_backend: str = "qdrant"):
+    """Async rag_agent: same arguments and the same items, yielded from an async generator."""
+    timer = TurnTimer("agent_async", collection=collection_name, search_type=search_type, top_k=top_k, backend=backend, mmr_lambda=mmr_lambda,
+                      chapters=chapters, route_chapters=route_chapters, sparse_backend=sparse_backend)
+    with timer.stage("setup"):
+        pipeline, cached = await aget_pipeline(collection_name, search_type, top_k, backend, sparse_backend)
+    timer.record["pipeline_cached"] = cached
+
+    with timer.stage("agent_setup"):
+        agent_executor = pipeline.extra("agent_executor", _build_agent_executor)
+
+    turn = _AgentTurn(timer, mmr_lambda, chapters, route_chapters)
+    token = _current_turn.set(turn)
+    try:
+        generation_started = timer.elapsed_ms()
+        async for chunk in agent_executor.astream({"input": query, "chat_history": chat_history or []}):
+            if "output" in chunk:
+                timer.mark_first_token()
+                yield chunk["output"]
+        timer.add("generation", timer.elapsed_ms() - generation_started - sum(turn.tool_ms))
+    finally:
+        _current_turn.reset(token)
+
+    yield turn.retrieved_docs
+    yield timer.finish()
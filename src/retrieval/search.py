@@ -0,0 +1,187 @@
+import asyncio
+from contextlib import nullcontext
+
+from langchain_core.documents import Document
+from langchain_qdrant import RetrievalMode
+from qdrant_client.http import models
+
+from src.retrieval.mmr import default_fetch_k, mmr_rerank
+from src.util.vectorstore import store_lock
+
+
+def _stage(timer, name: str):
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def _to_document(point, vector_store) -> Document:
+    payload = point.payload or {}
+    metadata = dict(payload.get(vector_store.metadata_payload_key) or {})
+    metadata["_id"] = point.id
+    metadata["_collection_name"] = vector_store.collection_name
+    vector = point.vector.get(vector_store.vector_name) if isinstance(point.vector, dict) else point.vector
+    if vector is not None:
+        metadata["_vector"] = vector
+    return Document(page_content=payload.get(vector_store.content_payload_key, ""), metadata=metadata)
+
+
+def reciprocal_rank_fusion(result_lists: list[list[tuple[Document, float]]], k: int) -> list[tuple[Document, float]]:
+    """Fuse ranked lists the way Qdrant's RRF does (score 1 / (rank + 2), rank from 0), keyed by point id."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results):
+            point_id = str(doc.metadata["_id"])
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (rank + 2)
+            docs.setdefault(point_id, doc)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(docs[point_id], score) for point_id, score in ranked]
+
+
+def search_with_scores(vector_store, query: str, k: int, timer=None, query_filter: models.Filter | None = None, dense_index=None, search_params: models.SearchParams | None = None, mmr_lambda: float | None = None, fetch_k: int | None = None, sparse_index=None, query_vector: list[float] | None = None) -> list[tuple[Document, float]]:
+    """
+    Same search as QdrantVectorStore.similarity_search_with_score, but with query embedding
+    and the Qdrant query as separate steps so each can be timed.
+
+    Args:
+        vector_store: Vectorstore returned by get_vectorstore.
+        query: Search text (already stemmed if the collection needs it).
+        k: Number of results.
+        timer: Optional TurnTimer, records 'query_embedding', 'search' and 'mmr' stages.
+        query_filter: Optional Qdrant filter.
+        dense_index: Optional index from get_dense_index (e.g. FAISS) that replaces Qdrant for the dense side.
+        search_params: Optional Qdrant search params, see get_search_params (quantization rescoring).
+        mmr_lambda: If set, fetch `fetch_k` candidates with their dense vectors and pick k of them
+            with maximal marginal relevance (1.0 = pure relevance, 0.0 = maximal diversity).
+        fetch_k: MMR candidate pool size, defaults to default_fetch_k(k).
+        sparse_index: Optional index from get_sparse_index (native BM25) that replaces Qdrant for the sparse side.
+        query_vector: Dense embedding of `query` if the caller already computed it (e.g. for the answer cache).
+    """
+    with _stage(timer, "query_embedding"):
+        dense_query, sparse_query = _embed_query(vector_store, query, sparse_index, query_vector)
+    limit = k if mmr_lambda is None else fetch_k or default_fetch_k(k)
+    results = _query(vector_store, dense_query, sparse_query, limit, timer, query_filter, dense_index, search_params, with_vectors=mmr_lambda is not None, sparse_index=sparse_index)
+    return _rerank(results, k, timer, mmr_lambda)
+
+
+async def asearch_with_scores(vector_store, query: str, k: int, timer=None, query_filter: models.Filter | None = None, dense_index=None, search_params: models.SearchParams | None = None, mmr_lambda: float | None = None, fetch_k: int | None = None, sparse_index=None, query_vector: list[float] | None = None) -> list[tuple[Document, float]]:
+    """
+    Async search_with_scores (same arguments). The dense query embedding uses the model's async API;
+    the embedded Qdrant client has none, so its query runs in a worker thread.
+    """
+    with _stage(timer, "query_embedding"):
+        dense_query, sparse_query = await _aembed_query(vector_store, query, sparse_index, query_vector)
+    limit = k if mmr_lambda is None else fetch_k or default_fetch_k(k)
+    results = await asyncio.to_thread(
+        _query, vector_store, dense_query, sparse_query, limit, timer, query_filter, dense_index, search_params, mmr_lambda is not None, sparse_index
+    )
+    return _rerank(results, k, timer, mmr_lambda)
+
+
+def _rerank(results: list[tuple[Document, float]], k: int, timer, mmr_lambda: float | None) -> list[tuple[Document, float]]:
+    if mmr_lambda is None:
+        return results
+    with _stage(timer, "mmr"):
+        vectors = [doc.metadata.pop("_vector") for doc, _ in results]
+        return mmr_rerank(results, vectors, k, mmr_lambda)
+
+
+def _sparse_vector(embedding) -> models.SparseVector:
+    return models.SparseVector(indices=embedding.indices, values=embedding.values)
+
+
+def _embed_query(vector_store, query: str, sparse_index=None, query_vector=None):
+    mode = vector_store.retrieval_mode
+    dense_query = sparse_query = None
+    if mode in (RetrievalMode.DENSE, RetrievalMode.HYBRID):
+        dense_query = query_vector if query_vector is not None else vector_store.embeddings.embed_query(query)
+    if mode in (RetrievalMode.SPARSE, RetrievalMode.HYBRID):
+        if sparse_index is not None:
+            sparse_query = sparse_index.encode_query(query)
+        else:
+            sparse_query = _sparse_vector(vector_store.sparse_embeddings.embed_query(query))
+    return dense_query, sparse_query
+
+
+async def _aembed_query(vector_store, query: str, sparse_index=None, query_vector=None):
+    mode = vector_store.retrieval_mode
+    dense_query = sparse_query = None
+    if mode in (RetrievalMode.DENSE, RetrievalMode.HYBRID):
+        dense_query = query_vector if query_vector is not None else await vector_store.embeddings.aembed_query(query)
+    if mode in (RetrievalMode.SPARSE, RetrievalMode.HYBRID):
+        if sparse_index is not None:
+            # Tokenizing and a term lookup, no model.
+            sparse_query = sparse_index.encode_query(query)
+        else:
+            # FastEmbed BM25 is a local CPU call without an async API.
+            sparse_query = _sparse_vector(await asyncio.to_thread(vector_store.sparse_embeddings.embed_query, query))
+    return dense_query, sparse_query
+
+
+def _qdrant_search(vector_store, query, using: str, k: int, query_filter, search_params, vectors) -> list[tuple[Document, float]]:
+    with store_lock.read():
+        points = vector_store.client.query_points(
+            collection_name=vector_store.collection_name,
+            query=query,
+            using=using,
+            query_filter=query_filter,
+            search_params=search_params,
+            limit=k,
+            with_payload=True,
+            with_vectors=vectors,
+        ).points
+    return [(_to_document(point, vector_store), point.score) for point in points]
+
+
+def _query(vector_store, dense_query, sparse_query, k: int, timer, query_filter, dense_index, search_params, with_vectors: bool = False, sparse_index=None) -> list[tuple[Document, float]]:
+    mode = vector_store.retrieval_mode
+    vectors = [vector_store.vector_name] if with_vectors else False
+
+    uses_dense_index = dense_index is not None and mode != RetrievalMode.SPARSE
+    uses_sparse_index = sparse_index is not None and mode != RetrievalMode.DENSE
+    if uses_dense_index or uses_sparse_index:
+        if uses_dense_index and query_filter is not None:
+            raise ValueError("Filtered search isn't supported by the FAISS backend.")
+        # Each side is searched separately and the lists are fused the way Qdrant fuses them.
+        with _stage(timer, "search"):
+            result_lists = []
+            if mode != RetrievalMode.SPARSE:
+                result_lists.append(
+                    dense_index.search(dense_query, k, with_vectors=with_vectors) if uses_dense_index
+                    else _qdrant_search(vector_store, dense_query, vector_store.vector_name, k, query_filter, search_params, vectors)
+                )
+            if mode != RetrievalMode.DENSE:
+                result_lists.append(
+                    sparse_index.search(sparse_query, k, vector_store, query_filter=query_filter, with_vectors=with_vectors) if uses_sparse_index
+                    else _qdrant_search(vector_store, sparse_query, vector_store.sparse_vector_name, k, query_filter, None, vectors)
+                )
+            if len(result_lists) == 1:
+                return result_lists[0]
+            return reciprocal_rank_fusion(result_lists, k)
+
+    query_options = {
+        "collection_name": vector_store.collection_name,
+        "query_filter": query_filter,
+        "search_params": search_params,
+        "limit": k,
+        "with_payload": True,
+        "with_vectors": vectors,
+    }
+    with _stage(timer, "search"), store_lock.read():
+        if mode == RetrievalMode.DENSE:
+            points = vector_store.client.query_points(
+                query=dense_query, using=vector_store.vector_name, **query_options
+            ).points
+        elif mode == RetrievalMode.SPARSE:
+            points = vector_store.client.query_points(
+                query=sparse_query, using=vector_store.sparse_vector_name, **query_options
+            ).points
+        else:
+            points = vector_store.client.query_points(
+                prefetch=[
+                    models.Prefetch(using=vector_store.vector_name, query=dense_query, filter=query_filter, limit=k, params=search_params),
+                    models.Prefetch(using=vector_store.sparse_vector_name, query=sparse_query, filter=query_filter, limit=k, params=search_params),
+                ],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                **query_options,
+            ).points
+
+    return [(_to_document(point, vector_store), point.score) for point in points]
@@ -1,80 +1,190 @@
-from src.util.vectorstore import get_vectorstore
-from src.util.env_check import get_rag_models
+import json
+
+from src.util.timing import TurnTimer
+from src.retrieval.answer_cache import answer_cache_enabled, get_answer_cache
+from src.retrieval.pipelines import _model_key, aget_pipeline, get_pipeline
+from src.retrieval.context import build_context, chunk_content, context_budget
+from src.util.llm import get_context_window
 from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
 from typing import List, Optional
 
 
-llm, embedding_model, sparse_model = get_rag_models()
+SYSTEM_PROMPT = (
+    "You are an expert Data Mining Tutor helping a student study from Charu C. Aggarwal's 'Data Mining: The Textbook'.\n\n"
 
-def simple_chain(
-    query: str,
-    collection_name: str,
-    top_k: int,
-    search_type: str = "hybrid",
-    chat_history: Optional[List[BaseMessage]] = None,
-):
-    """
-    Simple rag implementation where the user question is used to
-    find the most similar chunks of the book.
-    These are passed to the llm as context from which it should answer.
-    """
-    vector_store = get_vectorstore(embedding_model, sparse_model, collection_name, search_type)
-    search_query = query
-    sample_docs = vector_store.similarity_search(search_query,k=1)
-    sample_doc = sample_docs[0]
-    preproccessed = sample_doc.metadata.get('preprocessed',False)
-    if preproccessed:
-        from src.util.stemming import preprocess_text
-        search_query = preprocess_text(query)
+    "Your goal is to provide clear, educational responses structured into two distinct parts: \n"
+    "1. Theoretical Explanation \n"
+    "2. Python Code Implementation \n\n"
 
-    retrieved_docs = vector_store.similarity_search_with_score(search_query, k=top_k)
+    "### Guidelines:\n"
+    "- STRICT CONTEXT FOR THEORY: You MUST base your theoretical explanation ONLY on the provided context snippets. Do not invent theories, formulas, or include concepts not found in the text. "
+    "If the context does not contain enough information to answer the question, state clearly: 'The provided text does not contain enough information to answer this.'\n"
+    "- EXTERNAL KNOWLEDGE FOR CODE: Because the textbook focuses on mathematical theory, you are explicitly allowed and encouraged to use your general programming knowledge to write Python code (e.g., using pandas, numpy, scikit-learn). The code must accurately practically demonstrate the specific theoretical concepts discussed in the context.\n"
+    "- MATH FORMATTING: When writing mathematical formulas, you MUST use LaTeX notation:\n"
+    "  - Use double dollar signs for standalone equations (e.g., $$E=mc^2$$).\n"
+    "  - Use single dollar signs for inline math (e.g., $x^2$).\n"
+    "  - Do not use brackets like \\[ \\] or \\( \\) for math.\n"
+    "- TONE AND STRUCTURE: Be encouraging, clear, and pedagogical. Use Markdown formatting, clear headings, and bullet points to make your explanations scannable and easy to digest.\n\n"
+
+    "Here is the context:\n"
+)
 
-    formatted_docs = []
-    docs_content_list = []
 
+def _build_messages(llm, query: str, retrieved_docs, chat_history, timer):
+    """Prompt messages for the retrieved chunks. Returns (messages, documents shown as sources)."""
+    prompt_started = timer.elapsed_ms()
+
+    formatted_docs = []
     for doc, score in retrieved_docs:
         doc.metadata["relevance_score"] = score
         formatted_docs.append(doc)
 
-        content = doc.metadata.get("raw_text", doc.page_content) if "preprocessed" in doc.metadata else doc.page_content
-        docs_content_list.append(content)
-
-    docs_content = "\n<TEXT CHUNK>\n".join(docs_content_list)
-
-
-    system_message = (
-        "You are an expert Data Mining Tutor helping a student study from Charu C. Aggarwal's 'Data Mining: The Textbook'.\n\n"
-
-        "Your goal is to provide clear, educational responses structured into two distinct parts: \n"
-        "1. Theoretical Explanation \n"
-        "2. Python Code Implementation \n\n"
-
-        "### Guidelines:\n"
-        "- STRICT CONTEXT FOR THEORY: You MUST base your theoretical explanation ONLY on the provided context snippets. Do not invent theories, formulas, or include concepts not found in the text. "
-        "If the context does not contain enough information to answer the question, state clearly: 'The provided text does not contain enough information to answer this.'\n"
-        "- EXTERNAL KNOWLEDGE FOR CODE: Because the textbook focuses on mathematical theory, you are explicitly allowed and encouraged to use your general programming knowledge to write Python code (e.g., using pandas, numpy, scikit-learn). The code must accurately practically demonstrate the specific theoretical concepts discussed in the context.\n"
-        "- MATH FORMATTING: When writing mathematical formulas, you MUST use LaTeX notation:\n"
-        "  - Use double dollar signs for standalone equations (e.g., $$E=mc^2$$).\n"
-        "  - Use single dollar signs for inline math (e.g., $x^2$).\n"
-        "  - Do not use brackets like \\[ \\] or \\( \\) for math.\n"
-        "- TONE AND STRUCTURE: Be encouraging, clear, and pedagogical. Use Markdown formatting, clear headings, and bullet points to make your explanations scannable and easy to digest.\n\n"
-
-        "Here is the context:\n"
-        f"{docs_content}"
+    # Overlapping chunks are merged, repeated chapter headers dropped and the result trimmed
+    # to what fits in the model's context window next to the prompt and chat history.
+    budget = context_budget(
+        get_context_window(llm), SYSTEM_PROMPT, query, *(message.content for message in chat_history or [])
     )
+    docs_content, context_stats = build_context(formatted_docs, budget)
 
-    messages = [SystemMessage(content=system_message)]
+    messages = [SystemMessage(content=SYSTEM_PROMPT + docs_content)]
 
     if chat_history:
         messages.extend(chat_history)
 
     messages.append(HumanMessage(content=query))
+    timer.add("prompt_assembly", timer.elapsed_ms() - prompt_started)
+    timer.add_chunks([chunk_content(doc) for doc in formatted_docs])
+    timer.record.update(context_stats)
+    timer.record["prompt_chars"] = sum(len(message.content) for message in messages)
+    return messages, formatted_docs
 
 
-    for chunk in llm.stream(messages):
-        yield chunk.content
+def _answer_cache_settings(pipeline, mmr_lambda, chapters, route_chapters) -> str:
+    """Everything besides the question that shapes an answer; cached answers are only reused for the same settings."""
+    return json.dumps([pipeline.search_type, pipeline.top_k, pipeline.backend, pipeline.sparse_backend, mmr_lambda, chapters, route_chapters, *_model_key()])
 
-    yield formatted_docs
 
+def _cache_hit(timer, cached):
+    """Items yielded for a cached answer, in the same order as a generated one."""
+    answer, documents, similarity = cached
+    timer.record.update(answer_cache="hit", answer_cache_similarity=round(similarity, 4))
+    timer.mark_first_token()
+    timer.add_chunks([chunk_content(doc) for doc in documents])
+    return [answer, documents, timer.finish()]
 
 
+def simple_chain(
+    query: str,
+    collection_name: str,
+    top_k: int,
+    search_type: str = "hybrid",
+    chat_history: Optional[List[BaseMessage]] = None,
+    backend: str = "qdrant",
+    mmr_lambda: Optional[float] = None,
+    chapters: Optional[List[str]] = None,
+    route_chapters: Optional[int] = None,
+    sparse_backend: str = "qdrant",
+):
+    """
+    Simple rag implementation where the user question is used to
+    find the most similar chunks of the book.
+    These are passed to the llm as context from which it should answer.
+    With `mmr_lambda` set, the top_k chunks are picked from a larger candidate pool with
+    maximal marginal relevance, so near-duplicate neighbouring chunks don't fill the context.
+    `chapters` restricts the search to the given chapter numbers; `route_chapters` searches only the
+    chapters closest to the question (collections with a chapter index, see src.retrieval.chapters).
+    `sparse_backend='bm25'` serves the keyword side from the native BM25 index (see src.util.bm25_store).
+    Questions asked without chat history are first looked up in the collection's answer cache
+    (see AnswerCache); a near-duplicate of an earlier question gets its answer and sources back
+    without retrieval or generation.
+    Yields the answer text, then the retrieved documents, then the turn's timing record.
+    """
+    timer = TurnTimer("simple", collection=collection_name, search_type=search_type, top_k=top_k, backend=backend, mmr_lambda=mmr_lambda,
+                      chapters=chapters, route_chapters=route_chapters, sparse_backend=sparse_backend)
+    with timer.stage("setup"):
+        pipeline, cached = get_pipeline(collection_name, search_type, top_k, backend, sparse_backend)
+    timer.record["pipeline_cached"] = cached
+
+    # Follow-up questions depend on the conversation, so only standalone questions use the answer cache.
+    answer_cache = get_answer_cache(collection_name) if answer_cache_enabled() and not chat_history else None
+    search_query = pipeline.preprocess(query, timer)
+    query_vector = None
+    if answer_cache is not None:
+        with timer.stage("answer_cache"):
+            settings = _answer_cache_settings(pipeline, mmr_lambda, chapters, route_chapters)
+            # The vector of the text the search embeds, so it's reused there instead of embedding twice.
+            query_vector = pipeline.vector_store.embeddings.embed_query(search_query)
+            cached = answer_cache.lookup(query_vector, settings)
+        if cached is not None:
+            yield from _cache_hit(timer, cached)
+            return
+        timer.record["answer_cache"] = "miss"
+
+    retrieved_docs = pipeline.search(search_query, timer=timer, mmr_lambda=mmr_lambda, chapters=chapters, route_chapters=route_chapters,
+                                     query_vector=query_vector, preprocessed=True)
+    messages, formatted_docs = _build_messages(pipeline.llm, query, retrieved_docs, chat_history, timer)
+
+    answer = []
+    with timer.stage("generation"):
+        for chunk in pipeline.llm.stream(messages):
+            timer.mark_first_token()
+            answer.append(chunk.content)
+            yield chunk.content
+
+    if answer_cache is not None:
+        answer_cache.store(query, query_vector, settings, "".join(answer), formatted_docs)
+    yield formatted_docs
+    yield timer.finish()
+
+
+async def asimple_chain(
+    query: str,
+    collection_name: str,
+    top_k: int,
+    search_type: str = "hybrid",
+    chat_history: Optional[List[BaseMessage]] = None,
+    backend: str = "qdrant",
+    mmr_lambda: Optional[float] = None,
+    chapters: Optional[List[str]] = None,
+    route_chapters: Optional[int] = None,
+    sparse_backend: str = "qdrant",
+):
+    """
+    Async simple_chain: same arguments and the same items, yielded from an async generator.
+    Query embedding and generation use the models' async APIs, so one event loop can serve many turns.
+    """
+    timer = TurnTimer("simple_async", collection=collection_name, search_type=search_type, top_k=top_k, backend=backend, mmr_lambda=mmr_lambda,
+                      chapters=chapters, route_chapters=route_chapters, sparse_backend=sparse_backend)
+    with timer.stage("setup"):
+        pipeline, cached = await aget_pipeline(collection_name, search_type, top_k, backend, sparse_backend)
+    timer.record["pipeline_cached"] = cached
+
+    answer_cache = get_answer_cache(collection_name) if answer_cache_enabled() and not chat_history else None
+    search_query = pipeline.preprocess(query, timer)
+    query_vector = None
+    if answer_cache is not None:
+        with timer.stage("answer_cache"):
+            settings = _answer_cache_settings(pipeline, mmr_lambda, chapters, route_chapters)
+            query_vector = await pipeline.vector_store.embeddings.aembed_query(search_query)
+            cached = answer_cache.lookup(query_vector, settings)
+        if cached is not None:
+            for item in _cache_hit(timer, cached):
+                yield item
+            return
+        timer.record["answer_cache"] = "miss"
+
+    retrieved_docs = await pipeline.asearch(search_query, timer=timer, mmr_lambda=mmr_lambda, chapters=chapters, route_chapters=route_chapters,
+                                            query_vector=query_vector, preprocessed=True)
+    messages, formatted_docs = _build_messages(pipeline.llm, query, retrieved_docs, chat_history, timer)
+
+    answer = []
+    with timer.stage("generation"):
+        async for chunk in pipeline.llm.astream(messages):
+            timer.mark_first_token()
+            answer.append(chunk.content)
+            yield chunk.content
+
+    if answer_cache is not None:
+        answer_cache.store(query, query_vector, settings, "".join(answer), formatted_docs)
+    yield formatted_docs
+    yield timer.finish()
@@ -0,0 +1,298 @@
+"""
+Native BM25 sparse index, built from an ingested Qdrant collection.
+
+An alternative to the FastEmbed "Qdrant/bm25" model for the sparse side of sparse and
+hybrid search: BM25 only needs term statistics, so the chunks are tokenized once with the
+project's stemming preprocessor and stored as a term-major (CSC) matrix of precomputed
+BM25 weights. Scoring a query is one gather over the postings of its terms plus a
+bincount, without running a model. All arrays are memory-mapped at load.
+
+A rebuild writes a new directory and renames it into place, so readers that still have
+the previous arrays mapped keep reading a complete index.
+
+    python -m src.util.bm25_store build <collection>
+"""
+import argparse
+import json
+import shutil
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+project_root = Path(__file__).resolve().parents[2]
+bm25_root = project_root / "data" / "vector_db" / "bm25"
+
+# Same defaults as Qdrant/bm25.
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+
+def bm25_dir(collection_name: str) -> Path:
+    return bm25_root / collection_name
+
+
+def _index_meta(collection_name: str) -> dict | None:
+    try:
+        with open(bm25_dir(collection_name) / "meta.json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def has_bm25_index(collection_name: str) -> bool:
+    """Whether the collection has a BM25 index built from its current ingest (a re-ingest makes it stale)."""
+    from src.util.manifest import ingest_id
+    meta = _index_meta(collection_name)
+    return meta is not None and meta.get("ingest_id", "") == ingest_id(collection_name)
+
+
+def remove_bm25_index(collection_name: str):
+    """Delete the collection's BM25 index, e.g. after a rebuild failed, so the old one isn't served."""
+    with _INDEXES_LOCK:
+        _INDEXES.pop(collection_name, None)
+    shutil.rmtree(bm25_dir(collection_name), ignore_errors=True)
+
+
+def _tokenize(text: str) -> list[str]:
+    from src.util.stemming import preprocess_text
+    return preprocess_text(text).split()
+
+
+def build_bm25_index(collection_name: str, client=None, batch_size: int = 512, k1: float = DEFAULT_K1, b: float = DEFAULT_B, tokenize=None) -> int:
+    """
+    Tokenize the chunks of a Qdrant collection and write their BM25 index to disk.
+
+    Args:
+        collection_name: Collection to index.
+        client: Qdrant client, defaults to the shared on-disk one.
+        batch_size: Points fetched per scroll call.
+        k1: Term frequency saturation.
+        b: Document length normalization.
+        tokenize: Text -> terms, defaults to the stemming preprocessor (lowercase, stop words, stems).
+
+    Returns the number of chunks indexed.
+    """
+    from src.util.vectorstore import _get_client, store_lock
+    from src.util.manifest import get_manifest, ingest_id, update_manifest
+
+    client = client or _get_client()
+    tokenize = tokenize or _tokenize
+
+    vocabulary = {}
+    ids, lengths = [], []
+    rows, cols, tfs = [], [], []
+    offset = None
+    while True:
+        with store_lock.read():
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=False
+            )
+        for point in points:
+            terms = tokenize((point.payload or {}).get("page_content", ""))
+            row = len(ids)
+            ids.append(str(point.id))
+            lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                tfs.append(tf)
+        if offset is None:
+            break
+
+    if not ids:
+        raise ValueError(f"Collection '{collection_name}' is empty.")
+
+    # Terms are stored sorted so a query term is found with a binary search on the mmapped array.
+    terms = np.asarray(sorted(vocabulary))
+    remap = np.empty(len(vocabulary), dtype=np.int64)
+    remap[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+    rows = np.asarray(rows, dtype=np.int32)
+    cols = remap[np.asarray(cols, dtype=np.int64)]
+    tfs = np.asarray(tfs, dtype=np.float32)
+    lengths = np.asarray(lengths, dtype=np.float32)
+
+    order = np.lexsort((rows, cols))
+    rows, cols, tfs = rows[order], cols[order], tfs[order]
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(cols, minlength=len(terms)))
+
+    n_docs = len(ids)
+    avgdl = float(lengths.mean()) or 1.0
+    df = np.diff(indptr).astype(np.float32)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    weights = idf[cols] * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths[rows] / avgdl))
+
+    out_dir = bm25_dir(collection_name)
+    tmp_dir = bm25_root / f"{collection_name}.{uuid.uuid4().hex}.tmp"
+    tmp_dir.mkdir(parents=True)
+    try:
+        np.save(tmp_dir / "terms.npy", terms)
+        np.save(tmp_dir / "indptr.npy", indptr)
+        np.save(tmp_dir / "postings.npy", rows)
+        np.save(tmp_dir / "weights.npy", weights.astype(np.float32))
+        np.save(tmp_dir / "ids.npy", np.asarray(ids, dtype="U36"))
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump({
+                "count": n_docs, "terms": len(terms), "postings": len(rows), "k1": k1, "b": b, "avgdl": avgdl,
+                # The ingest the chunks were read from, see has_bm25_index.
+                "ingest_id": ingest_id(collection_name),
+            }, f)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    with _INDEXES_LOCK:
+        # Pipelines still holding the old index keep their mapping until they are rebuilt.
+        _INDEXES.pop(collection_name, None)
+        old_dir = None
+        if out_dir.exists():
+            old_dir = bm25_root / f"{collection_name}.{uuid.uuid4().hex}.old"
+            out_dir.rename(old_dir)
+        tmp_dir.rename(out_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    if get_manifest(collection_name) is not None:
+        update_manifest(collection_name, bm25_index=True)
+    return n_docs
+
+
+class BM25Index:
+    """
+    Read-only BM25 index of one collection, memory-mapped from disk.
+
+    Only scores are computed here, the payloads (and vectors, for MMR) of the top chunks
+    are fetched from Qdrant.
+
+    Args:
+        collection_name: Collection whose index to open (see build_bm25_index).
+        tokenize: Must match the tokenizer the index was built with.
+    """
+
+    def __init__(self, collection_name: str, tokenize=None):
+        self.collection_name = collection_name
+        self.tokenize = tokenize or _tokenize
+        directory = bm25_dir(collection_name)
+        with open(directory / "meta.json", "r") as f:
+            self.meta = json.load(f)
+        self.terms = np.load(directory / "terms.npy", mmap_mode="r")
+        self.indptr = np.load(directory / "indptr.npy", mmap_mode="r")
+        self.postings = np.load(directory / "postings.npy", mmap_mode="r")
+        self.weights = np.load(directory / "weights.npy", mmap_mode="r")
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+
+    def encode_query(self, query: str) -> dict[int, int]:
+        """Term column -> count, for the query terms that occur in the collection."""
+        encoded = {}
+        for term, count in Counter(self.tokenize(query)).items():
+            col = int(np.searchsorted(self.terms, term))
+            if col < len(self.terms) and self.terms[col] == term:
+                encoded[col] = count
+        return encoded
+
+    def scores(self, encoded_query: dict[int, int]) -> np.ndarray:
+        """BM25 score of every chunk (the CSC matrix times the query's term counts)."""
+        if not encoded_query:
+            return np.zeros(self.meta["count"], dtype=np.float32)
+        cols = list(encoded_query)
+        starts, ends = self.indptr[cols], self.indptr[np.asarray(cols) + 1]
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        query_tf = np.repeat(np.asarray([encoded_query[col] for col in cols], dtype=np.float32), ends - starts)
+        return np.bincount(
+            self.postings[positions], weights=self.weights[positions] * query_tf, minlength=self.meta["count"]
+        ).astype(np.float32)
+
+    def search(self, encoded_query: dict[int, int], k: int, vector_store, query_filter=None, with_vectors: bool = False, batch_size: int = 2048) -> list[tuple[Document, float]]:
+        """
+        Top-k chunks by BM25 score, in the same shape as QdrantVectorStore results.
+
+        Args:
+            encoded_query: Output of encode_query.
+            k: Number of results.
+            vector_store: Vectorstore of the collection, used to fetch the payloads.
+            query_filter: Optional Qdrant filter. The chunks it matches are looked up first and
+                only those are ranked, so a filtered search finds matches of any rank.
+            with_vectors: Also fetch the dense vectors into metadata['_vector'] (used by MMR).
+            batch_size: Ids fetched per scroll call when resolving `query_filter`.
+        """
+        from src.retrieval.search import _to_document
+        from src.util.vectorstore import store_lock
+
+        scores = self.scores(encoded_query)
+        matched = np.flatnonzero(scores)
+        if query_filter is not None and len(matched):
+            allowed = self._filtered_ids(vector_store, query_filter, batch_size)
+            matched = matched[np.isin(self.ids[matched], allowed)]
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        if len(matched) == 0:
+            return []
+
+        point_ids = [str(self.ids[row]) for row in matched]
+        vectors = [vector_store.vector_name] if with_vectors else False
+        with store_lock.read():
+            points = vector_store.client.retrieve(
+                collection_name=vector_store.collection_name, ids=point_ids, with_payload=True, with_vectors=vectors
+            )
+
+        by_id = {str(point.id): point for point in points}
+        return [
+            (_to_document(by_id[point_id], vector_store), float(scores[row]))
+            for row, point_id in zip(matched, point_ids)
+            if point_id in by_id
+        ]
+
+    def _filtered_ids(self, vector_store, query_filter, batch_size: int) -> np.ndarray:
+        """Ids of the chunks matching a Qdrant filter (e.g. the chunks of some chapters)."""
+        from src.util.vectorstore import store_lock
+
+        ids = []
+        offset = None
+        while True:
+            with store_lock.read():
+                points, offset = vector_store.client.scroll(
+                    collection_name=vector_store.collection_name, scroll_filter=query_filter, limit=batch_size,
+                    offset=offset, with_payload=False, with_vectors=False,
+                )
+            ids.extend(str(point.id) for point in points)
+            if offset is None:
+                break
+        return np.asarray(ids, dtype="U36")
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+def load_bm25_index(collection_name: str) -> BM25Index:
+    """BM25Index for a collection, opened once per process (and again once the index was rebuilt)."""
+    from src.util.manifest import ingest_id
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(collection_name)
+        if cached is not None and cached.meta.get("ingest_id", "") != ingest_id(collection_name):
+            del _INDEXES[collection_name]
+        if collection_name not in _INDEXES:
+            _INDEXES[collection_name] = BM25Index(collection_name)
+        return _INDEXES[collection_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a native BM25 index from a Qdrant collection.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build")
+    build.add_argument("collection")
+    build.add_argument("--k1", type=float, default=DEFAULT_K1)
+    build.add_argument("--b", type=float, default=DEFAULT_B)
+    args = parser.parse_args()
+
+    count = build_bm25_index(args.collection, k1=args.k1, b=args.b)
+    print(f"Indexed {count} chunks of '{args.collection}' into {bm25_dir(args.collection)}")
+
+
+if __name__ == "__main__":
+    main()
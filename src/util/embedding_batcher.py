@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+
+class _Request:
+    __slots__ = ("text", "future", "submitted")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces concurrent embed_query calls into batched embed_documents calls.
+
+    The first query that arrives opens a window of `window_ms`; queries arriving in it (up
+    to `max_batch`) are embedded together in one request to the embedding server and each
+    caller gets its own vector back. Queries that arrive while a batch is being embedded
+    wait for the next one.
+
+    Queries are embedded with embed_documents, so only wrap models whose embed_query is
+    embed_documents of the single text (the Ollama and OpenAI models of get_embedding_model).
+    Models that add a query instruction or prefix would get document vectors for queries.
+
+    Args:
+        embeddings: The underlying embedding model.
+        window_ms: How long the first query of a batch waits for others to join.
+        max_batch: Batch size at which the batch is sent without waiting for the window to end.
+    """
+
+    def __init__(self, embeddings: Embeddings, window_ms: float = 5.0, max_batch: int = 16):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None)
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def _submit(self, text: str) -> Future:
+        request = _Request(text)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchingEmbeddings is closed")
+            self._ensure_worker()
+            self._pending.append(request)
+            self._cond.notify_all()
+        return request.future
+
+    def _next_batch(self) -> list[_Request] | None:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0].submitted + self.window
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                for request in batch:
+                    waited = started - request.submitted
+                    self.queue_seconds += waited
+                    self.max_queue_seconds = max(self.max_queue_seconds, waited)
+            try:
+                vectors = self.embeddings.embed_documents([request.text for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, vector in zip(batch, vectors):
+                request.future.set_result(vector)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Document batches (ingestion) are already batched by the caller.
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Queries embedded, batches sent, average batch size and the delay added by waiting for a batch."""
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "avg_queue_ms": self.queue_seconds / self.requests * 1000 if self.requests else 0.0,
+                "max_queue_ms": self.max_queue_seconds * 1000,
+            }
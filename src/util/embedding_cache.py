@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+project_root = Path(__file__).resolve().parents[2]
+default_cache_path = project_root / "data" / "cache" / "embeddings.sqlite"
+
+# SQLite limits the number of bound variables per statement.
+_SQL_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent cache keyed by (model name, text hash).
+
+    Vectors are stored as float32 blobs in SQLite. When the cache grows past `max_entries`
+    the least recently used vectors are evicted. Shared by ingestion and querying, so
+    re-ingesting a book with new chunk parameters only embeds the chunks that changed.
+
+    Args:
+        embeddings: The underlying embedding model (Ollama or OpenAI).
+        model_name: Name used in the cache key, usually the embedding model name.
+        path: SQLite file to use.
+        max_entries: Maximum number of cached vectors across all models.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, path: Path = default_cache_path, max_entries: int = 200_000):
+        self.embeddings = embeddings
+        self.model = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode("utf-8")).digest()
+
+    def _lookup(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i : i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: dict[bytes, list[float]]):
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._size += self._conn.total_changes - before
+
+            if self._size > self.max_entries:
+                overflow = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def _split(self, kind: str, texts: list[str]):
+        """Keys of `texts`, the cached vectors found and the texts still to embed (by key)."""
+        keys = [self._key(kind, text) for text in texts]
+        found = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += sum(1 for key in keys if key in missing)
+        return keys, found, missing
+
+    def _embed(self, kind: str, texts: list[str], embed_fn) -> list[list[float]]:
+        keys, found, missing = self._split(kind, texts)
+        if missing:
+            new_items = dict(zip(missing.keys(), embed_fn(list(missing.values()))))
+            self._store(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def _aembed(self, kind: str, texts: list[str], aembed_fn) -> list[list[float]]:
+        # Lookups and stores are single SQLite statements, only the model call is awaited.
+        keys, found, missing = self._split(kind, texts)
+        if missing:
+            new_items = dict(zip(missing.keys(), await aembed_fn(list(missing.values()))))
+            self._store(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed("doc", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed("doc", texts, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        async def embed(texts):
+            return [await self.embeddings.aembed_query(texts[0])]
+        return (await self._aembed("query", [text], embed))[0]
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and the number of vectors currently stored."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+        }
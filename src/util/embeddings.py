@@ -1,31 +1,54 @@
-from langchain_ollama import OllamaEmbeddings
-from langchain_openai import OpenAIEmbeddings
 import os
 from typing import Literal
 from .ollama import require_ollama
+from .embedding_cache import CachedEmbeddings
+from .embedding_batcher import BatchingEmbeddings
 
-def get_embedding_model(mode : Literal["local","cloud"],model_name : str = "qwen3-embedding:0.6b"):
+def get_embedding_model(mode : Literal["local","cloud"],model_name : str = "qwen3-embedding:0.6b", use_cache: bool | None = None):
     """
     Return an embedding model based on .env setup and args.
 
     Args:
         mode  ("local","cloud") : Local uses Ollama, cloud uses OpenAI api and needs an api_key set.
         model_name (str) : Passed through to Ollama if using local mode, if using cloud set to text-embedding-3-small.
+        use_cache (bool) : Wrap the model in the on-disk embedding cache. Defaults to the EMBEDDING_CACHE env variable (on).
+
+    With EMBED_BATCHING on, concurrent query embeddings are micro-batched (EMBED_BATCH_WINDOW_MS,
+    EMBED_BATCH_MAX). Off by default since a single user gains nothing from it but the window's
+    delay; the API server turns it on.
 
     """
     if mode=="cloud":
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("Set OPENAI_API_KEY in .env to use the openai api")
+        from langchain_openai import OpenAIEmbeddings
         model_name = "text-embedding-3-small"
-        return OpenAIEmbeddings(model=model_name,api_key=api_key)
+        embedding_model = OpenAIEmbeddings(model=model_name,api_key=api_key)
 
     elif mode=="local":
+        from langchain_ollama import OllamaEmbeddings
         require_ollama(model_name)
-        return OllamaEmbeddings(model=model_name)
+        embedding_model = OllamaEmbeddings(model=model_name)
  
     else:
         raise ValueError("mode must be 'local' or 'cloud'")
 
+    if os.getenv("EMBED_BATCHING", "false").lower() in ("1", "true", "yes"):
+        # Below the cache, so only cache misses wait for a batch.
+        embedding_model = BatchingEmbeddings(
+            embedding_model,
+            window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+            max_batch=int(os.getenv("EMBED_BATCH_MAX", "16")),
+        )
+
+    if use_cache is None:
+        use_cache = os.getenv("EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes")
+    if use_cache:
+        max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        return CachedEmbeddings(embedding_model, model_name, max_entries=max_entries)
+
+    return embedding_model
+
 
 
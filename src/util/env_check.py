@@ -1,25 +1,51 @@
 import os
-from src.util.embeddings import get_embedding_model as _get_embedding_model
-from src.util.llm import get_llm as _get_llm
-from langchain_qdrant import FastEmbedSparse
+import threading
 from dotenv import load_dotenv
-load_dotenv() 
+load_dotenv()
 
-sparse_model = FastEmbedSparse(model_name="Qdrant/bm25")
+# Models are created on first use and shared by everything in the process (both chains, ingestion).
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
 
 def _validate_env():
     """Checks if all required env variables are set."""
     if not os.getenv("LLM_MODEL_NAME") or not os.getenv("EMBEDDING_MODEL_NAME"):
         raise ValueError("LLM_MODEL_NAME and EMBEDDING_MODEL_NAME must be set.")
 
+def _get_or_create(key: str, factory):
+    if key not in _MODELS:
+        with _MODELS_LOCK:
+            if key not in _MODELS:
+                _MODELS[key] = factory()
+    return _MODELS[key]
+
 def get_llm_model():
     _validate_env()
-    return _get_llm(os.getenv("LLM_MODE", "local"), os.getenv("LLM_MODEL_NAME"))
+
+    def create():
+        from src.util.llm import get_llm
+        return get_llm(os.getenv("LLM_MODE", "local"), os.getenv("LLM_MODEL_NAME"))
+
+    return _get_or_create("llm", create)
 
 def get_embed_model():
     _validate_env()
-    return _get_embedding_model(os.getenv("EMBEDDING_MODE", "local"), os.getenv("EMBEDDING_MODEL_NAME"))
+
+    def create():
+        from src.util.embeddings import get_embedding_model
+        return get_embedding_model(os.getenv("EMBEDDING_MODE", "local"), os.getenv("EMBEDDING_MODEL_NAME"))
+
+    return _get_or_create("embedding", create)
+
+def get_sparse_model():
+    """BM25 sparse model. Loading it pulls in the ONNX runtime, so it's only done when a sparse or hybrid search needs it."""
+
+    def create():
+        from langchain_qdrant import FastEmbedSparse
+        return FastEmbedSparse(model_name="Qdrant/bm25")
+
+    return _get_or_create("sparse", create)
 
 def get_rag_models():
     """Returns (llm, dense_embedding_model, sparse_embedding_model) for the main RAG chain."""
-    return get_llm_model(), get_embed_model(), sparse_model
+    return get_llm_model(), get_embed_model(), get_sparse_model()
@@ -0,0 +1,274 @@
+"""
+FAISS dense index backend, built from an ingested Qdrant collection.
+
+Index files are memory-mapped at load, and payloads live in a side store (one JSON
+blob per row plus an offsets array, also memory-mapped). Several worker processes can
+open the same read-only index and share the OS page cache instead of each holding a
+copy, and they don't need the embedded Qdrant storage, which only one process can open.
+A rebuild writes a new directory and renames it into place, so readers that still have
+the previous files mapped keep reading a complete index.
+
+    python -m src.util.faiss_store build <collection> --index hnsw
+"""
+import argparse
+import json
+import mmap
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+project_root = Path(__file__).resolve().parents[2]
+faiss_root = project_root / "data" / "vector_db" / "faiss"
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+
+def faiss_dir(collection_name: str) -> Path:
+    return faiss_root / collection_name
+
+
+def _index_meta(collection_name: str) -> dict | None:
+    try:
+        with open(faiss_dir(collection_name) / "meta.json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def has_faiss_index(collection_name: str) -> bool:
+    """Whether the collection has a FAISS index built from its current ingest (a re-ingest makes it stale)."""
+    from src.util.manifest import ingest_id
+    meta = _index_meta(collection_name)
+    return (
+        meta is not None
+        and (faiss_dir(collection_name) / "index.faiss").exists()
+        and meta.get("ingest_id", "") == ingest_id(collection_name)
+    )
+
+
+def remove_faiss_index(collection_name: str):
+    """Delete the collection's FAISS index, e.g. when the collection is deleted."""
+    with _INDEXES_LOCK:
+        _INDEXES.pop(collection_name, None)
+    shutil.rmtree(faiss_dir(collection_name), ignore_errors=True)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarity == inner product of unit vectors, which is what the indexes below compute."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _dense_vector(point, vector_name: str = ""):
+    vector = point.vector
+    if isinstance(vector, dict):
+        vector = vector.get(vector_name)
+    return vector
+
+
+def _create_index(index_type: str, dim: int, count: int, hnsw_m: int = 32, nlist: int | None = None):
+    import faiss
+
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        return index
+    if index_type == "ivf":
+        # Rule of thumb: ~sqrt(n) lists, but keep enough training points per list.
+        nlist = nlist or max(1, min(int(np.sqrt(count)), count // 39 or 1))
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+
+
+def build_faiss_index(collection_name: str, index_type: str = "hnsw", client=None, batch_size: int = 512, hnsw_m: int = 32, nlist: int | None = None) -> int:
+    """
+    Export a Qdrant collection's dense vectors and payloads into a FAISS index on disk.
+
+    Args:
+        collection_name: Collection to export.
+        index_type: 'flat' (exact), 'hnsw' or 'ivf'.
+        client: Qdrant client, defaults to the shared on-disk one.
+        batch_size: Points fetched per scroll call.
+        hnsw_m: Graph degree for HNSW.
+        nlist: Number of IVF lists (defaults to ~sqrt(n)).
+
+    Returns the number of vectors indexed.
+    """
+    import faiss
+    from src.util.vectorstore import _get_client, store_lock
+    from src.util.manifest import get_manifest, ingest_id, update_manifest
+
+    client = client or _get_client()
+
+    vectors, ids, payload_blobs = [], [], []
+    offset = None
+    while True:
+        with store_lock.read():
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+        for point in points:
+            vectors.append(_dense_vector(point))
+            ids.append(str(point.id))
+            payload_blobs.append(json.dumps(point.payload or {}).encode("utf-8"))
+        if offset is None:
+            break
+
+    if not vectors:
+        raise ValueError(f"Collection '{collection_name}' is empty.")
+
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+    index = _create_index(index_type, matrix.shape[1], len(matrix), hnsw_m=hnsw_m, nlist=nlist)
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+
+    out_dir = faiss_dir(collection_name)
+    tmp_dir = faiss_root / f"{collection_name}.{uuid.uuid4().hex}.tmp"
+    tmp_dir.mkdir(parents=True)
+    try:
+        faiss.write_index(index, str(tmp_dir / "index.faiss"))
+        np.save(tmp_dir / "ids.npy", np.asarray(ids, dtype="U36"))
+        offsets = np.zeros(len(payload_blobs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(blob) for blob in payload_blobs])
+        np.save(tmp_dir / "payload_offsets.npy", offsets)
+        with open(tmp_dir / "payloads.bin", "wb") as f:
+            for blob in payload_blobs:
+                f.write(blob)
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump({
+                "index_type": index_type,
+                "dim": int(matrix.shape[1]),
+                "count": len(matrix),
+                # The ingest the vectors were exported from, see has_faiss_index.
+                "ingest_id": ingest_id(collection_name),
+            }, f)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    with _INDEXES_LOCK:
+        # Pipelines still holding the old index keep their mapping until they are rebuilt.
+        _INDEXES.pop(collection_name, None)
+        old_dir = None
+        if out_dir.exists():
+            old_dir = faiss_root / f"{collection_name}.{uuid.uuid4().hex}.old"
+            out_dir.rename(old_dir)
+        tmp_dir.rename(out_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    if get_manifest(collection_name) is not None:
+        update_manifest(collection_name, faiss_index=index_type)
+    return len(matrix)
+
+
+class FaissIndex:
+    """
+    Read-only FAISS index of one collection, memory-mapped from disk.
+
+    Args:
+        collection_name: Collection whose index to open (see build_faiss_index).
+        ef_search: HNSW search breadth.
+        nprobe: IVF lists visited per query.
+    """
+
+    def __init__(self, collection_name: str, ef_search: int = 64, nprobe: int = 8):
+        import faiss
+
+        self.collection_name = collection_name
+        directory = faiss_dir(collection_name)
+        with open(directory / "meta.json", "r") as f:
+            self.meta = json.load(f)
+
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+        try:
+            self.index = faiss.read_index(str(directory / "index.faiss"), flags)
+        except RuntimeError:
+            # Older faiss builds can only mmap some index types.
+            self.index = faiss.read_index(str(directory / "index.faiss"))
+
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = ef_search
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = nprobe
+        self._needs_direct_map = self.meta["index_type"] == "ivf"
+
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+        self.offsets = np.load(directory / "payload_offsets.npy", mmap_mode="r")
+        self._payload_file = open(directory / "payloads.bin", "rb")
+        self._payloads = mmap.mmap(self._payload_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def payload(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._payloads[start:end])
+
+    def vector(self, row: int) -> np.ndarray:
+        """Stored (normalized) vector of a row."""
+        if self._needs_direct_map:
+            # IVF lists have no row -> vector lookup until it's built once.
+            import faiss
+            faiss.extract_index_ivf(self.index).make_direct_map()
+            self._needs_direct_map = False
+        return self.index.reconstruct(row)
+
+    def search(self, query_vector, k: int, with_vectors: bool = False) -> list[tuple[Document, float]]:
+        """
+        Top-k documents by cosine similarity, in the same shape as QdrantVectorStore results.
+        With `with_vectors` each document carries its vector in metadata['_vector'] (used by MMR).
+        """
+        query = _normalize(np.asarray([query_vector], dtype=np.float32))
+        scores, rows = self.index.search(query, k)
+        results = []
+        for score, row in zip(scores[0], rows[0]):
+            if row < 0:
+                continue
+            payload = self.payload(int(row))
+            metadata = dict(payload.get("metadata") or {})
+            metadata["_id"] = str(self.ids[row])
+            metadata["_collection_name"] = self.collection_name
+            if with_vectors:
+                metadata["_vector"] = self.vector(int(row))
+            results.append((Document(page_content=payload.get("page_content", ""), metadata=metadata), float(score)))
+        return results
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+def load_faiss_index(collection_name: str) -> FaissIndex:
+    """FaissIndex for a collection, opened once per process (and again once the index was rebuilt)."""
+    from src.util.manifest import ingest_id
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(collection_name)
+        if cached is not None and cached.meta.get("ingest_id", "") != ingest_id(collection_name):
+            del _INDEXES[collection_name]
+        if collection_name not in _INDEXES:
+            _INDEXES[collection_name] = FaissIndex(collection_name)
+        return _INDEXES[collection_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a FAISS index from a Qdrant collection.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build")
+    build.add_argument("collection")
+    build.add_argument("--index", choices=INDEX_TYPES, default="hnsw")
+    build.add_argument("--hnsw-m", type=int, default=32)
+    build.add_argument("--nlist", type=int)
+    args = parser.parse_args()
+
+    count = build_faiss_index(args.collection, args.index, hnsw_m=args.hnsw_m, nlist=args.nlist)
+    print(f"Indexed {count} vectors of '{args.collection}' into {faiss_dir(args.collection)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    """
+    Minimal stand-in for the Ollama HTTP API, serving GET /api/tags from a fixed model list.
+
+    Meant for tests and offline development:
+
+        with FakeOllamaServer(["qwen3:1.7b"]) as fake:
+            set_registry(OllamaRegistry(base_url=fake.url, use_cli_fallback=False))
+
+    Args:
+        models: Model names the fake server reports as pulled.
+    """
+
+    def __init__(self, models: list[str]):
+        self.models = list(models)
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if self.path != "/api/tags":
+                    self.send_error(404)
+                    return
+                body = json.dumps({"models": [{"name": name, "model": name} for name in fake.models]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,87 @@
+"""
+Measure how long it takes to import the app's modules from a cold interpreter.
+
+Each module is imported in a fresh subprocess with `python -X importtime`, so results
+aren't skewed by modules another import already loaded. Run from the project root:
+
+    python -m src.util.import_report
+    python -m src.util.import_report --json data/logs/import_times.json src.retrieval.simple_rag
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+
+DEFAULT_MODULES = [
+    "src.util.env_check",
+    "src.util.vectorstore",
+    "src.util.stemming",
+    "src.retrieval.simple_rag",
+    "src.retrieval.rag_agent",
+    "src.ingest.simple_ingest",
+    "src.ingest.advanced_ingest",
+]
+
+
+def measure_import(module: str, top: int = 5) -> dict:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns total wall time, the cumulative import time reported by -X importtime
+    and the `top` slowest imports it pulled in (by self time).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    cumulative_ms = next((cum / 1000 for name, _, cum in rows if name == module), None)
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(cumulative_ms, 1) if cumulative_ms is not None else None,
+        "slowest": [{"module": name, "self_ms": round(self_us / 1000, 1)} for name, self_us, _ in slowest],
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr.strip() else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import-time report for the RAG tutor modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--json", type=Path, help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    report = [measure_import(module) for module in args.modules]
+
+    for row in report:
+        if not row["ok"]:
+            print(f"{row['module']:<32} failed: {row['error']}")
+            continue
+        slowest = ", ".join(f"{s['module']} {s['self_ms']}ms" for s in row["slowest"][:3])
+        print(f"{row['module']:<32} {row['import_ms']:>8.1f} ms  (wall {row['wall_ms']:.0f} ms; slowest: {slowest})")
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 import os
 from typing import Literal
 from .ollama import require_ollama
@@ -17,12 +15,14 @@ def get_llm(mode : Literal["local","cloud"],model_name : str = "qwen3-embedding:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("Set OPENAI_API_KEY in .env to use the openai api")
+        from langchain_openai import ChatOpenAI
         try:
             llm = ChatOpenAI(model=model_name,api_key=api_key)
         except FileNotFoundError:
             raise RuntimeError("Failed calling OpenAI, check your api key and model name")
 
     elif mode=="local":
+        from langchain_ollama import ChatOllama
         require_ollama(model_name)
         llm = ChatOllama(model=model_name)
  
@@ -31,5 +31,41 @@ def get_llm(mode : Literal["local","cloud"],model_name : str = "qwen3-embedding:
     
     return llm
 
+# Context windows of the OpenAI models this app is likely used with (tokens).
+OPENAI_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16_385,
+    "gpt-4": 8_192,
+    "gpt-4-turbo": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4.1-mini": 1_047_576,
+    "gpt-5": 400_000,
+    "gpt-5-mini": 400_000,
+}
 
+# Ollama runs models with this context length unless num_ctx / OLLAMA_CONTEXT_LENGTH say otherwise,
+# and silently drops the start of longer prompts.
+OLLAMA_DEFAULT_CONTEXT = 4096
 
+def get_context_window(llm) -> int:
+    """
+    Context window (in tokens) the llm is actually run with.
+    LLM_CONTEXT_WINDOW in .env overrides the detected value.
+    """
+    override = os.getenv("LLM_CONTEXT_WINDOW")
+    if override:
+        return int(override)
+
+    num_ctx = getattr(llm, "num_ctx", None)
+    if num_ctx:
+        return int(num_ctx)
+    if type(llm).__name__ == "ChatOllama":
+        return int(os.getenv("OLLAMA_CONTEXT_LENGTH", OLLAMA_DEFAULT_CONTEXT))
+
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    # Longest known prefix, so dated snapshots (gpt-4o-2024-08-06) match their family.
+    for name in sorted(OPENAI_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model_name.startswith(name):
+            return OPENAI_CONTEXT_WINDOWS[name]
+    return 128_000
@@ -0,0 +1,137 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+manifest_dir = project_root / "data" / "vector_db" / "manifests"
+
+_MANIFEST_CACHE = {}
+_PREPROCESSED_CACHE = {}
+
+
+def _manifest_path(collection_name: str) -> Path:
+    return manifest_dir / f"{collection_name}.json"
+
+
+def embedding_model_name(embedding_model) -> str:
+    """Name used to identify an embedding model in manifests (e.g. 'qwen3-embedding:0.6b')."""
+    return getattr(embedding_model, "model", None) or type(embedding_model).__name__
+
+
+def write_manifest(
+    collection_name: str,
+    embedding_model: str,
+    embedding_dim: int,
+    stem_and_stop: bool,
+    chunk_size: int,
+    chunk_overlap: int,
+    ingest_strategy: str,
+    **extra,
+) -> dict:
+    """
+    Persist the settings a collection was ingested with, so retrieval never has to probe for them.
+
+    Args:
+        collection_name: Qdrant collection name.
+        embedding_model: Name of the dense embedding model used for the chunks.
+        embedding_dim: Size of the dense vectors.
+        stem_and_stop: Whether chunks were stemmed and had stop words removed.
+        chunk_size: Splitter chunk size in characters.
+        chunk_overlap: Splitter chunk overlap in characters.
+        ingest_strategy: 'simple' or 'chapter'.
+        **extra: Any additional fields to record (source file, etc.).
+    """
+    # The ingest id only changes once the ingest completed (stamp_ingest_id), so nothing derived
+    # from the half-filled collection while it runs is taken for the new content.
+    previous = get_manifest(collection_name) or {}
+    manifest = {
+        "collection_name": collection_name,
+        "embedding_model": embedding_model,
+        "embedding_dim": embedding_dim,
+        "stem_and_stop": stem_and_stop,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "ingest_strategy": ingest_strategy,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **extra,
+    }
+    if previous.get("ingest_id"):
+        manifest["ingest_id"] = previous["ingest_id"]
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    with open(_manifest_path(collection_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _MANIFEST_CACHE[collection_name] = manifest
+    return manifest
+
+
+def update_manifest(collection_name: str, **fields) -> dict:
+    """Add or change fields of an existing manifest (e.g. indexes built after ingestion)."""
+    manifest = dict(get_manifest(collection_name) or {"collection_name": collection_name})
+    manifest.update(fields)
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    with open(_manifest_path(collection_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _MANIFEST_CACHE[collection_name] = manifest
+    return manifest
+
+
+def stamp_ingest_id(collection_name: str) -> str:
+    """
+    Give the collection a new ingest id, once an ingest completed. Caches derived from the
+    collection's content (e.g. the answer cache) compare it to tell they are stale.
+    """
+    new_id = uuid.uuid4().hex
+    update_manifest(collection_name, ingest_id=new_id)
+    return new_id
+
+
+def get_manifest(collection_name: str) -> dict | None:
+    """Return the manifest of a collection (read from disk once per process), or None if it has none."""
+    if collection_name in _MANIFEST_CACHE:
+        return _MANIFEST_CACHE[collection_name]
+
+    path = _manifest_path(collection_name)
+    manifest = None
+    if path.exists():
+        with open(path, "r") as f:
+            manifest = json.load(f)
+
+    _MANIFEST_CACHE[collection_name] = manifest
+    return manifest
+
+
+def ingest_id(collection_name: str) -> str:
+    """Identifier of the collection's current ingest (the creation time for manifests that predate the id)."""
+    manifest = get_manifest(collection_name) or {}
+    return manifest.get("ingest_id") or manifest.get("created_at") or ""
+
+
+def invalidate_manifest(collection_name: str | None = None):
+    """Drop cached manifests so the next read goes to disk. Clears everything if no name is given."""
+    if collection_name is None:
+        _MANIFEST_CACHE.clear()
+        _PREPROCESSED_CACHE.clear()
+    else:
+        _MANIFEST_CACHE.pop(collection_name, None)
+        _PREPROCESSED_CACHE.pop(collection_name, None)
+
+
+def is_preprocessed(collection_name: str, client) -> bool:
+    """
+    Whether the chunks of a collection were stemmed at ingest time (so queries must be stemmed too).
+
+    Reads the manifest; collections ingested before manifests existed are checked once by
+    reading a single stored payload (no embedding, no search) and the answer is cached.
+    """
+    manifest = get_manifest(collection_name)
+    if manifest is not None:
+        return bool(manifest.get("stem_and_stop", False))
+
+    if collection_name not in _PREPROCESSED_CACHE:
+        points, _ = client.scroll(collection_name=collection_name, limit=1, with_payload=True, with_vectors=False)
+        metadata = (points[0].payload or {}).get("metadata", {}) if points else {}
+        _PREPROCESSED_CACHE[collection_name] = bool(metadata.get("preprocessed", False))
+    return _PREPROCESSED_CACHE[collection_name]
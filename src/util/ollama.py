@@ -1,28 +1,122 @@
+import json
+import os
 import shutil
 import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def _normalize(model_name: str) -> str:
+    """Ollama treats 'llama3' and 'llama3:latest' as the same model."""
+    return model_name if ":" in model_name else f"{model_name}:latest"
+
+
+def _default_base_url() -> str:
+    host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    if not host.startswith(("http://", "https://")):
+        host = f"http://{host}"
+    return host.rstrip("/")
 
-def require_ollama(model_name):
-    if shutil.which("ollama") is None:
-        raise RuntimeError("Ollama CLI not found. Install it first.")
-
-    try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
 
-        lines = result.stdout.strip().split("\n")[1:] 
-        models = [line.split()[0] for line in lines if line.strip()] 
+class OllamaRegistry:
+    """
+    Knows which models the local Ollama server has pulled.
 
-        if model_name not in models:
-            raise RuntimeError(
-                f"Ollama installed but model '{model_name}' not pulled.\n"
-                f"Run: ollama pull {model_name}"
+    The list is fetched from the Ollama HTTP API (GET /api/tags) and cached for `ttl`
+    seconds, so building several models only checks once. If the HTTP endpoint can't be
+    reached it falls back to parsing `ollama list`.
+
+    Args:
+        base_url: Ollama server url. Defaults to OLLAMA_HOST or http://localhost:11434.
+        ttl: Seconds a fetched model list stays valid.
+        timeout: HTTP timeout in seconds.
+        use_cli_fallback: Try the `ollama list` CLI when the HTTP endpoint fails.
+    """
+
+    def __init__(self, base_url: str | None = None, ttl: float = 300.0, timeout: float = 2.0, use_cli_fallback: bool = True):
+        self.base_url = (base_url or _default_base_url()).rstrip("/")
+        self.ttl = ttl
+        self.timeout = timeout
+        self.use_cli_fallback = use_cli_fallback
+        self._models = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch_http(self) -> set[str]:
+        with urllib.request.urlopen(f"{self.base_url}/api/tags", timeout=self.timeout) as response:
+            data = json.load(response)
+        return {_normalize(model["name"]) for model in data.get("models", [])}
+
+    def _fetch_cli(self) -> set[str]:
+        if shutil.which("ollama") is None:
+            raise RuntimeError("Ollama CLI not found. Install it first.")
+
+        try:
+            result = subprocess.run(
+                ["ollama", "list"],
+                capture_output=True,
+                text=True,
+                check=True
             )
-    except FileNotFoundError:
-        raise RuntimeError("Ollama is not installed")
-    except subprocess.CalledProcessError:
-        raise RuntimeError("Failed to query Ollama models")
+        except FileNotFoundError:
+            raise RuntimeError("Ollama is not installed")
+        except subprocess.CalledProcessError:
+            raise RuntimeError("Failed to query Ollama models")
+
+        lines = result.stdout.strip().split("\n")[1:]
+        return {_normalize(line.split()[0]) for line in lines if line.strip()}
 
+    def _fetch(self) -> set[str]:
+        try:
+            return self._fetch_http()
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            if not self.use_cli_fallback:
+                raise RuntimeError(f"Could not reach Ollama at {self.base_url}: {e}")
+            return self._fetch_cli()
+
+    def list_models(self, refresh: bool = False) -> set[str]:
+        """Names of the pulled models (with their tag), from cache unless it expired or refresh=True."""
+        with self._lock:
+            expired = time.monotonic() - self._fetched_at > self.ttl
+            if self._models is None or expired or refresh:
+                self._models = self._fetch()
+                self._fetched_at = time.monotonic()
+            return self._models
+
+    def is_available(self, model_name: str) -> bool:
+        return _normalize(model_name) in self.list_models()
+
+    def require(self, model_name: str):
+        """Raise a RuntimeError with instructions if the model isn't pulled."""
+        if self.is_available(model_name):
+            return
+        # The model may have been pulled since the list was cached.
+        if _normalize(model_name) in self.list_models(refresh=True):
+            return
+        raise RuntimeError(
+            f"Ollama installed but model '{model_name}' not pulled.\n"
+            f"Run: ollama pull {model_name}"
+        )
+
+    def invalidate(self):
+        with self._lock:
+            self._models = None
+
+
+_REGISTRY = None
+
+def get_registry() -> OllamaRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = OllamaRegistry(ttl=float(os.getenv("OLLAMA_MODELS_TTL", "300")))
+    return _REGISTRY
+
+def set_registry(registry: OllamaRegistry | None):
+    """Replace the process-wide registry, e.g. with one pointed at a FakeOllamaServer."""
+    global _REGISTRY
+    _REGISTRY = registry
+
+def require_ollama(model_name):
+    get_registry().require(model_name)
@@ -0,0 +1,156 @@
+"""
+On-disk store of the parent sections of a parent-child ingest.
+
+With parent-child ingestion the vectors are computed for small child chunks, and each child
+only carries the id of the larger parent section it was cut from. The parent texts live
+here, outside Qdrant: one UTF-8 blob file plus sorted id and byte-span arrays, all
+memory-mapped, so looking up the parents of a search's hits is a binary search and a slice.
+"""
+import mmap
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+project_root = Path(__file__).resolve().parents[2]
+parents_root = project_root / "data" / "vector_db" / "parents"
+
+# Child-only metadata that doesn't describe the parent.
+_CHILD_FIELDS = ("start_index", "raw_text", "preprocessed", "_vector", "relevance_score")
+
+
+def parent_store_dir(collection_name: str) -> Path:
+    return parents_root / collection_name
+
+
+def has_parent_store(collection_name: str) -> bool:
+    return (parent_store_dir(collection_name) / "ids.npy").exists()
+
+
+class ParentStoreWriter:
+    """
+    Collects the parent sections of an ingest and writes the store when `commit` is called.
+
+    Parents are appended to a temporary directory as the chunk stream is consumed, and the
+    collection's previous store is only replaced once the whole stream went through.
+
+    Args:
+        collection_name: Collection the parents belong to.
+    """
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self._tmp_dir = parents_root / f"{collection_name}.tmp"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        self._tmp_dir.mkdir(parents=True)
+        self._texts = open(self._tmp_dir / "texts.bin", "wb")
+        self._ids, self._spans, self._starts = [], [], []
+        self._seen = set()
+        self._size = 0
+
+    def add(self, parent_id: str, text: str, start_index: int):
+        if parent_id in self._seen:
+            return
+        self._seen.add(parent_id)
+        blob = text.encode("utf-8")
+        self._texts.write(blob)
+        self._ids.append(parent_id)
+        self._spans.append((self._size, self._size + len(blob)))
+        self._starts.append(start_index)
+        self._size += len(blob)
+
+    def commit(self) -> int:
+        """Write the id and span arrays and swap the store in. Returns the number of parents."""
+        self._texts.close()
+        order = np.argsort(np.asarray(self._ids, dtype="U36"), kind="stable")
+        np.save(self._tmp_dir / "ids.npy", np.asarray(self._ids, dtype="U36")[order])
+        np.save(self._tmp_dir / "spans.npy", np.asarray(self._spans, dtype=np.int64).reshape(-1, 2)[order])
+        np.save(self._tmp_dir / "starts.npy", np.asarray(self._starts, dtype=np.int64)[order])
+
+        with _STORES_LOCK:
+            # Pipelines still holding the old store keep their mapping until they are rebuilt.
+            _STORES.pop(self.collection_name, None)
+            target = parent_store_dir(self.collection_name)
+            shutil.rmtree(target, ignore_errors=True)
+            self._tmp_dir.rename(target)
+        return len(self._ids)
+
+    def abort(self):
+        self._texts.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+def remove_parent_store(collection_name: str):
+    """Delete the collection's parent store, e.g. when the collection is deleted."""
+    with _STORES_LOCK:
+        _STORES.pop(collection_name, None)
+        shutil.rmtree(parent_store_dir(collection_name), ignore_errors=True)
+
+
+class ParentStore:
+    """
+    Read-only parent sections of one collection, memory-mapped from disk.
+
+    Args:
+        collection_name: Collection whose parents to open (see ParentStoreWriter).
+    """
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        directory = parent_store_dir(collection_name)
+        self.ids = np.load(directory / "ids.npy", mmap_mode="r")
+        self.spans = np.load(directory / "spans.npy", mmap_mode="r")
+        self.starts = np.load(directory / "starts.npy", mmap_mode="r")
+        self._file = open(directory / "texts.bin", "rb")
+        self._texts = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.ids) else b""
+
+    def get(self, parent_id: str) -> tuple[str, int] | None:
+        """(text, start_index) of a parent, or None if it isn't in the store."""
+        row = int(np.searchsorted(self.ids, parent_id))
+        if row >= len(self.ids) or self.ids[row] != parent_id:
+            return None
+        start, end = self.spans[row]
+        return self._texts[start:end].decode("utf-8"), int(self.starts[row])
+
+    def expand(self, results: list[tuple[Document, float]]) -> list[tuple[Document, float]]:
+        """
+        Replace child hits by their parent sections, keeping the rank of each parent's best child.
+        Hits without a (known) parent are kept as they are.
+        """
+        expanded = []
+        positions = {}
+        for doc, score in results:
+            parent_id = doc.metadata.get("parent_id")
+            parent = self.get(parent_id) if parent_id else None
+            if parent is None:
+                expanded.append((doc, score))
+                continue
+            if parent_id in positions:
+                expanded[positions[parent_id]][0].metadata["child_hits"] += 1
+                continue
+
+            text, start_index = parent
+            metadata = {key: value for key, value in doc.metadata.items() if key not in _CHILD_FIELDS}
+            metadata.update(start_index=start_index, child_hits=1)
+            positions[parent_id] = len(expanded)
+            expanded.append((Document(page_content=text, metadata=metadata), score))
+        return expanded
+
+    def close(self):
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._file.close()
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def load_parent_store(collection_name: str) -> ParentStore | None:
+    """ParentStore of a collection (opened once per process), or None if it wasn't ingested parent-child."""
+    with _STORES_LOCK:
+        if collection_name not in _STORES:
+            _STORES[collection_name] = ParentStore(collection_name) if has_parent_store(collection_name) else None
+        return _STORES[collection_name]
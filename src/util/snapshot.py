@@ -0,0 +1,348 @@
+"""
+Snapshots of ingested collections, for moving them between machines without re-embedding.
+
+A snapshot is a directory with the collection's dense vectors as one contiguous float32
+matrix (vectors.npy, memory-mappable), the sparse vectors as CSR arrays, the point ids,
+the collection config and the manifest. Payloads are stored by column: one column per
+top-level payload field (page_content) and one per metadata field (metadata.page,
+metadata.chapter_number, ...), each a blob of JSON values plus an offsets array, like the
+FAISS payload store. A row without the field has an empty cell. Parent sections of parent-child
+collections are copied along. Importing streams the rows from the memory-mapped arrays
+into a new collection in batches, then rebuilds the BM25 and chapter indexes.
+
+    python -m src.util.snapshot export <collection> [--out data/snapshots/<collection>]
+    python -m src.util.snapshot import <snapshot dir> [--collection <name>] [--overwrite]
+"""
+import argparse
+import json
+import logging
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from qdrant_client.http import models
+
+log = logging.getLogger(__name__)
+
+project_root = Path(__file__).resolve().parents[2]
+snapshots_root = project_root / "data" / "snapshots"
+
+SNAPSHOT_FORMAT = 1
+DENSE_VECTOR_NAME = ""
+SPARSE_VECTOR_NAME = "sparse"
+METADATA_KEY = "metadata"
+
+# Cell of a row that doesn't have the column's field.
+_MISSING = object()
+
+
+def snapshot_dir(collection_name: str) -> Path:
+    return snapshots_root / collection_name
+
+
+def _write_column(out_dir: Path, name: str, blobs: list[bytes]):
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+    np.save(out_dir / f"{name}_offsets.npy", offsets)
+    with open(out_dir / f"{name}.bin", "wb") as f:
+        for blob in blobs:
+            f.write(blob)
+
+
+def _is_snapshot(directory: Path) -> bool:
+    try:
+        with open(directory / "config.json", "r") as f:
+            return "format" in json.load(f)
+    except (OSError, ValueError):
+        return False
+
+
+def export_snapshot(collection_name: str, out_dir: Path | None = None, client=None, batch_size: int = 512) -> Path:
+    """
+    Write a collection's vectors, payloads, config and manifest to a snapshot directory.
+
+    The snapshot is written to a temporary directory next to `out_dir` and moved into place
+    once complete. An existing `out_dir` is only replaced if it is a snapshot itself.
+
+    Args:
+        collection_name: Collection to export.
+        out_dir: Snapshot directory, defaults to data/snapshots/<collection>.
+        client: Qdrant client, defaults to the shared on-disk one.
+        batch_size: Points fetched per scroll call.
+
+    Returns the snapshot directory.
+    """
+    out_dir = Path(out_dir or snapshot_dir(collection_name))
+    if out_dir.exists() and not _is_snapshot(out_dir):
+        raise ValueError(f"'{out_dir}' exists and isn't a snapshot, refusing to overwrite it.")
+
+    tmp_dir = out_dir.with_name(f".{out_dir.name}.{uuid.uuid4().hex}.tmp")
+    tmp_dir.mkdir(parents=True)
+    try:
+        _write_snapshot(collection_name, tmp_dir, client, batch_size)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if out_dir.exists():
+        old_dir = out_dir.with_name(f".{out_dir.name}.{uuid.uuid4().hex}.old")
+        out_dir.rename(old_dir)
+        tmp_dir.rename(out_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        tmp_dir.rename(out_dir)
+    return out_dir
+
+
+def _write_snapshot(collection_name: str, out_dir: Path, client, batch_size: int):
+    from src.util.faiss_store import _dense_vector
+    from src.util.manifest import get_manifest
+    from src.util.parent_store import has_parent_store, parent_store_dir
+    from src.util.vectorstore import _get_client, store_lock
+
+    client = client or _get_client()
+
+    with store_lock.read():
+        info = client.get_collection(collection_name)
+        count = client.count(collection_name, exact=True).count
+    if not count:
+        raise ValueError(f"Collection '{collection_name}' is empty.")
+    params = info.config.params
+    dense = params.vectors.get(DENSE_VECTOR_NAME) if isinstance(params.vectors, dict) else params.vectors
+
+    # Rows are written straight into the memory-mapped file instead of being collected first.
+    vectors = np.lib.format.open_memmap(out_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(count, dense.size))
+    ids, has_metadata, columns = [], [], {}
+    sparse_indices, sparse_values, sparse_lengths = [], [], []
+    offset = None
+    while True:
+        with store_lock.read():
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+        for point in points:
+            if len(ids) == count:
+                raise RuntimeError(f"Collection '{collection_name}' changed during the export.")
+            vectors[len(ids)] = _dense_vector(point, DENSE_VECTOR_NAME)
+            ids.append(str(point.id))
+
+            sparse = point.vector.get(SPARSE_VECTOR_NAME) if isinstance(point.vector, dict) else None
+            sparse_lengths.append(len(sparse.indices) if sparse else 0)
+            if sparse:
+                sparse_indices.append(np.asarray(sparse.indices, dtype=np.uint32))
+                sparse_values.append(np.asarray(sparse.values, dtype=np.float32))
+
+            cells = _payload_cells(point.payload or {})
+            has_metadata.append(isinstance((point.payload or {}).get(METADATA_KEY), dict))
+            for name in cells.keys() - columns.keys():
+                columns[name] = [b""] * (len(ids) - 1)
+            for name, blobs in columns.items():
+                blobs.append(json.dumps(cells[name]).encode("utf-8") if name in cells else b"")
+        if offset is None:
+            break
+
+    if len(ids) != count:
+        raise RuntimeError(f"Collection '{collection_name}' changed during the export.")
+    vectors.flush()
+    del vectors
+
+    np.save(out_dir / "ids.npy", np.asarray(ids, dtype="U36"))
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(sparse_lengths)
+    np.save(out_dir / "sparse_indptr.npy", indptr)
+    np.save(out_dir / "sparse_indices.npy", np.concatenate(sparse_indices) if sparse_indices else np.zeros(0, np.uint32))
+    np.save(out_dir / "sparse_values.npy", np.concatenate(sparse_values) if sparse_values else np.zeros(0, np.float32))
+    np.save(out_dir / "has_metadata.npy", np.asarray(has_metadata, dtype=bool))
+    for index, blobs in enumerate(columns.values()):
+        _write_column(out_dir, f"column_{index}", blobs)
+
+    manifest = get_manifest(collection_name)
+    config = {
+        "format": SNAPSHOT_FORMAT,
+        "collection_name": collection_name,
+        "count": count,
+        "dim": dense.size,
+        "distance": dense.distance.value if hasattr(dense.distance, "value") else str(dense.distance),
+        "sparse": bool(params.sparse_vectors),
+        "quantization": manifest.get("quantization") if manifest else None,
+        "payload_columns": list(columns),
+        "parents": has_parent_store(collection_name),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(out_dir / "config.json", "w") as f:
+        json.dump(config, f, indent=2)
+    if manifest is not None:
+        with open(out_dir / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+    if config["parents"]:
+        shutil.copytree(parent_store_dir(collection_name), out_dir / "parents")
+
+
+def _payload_cells(payload: dict) -> dict:
+    """Column name -> value of one payload: top-level fields, and 'metadata.<field>' for each metadata field."""
+    cells = {key: value for key, value in payload.items() if key != METADATA_KEY}
+    metadata = payload.get(METADATA_KEY)
+    if isinstance(metadata, dict):
+        cells.update({f"{METADATA_KEY}.{key}": value for key, value in metadata.items()})
+    elif metadata is not None:
+        cells[METADATA_KEY] = metadata
+    return cells
+
+
+class _Column:
+    """Read-only payload column of a snapshot, memory-mapped. Rows without the field are _MISSING."""
+
+    def __init__(self, directory: Path, index: int):
+        self.offsets = np.load(directory / f"column_{index}_offsets.npy", mmap_mode="r")
+        self._blob = np.memmap(directory / f"column_{index}.bin", dtype=np.uint8, mode="r") if self.offsets[-1] else None
+
+    def __getitem__(self, row: int):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._blob[start:end].tobytes()) if end > start else _MISSING
+
+
+def _points(config: dict, start: int, end: int, vectors, indptr, indices, values, ids, has_metadata, columns) -> list[models.PointStruct]:
+    prefix = f"{METADATA_KEY}."
+    points = []
+    for row in range(start, end):
+        vector = {DENSE_VECTOR_NAME: vectors[row].tolist()}
+        sparse_start, sparse_end = int(indptr[row]), int(indptr[row + 1])
+        if config["sparse"] and sparse_end > sparse_start:
+            vector[SPARSE_VECTOR_NAME] = models.SparseVector(
+                indices=indices[sparse_start:sparse_end].tolist(), values=values[sparse_start:sparse_end].tolist()
+            )
+        payload, metadata = {}, {} if has_metadata[row] else None
+        for name, column in columns.items():
+            value = column[row]
+            if value is _MISSING:
+                continue
+            if metadata is not None and name.startswith(prefix):
+                metadata[name[len(prefix):]] = value
+            else:
+                payload[name] = value
+        if metadata is not None:
+            payload[METADATA_KEY] = metadata
+        points.append(models.PointStruct(id=str(ids[row]), vector=vector, payload=payload))
+    return points
+
+
+def import_snapshot(directory: Path, collection_name: str | None = None, client=None, batch_size: int = 256, overwrite: bool = False) -> int:
+    """
+    Create a collection from a snapshot directory (see export_snapshot).
+
+    Args:
+        directory: Snapshot to import.
+        collection_name: Name of the new collection, defaults to the exported collection's name.
+        client: Qdrant client, defaults to the shared on-disk one.
+        batch_size: Points uploaded per upsert.
+        overwrite: Replace an existing collection of that name.
+
+    Returns the number of points imported.
+    """
+    from src.retrieval.chapters import build_chapter_index, remove_chapter_index
+    from src.util.bm25_store import build_bm25_index, remove_bm25_index
+    from src.util.manifest import _manifest_path, invalidate_manifest, update_manifest
+    from src.util.parent_store import _STORES, _STORES_LOCK, parent_store_dir
+    from src.util.vectorstore import _get_client, _quantization_config, store_lock
+
+    directory = Path(directory)
+    with open(directory / "config.json", "r") as f:
+        config = json.load(f)
+    if config.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {config.get('format')}")
+    collection_name = collection_name or config["collection_name"]
+    client = client or _get_client()
+
+    with store_lock.write():
+        if client.collection_exists(collection_name):
+            if not overwrite:
+                raise ValueError(f"Collection '{collection_name}' already exists (use overwrite to replace it).")
+            client.delete_collection(collection_name)
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(
+                size=config["dim"], distance=models.Distance(config["distance"]),
+                on_disk=True if config["quantization"] else None,
+            ),
+            quantization_config=_quantization_config(config["quantization"]),
+            sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams(index=models.SparseIndexParams(on_disk=True))},
+        )
+
+    # Whatever a replaced collection had built on its chunks doesn't describe the imported ones.
+    with _STORES_LOCK:
+        _STORES.pop(collection_name, None)
+        shutil.rmtree(parent_store_dir(collection_name), ignore_errors=True)
+    remove_chapter_index(collection_name)
+    remove_bm25_index(collection_name)
+
+    vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+    ids = np.load(directory / "ids.npy", mmap_mode="r")
+    indptr = np.load(directory / "sparse_indptr.npy", mmap_mode="r")
+    indices = np.load(directory / "sparse_indices.npy", mmap_mode="r")
+    values = np.load(directory / "sparse_values.npy", mmap_mode="r")
+    has_metadata = np.load(directory / "has_metadata.npy", mmap_mode="r")
+    columns = {name: _Column(directory, index) for index, name in enumerate(config["payload_columns"])}
+
+    started = time.perf_counter()
+    for start in range(0, config["count"], batch_size):
+        points = _points(config, start, min(start + batch_size, config["count"]), vectors, indptr, indices, values, ids, has_metadata, columns)
+        with store_lock.write():
+            client.upsert(collection_name=collection_name, points=points)
+    elapsed = time.perf_counter() - started
+    print(f"Imported {config['count']} points into '{collection_name}' in {elapsed:.1f}s ({config['count'] / max(elapsed, 1e-9):.1f} points/s)")
+
+    manifest = {}
+    if (directory / "manifest.json").exists():
+        with open(directory / "manifest.json", "r") as f:
+            manifest = json.load(f)
+    # Side indexes aren't part of the snapshot: BM25 and chapters are rebuilt below, FAISS on demand.
+    for field in ("collection_name", "faiss_index", "bm25_index", "chapter_index"):
+        manifest.pop(field, None)
+    _manifest_path(collection_name).unlink(missing_ok=True)
+    invalidate_manifest(collection_name)
+    update_manifest(collection_name, **{**manifest, "ingest_id": uuid.uuid4().hex, "imported_from": str(directory)})
+
+    if config.get("parents"):
+        with _STORES_LOCK:
+            _STORES.pop(collection_name, None)
+            shutil.copytree(directory / "parents", parent_store_dir(collection_name))
+
+    try:
+        build_bm25_index(collection_name, client=client)
+    except Exception:
+        # Optional index, the collection is usable without it (the previous one was removed above).
+        log.exception("BM25 index of '%s' not built", collection_name)
+    if manifest.get("ingest_strategy") == "chapter":
+        build_chapter_index(collection_name, client=client)
+
+    # Chat sessions of this process rebuild their search pipelines for the collection.
+    from src.retrieval.pipelines import invalidate_pipelines
+    invalidate_pipelines(collection_name)
+    return config["count"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export collections to snapshots and import them without re-embedding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Write a collection to a snapshot directory.")
+    export.add_argument("collection")
+    export.add_argument("--out", type=Path, help="Snapshot directory (default: data/snapshots/<collection>).")
+    load = subparsers.add_parser("import", help="Create a collection from a snapshot directory.")
+    load.add_argument("snapshot", type=Path)
+    load.add_argument("--collection", help="Name of the new collection (default: the exported name).")
+    load.add_argument("--overwrite", action="store_true", help="Replace an existing collection of that name.")
+    load.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        out_dir = export_snapshot(args.collection, args.out)
+        print(f"Exported '{args.collection}' to {out_dir}")
+    else:
+        import_snapshot(args.snapshot, args.collection, batch_size=args.batch_size, overwrite=args.overwrite)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,90 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem import SnowballStemmer
-import re
 
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('punkt_tab')
+_NLTK_RESOURCES = [
+    ("corpora/stopwords", "stopwords"),
+    ("tokenizers/punkt", "punkt"),
+    ("tokenizers/punkt_tab", "punkt_tab"),
+]
+
+
+def ensure_nltk_data():
+    """Download the NLTK data the preprocessor needs, only if it isn't installed yet."""
+    for resource_path, package in _NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            nltk.download(package, quiet=True)
+
+
+class TextPreprocessor:
+    """
+    Lowercases, tokenizes, removes stop words and stems text.
+
+    Stop words and the stemmer are loaded once, and stems are memoized since a book's
+    vocabulary is small compared to its token count. Reuse one instance (see
+    get_preprocessor) rather than creating one per call.
+
+    Args:
+        cache_size: Number of distinct words whose stems are memoized.
+        workers: Processes used by preprocess_batch for large batches. 1 disables the pool.
+        min_parallel: Batches smaller than this are processed in-process.
+    """
+
+    def __init__(self, cache_size: int = 100_000, workers: int = 1, min_parallel: int = 64):
+        ensure_nltk_data()
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.stem = lru_cache(maxsize=cache_size)(SnowballStemmer('english').stem)
+        self.workers = workers
+        self.min_parallel = min_parallel
+        self._pool = None
+
+    def preprocess(self, text: str) -> str:
+        words = nltk.word_tokenize(text.lower())
+        stop_words = self.stop_words
+        stem = self.stem
+        return " ".join(stem(w) for w in words if w not in stop_words and w.isalnum())
+
+    __call__ = preprocess
+
+    def preprocess_batch(self, texts: list[str]) -> list[str]:
+        """Preprocess many texts, fanning out over a process pool when the batch is large enough."""
+        if self.workers <= 1 or len(texts) < self.min_parallel:
+            return [self.preprocess(text) for text in texts]
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        chunksize = max(1, len(texts) // (self.workers * 4))
+        return list(self._pool.map(preprocess_text, texts, chunksize=chunksize))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_PREPROCESSOR = None
+
+def get_preprocessor() -> TextPreprocessor:
+    """Process-wide preprocessor, created on first use."""
+    global _PREPROCESSOR
+    if _PREPROCESSOR is None:
+        _PREPROCESSOR = TextPreprocessor()
+    return _PREPROCESSOR
+
 
 def preprocess_text(text: str) -> str:
-    words = nltk.word_tokenize(text.lower())
-    
-    stop_words = set(stopwords.words('english'))
-    stemmer = SnowballStemmer('english')
-    
-    processed_words = [
-        stemmer.stem(w) for w in words 
-        if w not in stop_words and w.isalnum()
-    ]
-    
-    return " ".join(processed_words)
\ No newline at end of file
+    return get_preprocessor().preprocess(text)
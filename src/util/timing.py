@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+turn_log_path = project_root / "data" / "logs" / "turns.jsonl"
+
+_LOGGER = None
+_METRICS_HOOK = None
+
+log = logging.getLogger(__name__)
+
+
+def _get_logger() -> logging.Logger:
+    global _LOGGER
+    if _LOGGER is None:
+        turn_log_path.parent.mkdir(parents=True, exist_ok=True)
+        logger = logging.getLogger("rag_tutor.turns")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            handler = RotatingFileHandler(turn_log_path, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        _LOGGER = logger
+    return _LOGGER
+
+
+def set_metrics_hook(hook):
+    """Register a callable that receives every finished turn record (dict). Pass None to remove it."""
+    global _METRICS_HOOK
+    _METRICS_HOOK = hook
+
+
+class TurnTimer:
+    """
+    Collects per-stage latencies of one chat turn and emits them as a single record.
+
+    Stages are accumulated, so a stage that runs several times in a turn (e.g. a search
+    done by each agent tool call) is reported as its total. `finish` writes the record
+    to data/logs/turns.jsonl (rotated at 5 MB) and passes it to the metrics hook.
+
+    Args:
+        chain: Name of the chain handling the turn.
+        **context: Extra fields stored in the record (collection, search type, top_k, ...).
+    """
+
+    def __init__(self, chain: str, **context):
+        self._started = time.perf_counter()
+        self.record = {
+            "turn_id": uuid.uuid4().hex,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "chain": chain,
+            **context,
+            "stages_ms": {},
+            "tool_calls": 0,
+            "retrieved_chunk_chars": [],
+        }
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, ms: float):
+        stages = self.record["stages_ms"]
+        stages[name] = round(stages.get(name, 0.0) + ms, 3)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def mark_first_token(self):
+        """Record time-to-first-token (from the start of the turn). Only the first call counts."""
+        if "time_to_first_token" not in self.record["stages_ms"]:
+            self.add("time_to_first_token", self.elapsed_ms())
+
+    def add_chunks(self, contents: list[str]):
+        self.record["retrieved_chunk_chars"].extend(len(content) for content in contents)
+
+    def finish(self) -> dict:
+        self.record["total_ms"] = round(self.elapsed_ms(), 3)
+        try:
+            _get_logger().info(json.dumps(self.record, default=str))
+        except OSError:
+            pass
+        if _METRICS_HOOK is not None:
+            try:
+                _METRICS_HOOK(self.record)
+            except Exception:
+                # A broken hook must not fail the turn it reports on.
+                log.exception("Metrics hook failed for turn %s", self.record["turn_id"])
+        return self.record
@@ -1,13 +1,20 @@
-from langchain_qdrant import QdrantVectorStore, RetrievalMode, FastEmbedSparse
+from langchain_qdrant import QdrantVectorStore, RetrievalMode, SparseEmbeddings
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, SparseVectorParams, SparseIndexParams
-from langchain_ollama import OllamaEmbeddings
-from langchain_openai import OpenAIEmbeddings
+from qdrant_client.http import models
+import os
+from langchain_core.embeddings import Embeddings
 from pathlib import Path
 import atexit
+from src.util.manifest import get_manifest, embedding_model_name
+from src.util.rwlock import RWLock
 
 _QDRANT_CLIENT = None  
 
+# The embedded client is shared by every thread of the process (chat sessions, the API server,
+# background ingests) and isn't safe for concurrent use: searches take it for reading, writes exclusively.
+store_lock = RWLock()
+
 current_file_path = Path(__file__).resolve()
 project_root = current_file_path.parent.parent.parent
 db_path = project_root / "data" / "vector_db" / "qdrant"
@@ -36,6 +43,68 @@ def close_qdrant_client():
             pass
         _QDRANT_CLIENT = None
 
+_EMBEDDING_DIMS = {}
+
+def get_embedding_dim(embedding_model) -> int:
+    """Size of the vectors produced by a model. Probes the model once per process and model name."""
+    model_name = embedding_model_name(embedding_model)
+    if model_name not in _EMBEDDING_DIMS:
+        _EMBEDDING_DIMS[model_name] = len(embedding_model.embed_query("hello world"))
+    return _EMBEDDING_DIMS[model_name]
+
+def _check_dimension(client: QdrantClient, collection_name: str, embedding_model):
+    """Raise if the model can't be used with an existing collection. Avoids probing when the manifest matches."""
+    manifest = get_manifest(collection_name)
+    if manifest is not None and manifest.get("embedding_model") == embedding_model_name(embedding_model):
+        return
+
+    collection_info = client.get_collection(collection_name)
+    existing_size = collection_info.config.params.vectors.size
+    embedding_dim = get_embedding_dim(embedding_model)
+
+    if existing_size != embedding_dim:
+        raise ValueError(
+            f"Dimension Mismatch! Collection '{collection_name}' expects {existing_size} "
+            f"dimensions, but the current model provides {embedding_dim}. "
+        )
+
+QUANTIZATION_TYPES = ("scalar", "binary")
+
+# Candidates fetched per requested result before rescoring with the full precision vectors.
+DEFAULT_OVERSAMPLING = {"scalar": 2.0, "binary": 3.0}
+
+def _quantization_config(quantization: str | None):
+    if quantization is None:
+        return None
+    if quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"quantization must be None or one of {QUANTIZATION_TYPES}")
+
+def _is_local(client: QdrantClient) -> bool:
+    from qdrant_client.local.qdrant_local import QdrantLocal
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+def get_search_params(collection_name: str, client: QdrantClient | None = None) -> models.SearchParams | None:
+    """
+    Search params for a collection: oversampling + rescoring if it was ingested with quantization, else None.
+    Oversampling can be overridden with the QUANTIZATION_OVERSAMPLING env variable.
+    Also None for the embedded (path / :memory:) client, which always does exact float search.
+    """
+    if _is_local(client or _get_client()):
+        return None
+    manifest = get_manifest(collection_name)
+    quantization = manifest.get("quantization") if manifest else None
+    if quantization is None:
+        return None
+    oversampling = float(os.getenv("QUANTIZATION_OVERSAMPLING", DEFAULT_OVERSAMPLING[quantization]))
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(ignore=False, rescore=True, oversampling=oversampling)
+    )
+
 mode_mapping = {
     "dense": RetrievalMode.DENSE,
     "sparse": RetrievalMode.SPARSE,
@@ -43,46 +112,53 @@ mode_mapping = {
 }
 
 def get_vectorstore(
-    embedding_model: OllamaEmbeddings | OpenAIEmbeddings,
-    sparse_embedding_model: FastEmbedSparse,
+    embedding_model: Embeddings,
+    sparse_embedding_model: SparseEmbeddings | None,
     collection_name: str,
     search_type: str = "hybrid",
+    client: QdrantClient | None = None,
+    quantization: str | None = None,
 ):
     """
     Return vectorstore connected to a local collection. 
 
     Args:
-        embedding_model: Dense embedding model (Ollama or OpenAI).
-        sparse_embedding_model: Sparse BM25 model (FastEmbedSparse).
+        embedding_model: Dense embedding model (Ollama or OpenAI, optionally wrapped in the embedding cache).
+        sparse_embedding_model: Sparse BM25 model (FastEmbedSparse). Not needed for dense search or
+            when the sparse side is searched with a native BM25 index.
         collection_name: Qdrant collection name. Created if it doesnt exist.
         search_type: One of 'dense', 'sparse', or 'hybrid'. 
+        client: Qdrant client to use instead of the shared on-disk one (e.g. an in-memory client for benchmarks).
+        quantization: None, 'scalar' (int8) or 'binary'. Only used when the collection is created: the
+            quantized vectors are kept in RAM and the float32 originals on disk for rescoring.
+            The embedded (path) Qdrant ignores it and always searches float vectors, the memory
+            savings apply when the collection is served by a Qdrant server.
     """
     global _QDRANT_CLIENT
 
-    client = _get_client()
-    embedding_dim = len(embedding_model.embed_query("hello world"))
+    client = client or _get_client()
 
     selected_mode = mode_mapping.get(search_type, RetrievalMode.HYBRID)
 
-    if not client.collection_exists(collection_name):
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=embedding_dim, distance=Distance.COSINE),
-            sparse_vectors_config={
-                "sparse": SparseVectorParams(
-                    index=SparseIndexParams(on_disk=True)
-                )
-            },
-        )
-    else:
-        collection_info = client.get_collection(collection_name)
-        existing_size = collection_info.config.params.vectors.size
-
-        if existing_size != embedding_dim:
-            raise ValueError(
-                f"Dimension Mismatch! Collection '{collection_name}' expects {existing_size} "
-                f"dimensions, but the current model provides {embedding_dim}. "
+    with store_lock.read():
+        exists = client.collection_exists(collection_name)
+    if not exists:
+        embedding_dim = get_embedding_dim(embedding_model)
+        with store_lock.write():
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(
+                    size=embedding_dim, distance=Distance.COSINE, on_disk=True if quantization else None
+                ),
+                quantization_config=_quantization_config(quantization),
+                sparse_vectors_config={
+                    "sparse": SparseVectorParams(
+                        index=SparseIndexParams(on_disk=True)
+                    )
+                },
             )
+    else:
+        _check_dimension(client, collection_name, embedding_model)
 
     vector_store = QdrantVectorStore(
         client=client,
@@ -91,15 +167,91 @@ def get_vectorstore(
         sparse_embedding=sparse_embedding_model,
         retrieval_mode=selected_mode,
         sparse_vector_name="sparse",
+        # Without a sparse model the sparse side is served by a native BM25 index (see get_sparse_index).
+        validate_embeddings=sparse_embedding_model is not None or selected_mode == RetrievalMode.DENSE,
+        validate_collection_config=False,
     )
 
     return vector_store
 
 
+VECTOR_BACKENDS = ("qdrant", "faiss")
+
+def get_dense_index(collection_name: str, backend: str = "qdrant"):
+    """
+    Dense index to search instead of Qdrant's own vectors, or None to use Qdrant.
+
+    Args:
+        collection_name: Collection to search.
+        backend: 'qdrant' or 'faiss'. 'faiss' needs an index built with src.util.faiss_store.
+    """
+    if backend == "qdrant":
+        return None
+    if backend == "faiss":
+        from src.util.faiss_store import load_faiss_index, has_faiss_index
+        if not has_faiss_index(collection_name):
+            raise ValueError(
+                f"Collection '{collection_name}' has no FAISS index built from its current ingest. "
+                f"Build it with: python -m src.util.faiss_store build {collection_name}"
+            )
+        return load_faiss_index(collection_name)
+    raise ValueError(f"backend must be one of {VECTOR_BACKENDS}")
+
+
+SPARSE_BACKENDS = ("qdrant", "bm25")
+
+def get_sparse_index(collection_name: str, sparse_backend: str = "qdrant"):
+    """
+    Sparse index to search instead of Qdrant's BM25 vectors, or None to use Qdrant.
+
+    Args:
+        collection_name: Collection to search.
+        sparse_backend: 'qdrant' (FastEmbed BM25 vectors stored in Qdrant) or 'bm25' (native index built
+            with src.util.bm25_store, no model call per query).
+    """
+    if sparse_backend == "qdrant":
+        return None
+    if sparse_backend == "bm25":
+        from src.util.bm25_store import load_bm25_index, has_bm25_index
+        if not has_bm25_index(collection_name):
+            raise ValueError(
+                f"Collection '{collection_name}' has no BM25 index built from its current ingest. "
+                f"Build it with: python -m src.util.bm25_store build {collection_name}"
+            )
+        return load_bm25_index(collection_name)
+    raise ValueError(f"sparse_backend must be one of {SPARSE_BACKENDS}")
+
+
+def delete_collection(collection_name: str, client=None):
+    """
+    Delete a collection together with its manifest, ingest checkpoint and side indexes
+    (FAISS, BM25, chapter index, parent store).
+    """
+    from src.ingest.common import clear_checkpoint
+    from src.retrieval.chapters import remove_chapter_index
+    from src.util.bm25_store import remove_bm25_index
+    from src.util.faiss_store import remove_faiss_index
+    from src.util.manifest import _manifest_path, invalidate_manifest
+    from src.util.parent_store import remove_parent_store
+
+    client = client or _get_client()
+    with store_lock.write():
+        if client.collection_exists(collection_name):
+            client.delete_collection(collection_name)
+    _manifest_path(collection_name).unlink(missing_ok=True)
+    invalidate_manifest(collection_name)
+    clear_checkpoint(collection_name)
+    remove_faiss_index(collection_name)
+    remove_bm25_index(collection_name)
+    remove_chapter_index(collection_name)
+    remove_parent_store(collection_name)
+
+
 def get_all_collection_names():
     """Fetch names of all collections available."""
     global _QDRANT_CLIENT
     
     client=_get_client()  
-    collections = client.get_collections().collections
+    with store_lock.read():
+        collections = client.get_collections().collections
     return [c.name for c in collections]
\ No newline at end of file
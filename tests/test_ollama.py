@@ -0,0 +1,73 @@
+import subprocess
+import time
+import unittest
+from unittest import mock
+
+from src.util import ollama
+from src.util.fake_ollama import FakeOllamaServer
+from src.util.ollama import OllamaRegistry, require_ollama, set_registry
+
+
+def _unreachable_url() -> str:
+    """Url of a server that was just stopped, so connecting to it fails."""
+    with FakeOllamaServer([]) as fake:
+        url = fake.url
+    return url
+
+
+class OllamaRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeOllamaServer(["qwen3:1.7b", "nomic-embed-text"]).start()
+
+    def tearDown(self):
+        self.fake.stop()
+        set_registry(None)
+
+    def test_lists_models_with_their_tag(self):
+        registry = OllamaRegistry(base_url=self.fake.url, use_cli_fallback=False)
+        self.assertEqual(registry.list_models(), {"qwen3:1.7b", "nomic-embed-text:latest"})
+        self.assertTrue(registry.is_available("nomic-embed-text"))
+
+    def test_cached_until_ttl_expires(self):
+        registry = OllamaRegistry(base_url=self.fake.url, ttl=0.2, use_cli_fallback=False)
+        registry.list_models()
+        self.fake.models.append("llama3:8b")
+        self.assertNotIn("llama3:8b", registry.list_models())
+        self.assertEqual(self.fake.requests, 1)
+
+        time.sleep(0.3)
+        self.assertIn("llama3:8b", registry.list_models())
+        self.assertEqual(self.fake.requests, 2)
+
+    def test_falls_back_to_cli_when_http_fails(self):
+        registry = OllamaRegistry(base_url=_unreachable_url(), timeout=0.5)
+        listing = subprocess.CompletedProcess(
+            ["ollama", "list"], 0, stdout="NAME          ID      SIZE\nllama3:8b     abc123  4.7 GB\n"
+        )
+        with mock.patch.object(ollama.shutil, "which", return_value="/usr/bin/ollama"), \
+                mock.patch.object(ollama.subprocess, "run", return_value=listing) as run:
+            self.assertEqual(registry.list_models(), {"llama3:8b"})
+        run.assert_called_once()
+
+    def test_http_failure_without_fallback_raises(self):
+        registry = OllamaRegistry(base_url=_unreachable_url(), timeout=0.5, use_cli_fallback=False)
+        with self.assertRaisesRegex(RuntimeError, "Could not reach Ollama"):
+            registry.list_models()
+
+    def test_require_ollama_missing_model(self):
+        set_registry(OllamaRegistry(base_url=self.fake.url, use_cli_fallback=False))
+        with self.assertRaisesRegex(RuntimeError, "ollama pull llama3:8b"):
+            require_ollama("llama3:8b")
+        # The cached list and the forced refresh.
+        self.assertEqual(self.fake.requests, 2)
+
+    def test_require_ollama_refreshes_for_newly_pulled_model(self):
+        set_registry(OllamaRegistry(base_url=self.fake.url, use_cli_fallback=False))
+        require_ollama("qwen3:1.7b")
+        self.fake.models.append("llama3:8b")
+        require_ollama("llama3:8b")
+        self.assertEqual(self.fake.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()